@@ -1,8 +1,80 @@
 """ This Module is used the initialize the Logging SubSystem"""
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Hashable, List, Optional, Tuple
 from base.shutdown_handling import ShutdownInterface
 
+# argument types that can be formatted later on the listener thread.
+_IMMUTABLE_ARGS = (str, int, float, bool, type(None))
+
+
+class RateLimitFilter(logging.Filter):
+    """Passes at most rate records per second (bursts of burst) for each call site.
+
+    The records dropped at a call site are counted, the next record passed from there
+    tells how many were suppressed. per_call_site=False limits all records together.
+    Records of ERROR and above always pass, they drive the OLED message and the buzzer.
+    """
+
+    def __init__(self, rate: float, burst: int = 5, per_call_site: bool = True) -> None:
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.per_call_site = per_call_site
+        # call site: tokens, last refill time, records suppressed since the last pass.
+        self._buckets: Dict[Hashable, Tuple[float, float, int]] = {}
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+        key = (record.pathname, record.lineno) if self.per_call_site else None
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, dropped = self._buckets.get(key, (float(self.burst), now, 0))
+            tokens = min(float(self.burst), tokens + (now - last) * self.rate)
+            if tokens < 1.0:
+                self._buckets[key] = (tokens, now, dropped + 1)
+                self.suppressed += 1
+                return False
+            self._buckets[key] = (tokens - 1.0, now, 0)
+        if dropped:
+            # shown and removed by the formatter of the handler.
+            record.__dict__["suppressed"] = dropped
+        return True
+
+
+class _SuppressedFormatter(logging.Formatter):
+    """Adds the count of records a RateLimitFilter dropped before this one."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = record.__dict__.pop("suppressed", 0)
+        if suppressed:
+            text += f" ({suppressed} similar suppressed)"
+        return text
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Queues the record without formatting it, the listener thread formats it.
+
+    The arguments of the message are only kept when they cannot change before the
+    listener gets to them, else the message is formatted here.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args and not (isinstance(args, tuple) and
+                         all(isinstance(arg, _IMMUTABLE_ARGS) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
 class LoggerSetup(ShutdownInterface):
     """Class defines the logger and Handlers"""
 
@@ -10,6 +82,16 @@ class LoggerSetup(ShutdownInterface):
     BACKUP_COUNT = 3
     LOG_LEVEL = logging.INFO
     LOG_FILE = "application.log"
+    # The callers only queue their records, a listener thread formats and writes them.
+    ASYNC_LOGGING: bool = True
+    # records per second for each call site, 0 for no limit.
+    FILE_RATE_LIMIT: float = 0
+    CONSOLE_RATE_LIMIT: float = 20
+
+    def __init__(self) -> None:
+        self._handlers: List[logging.Handler] = []
+        self._queue_handler: Optional[QueueHandler] = None
+        self._listener: Optional[QueueListener] = None
 
     def setup(self) -> None:
         """ Intializes the log interfaces """
@@ -31,23 +113,50 @@ class LoggerSetup(ShutdownInterface):
         except (OSError, ValueError, AttributeError):
             pass
         file_handler.setLevel(logging.INFO)
-        file_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+        file_formatter = _SuppressedFormatter("%(asctime)s - %(levelname)s - %(message)s")
         file_handler.setFormatter(file_formatter)
-        logger.addHandler(file_handler)
 
         # Console handler for WARNING and above
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
-        console_formatter = logging.Formatter("%(levelname)s - %(message)s")
+        console_formatter = _SuppressedFormatter("%(levelname)s - %(message)s")
         console_handler.setFormatter(console_formatter)
-        logger.addHandler(console_handler)
 
+        if self.ASYNC_LOGGING:
+            self._queue_handler = _DeferredQueueHandler(queue.SimpleQueue())
+            logger.addHandler(self._queue_handler)
+            self._listener = QueueListener(self._queue_handler.queue,
+                                           respect_handler_level=True)
+            self._listener.start()
+        self.add_handler(file_handler, self.FILE_RATE_LIMIT)
+        self.add_handler(console_handler, self.CONSOLE_RATE_LIMIT)
+
+        logger.info("Logger setup complete with file: %s, level: %s, async: %s", self.LOG_FILE, \
+                                                    self.LOG_LEVEL, self.ASYNC_LOGGING)
 
-        logger.info("Logger setup complete with file: %s, level: %s", self.LOG_FILE, \
-                                                            self.LOG_LEVEL)
+    def add_handler(self, handler: logging.Handler, rate_limit: float = 0,
+                    burst: int = 5, per_call_site: bool = True) -> None:
+        """Add a handler for the records of all loggers, limited to rate_limit records
+        per second when not 0. With async logging it runs on the listener thread."""
+        if rate_limit > 0:
+            handler.addFilter(RateLimitFilter(rate_limit, burst, per_call_site))
+        self._handlers.append(handler)
+        if self._listener is not None and self._queue_handler is not None:
+            # handle() iterates over the tuple, replacing it is safe while running.
+            self._listener.handlers = tuple(self._handlers)
+            # records below every handler level are not queued at all.
+            self._queue_handler.setLevel(min(h.level for h in self._handlers))
+        else:
+            logging.getLogger().addHandler(handler)
 
     def shutdown(self) -> None:
-        # Flush and close all handlers
-        for handler in logging.getLogger().handlers:
+        # Write the queued records, then flush and close all handlers
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        if self._queue_handler is not None:
+            logging.getLogger().removeHandler(self._queue_handler)
+            self._queue_handler = None
+        for handler in dict.fromkeys(self._handlers + logging.getLogger().handlers):
             handler.flush()
             handler.close()
@@ -0,0 +1,69 @@
+"""Cost of a log call to the calling thread, with the synchronous and the queued handlers.
+
+Run from the src folder: python -m benchmarks.bench_logging [--calls N]
+
+Logs the State line of Walker.read_state through LoggerSetup, to a file in a temporary
+folder and to the console (redirected to /dev/null), and prints the microseconds per
+call seen by the caller.
+"""
+import argparse
+import contextlib
+import logging
+import os
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+
+from base.logger_setup import LoggerSetup
+
+CALLS = 5000
+
+
+def time_log_calls(asynchronous: bool, calls: int, folder: str) -> List[float]:
+    """Microseconds of each logger.info call."""
+
+    class BenchLoggerSetup(LoggerSetup):
+        """Logs to the folder, rate limits of the mode."""
+        ASYNC_LOGGING = asynchronous
+        LOG_FILE = os.path.join(folder, f"bench_{asynchronous}.log")
+        CONSOLE_RATE_LIMIT = LoggerSetup.CONSOLE_RATE_LIMIT if asynchronous else 0
+
+    setup = BenchLoggerSetup()
+    setup.setup()
+    logger = logging.getLogger("benchmarks.walker")
+    times = np.empty(calls)
+    try:
+        for i in range(calls):
+            start = time.perf_counter()
+            logger.info("State (Cam:%s): F:%.2f, L:%.2f, R:%.2f, Y:%.2f, CF:%.2f, CL:%.2f, CR:%.2f",
+                        False, 120.0 + i % 7, 30.5, 40.25, 1.5, -1.0, 31.0, 39.0)
+            times[i] = time.perf_counter() - start
+    finally:
+        # the queued records are written here, outside of the timing.
+        setup.shutdown()
+    return list(times * 1e6)
+
+
+def main() -> None:
+    """Print the per call cost of both pipelines."""
+    parser = argparse.ArgumentParser(description="Log call cost benchmark")
+    parser.add_argument("--calls", type=int, default=CALLS)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as folder, open(os.devnull, "w", encoding="utf-8") as null:
+        with contextlib.redirect_stderr(null):
+            for asynchronous in (False, True):
+                results[asynchronous] = time_log_calls(asynchronous, args.calls, folder)
+    print(f"{args.calls} logger.info calls, microseconds per call")
+    print(f"{'pipeline':<14}{'mean':>8}{'p50':>8}{'p99':>8}{'max':>9}")
+    for asynchronous, label in ((False, "synchronous"), (True, "queued")):
+        values = np.array(results[asynchronous])
+        print(f"{label:<14}{values.mean():>8.1f}{np.percentile(values, 50):>8.1f}"
+              f"{np.percentile(values, 99):>8.1f}{values.max():>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""Micro benchmarks of the vision stages on synthetic mat frames.
+
+Run from the src folder:
+    python -m benchmarks.bench_vision [--rounds N] [--quick] [--stage NAME]
+                                      [--frames FOLDER] [--output results.json]
+                                      [--compare baseline.json]
+
+Every stage is timed over frames of walls at a few distances under different lighting
+and noise, for each resolution, ROI_HEIGHT_FRAC and threshold mode. Prints frames per
+second, p50 / p99 ms per call and the peak KiB allocated by one call. The results are
+written to benchmarks/results/<commit>.json, --compare prints the p50 change against
+the results of another commit. --frames times the pillar stages and the whole frame
+processing on the jpg files saved by CameraDistanceMeasurements (SAVE_CAMERA_IMAGE).
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import subprocess
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import LORES_SIZE, MAIN_SIZE, SyntheticCamera, add_pillar, \
+    render_walls, synthetic_ground_model, vary_lighting, yuv_planes
+from hardware.camerameasurements import CameraDistanceMeasurements
+from round2.pillardetector import PillarDetector
+
+ROUNDS = 100
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# front, left, right wall distances in cm, 1000 is no wall.
+SCENES = ((1000.0, 1000.0, 1000.0), (25.0, 1000.0, 1000.0), (1000.0, 15.0, 1000.0),
+          (1000.0, 1000.0, 12.0), (40.0, 20.0, 30.0))
+# gain, left to right gradient, noise sigma; the scenes take them in turn.
+LIGHTING = ((1.0, 0.0, 0.0), (0.6, 0.2, 4.0), (1.3, -0.2, 8.0))
+MAIN_SIZES = (MAIN_SIZE, (MAIN_SIZE[0] // 2, MAIN_SIZE[1] // 2))
+LORES_SIZES = (LORES_SIZE, (480, 640))
+ROI_FRACS = (1.0 / 3.0, 1.0 / 2.0, 2.0 / 3.0)
+# threshold engines with percentage distances, the median engine without the scratch
+# buffers, and the ground plane distances.
+MODES = ("median", "median_allocating", "histogram", "groundplane")
+# process_camera modes: name, DETECT_PILLARS, TRACK_PILLARS.
+PROCESS_MODES = (("walls", False, False), ("pillars", True, False),
+                 ("tracked_pillars", True, True))
+STAGES = ("border", "border_yuv", "distances", "pillars", "pillars_yuv", "process_camera")
+
+
+class Result(NamedTuple):
+    """Timing of one stage in one configuration."""
+    stage: str
+    resolution: str
+    roi: float
+    mode: str
+    fps: float
+    p50_ms: float
+    p99_ms: float
+    peak_kib: float
+
+    @property
+    def key(self) -> Tuple[str, str, float, str]:
+        """The configuration, to match results of two runs."""
+        return self.stage, self.resolution, self.roi, self.mode
+
+
+class BenchMeasurements(CameraDistanceMeasurements):
+    """Measurements without the adaptive frame rate, saves and recordings."""
+    ADAPTIVE_FPS = False
+    DISTANCE_MODEL = "percentage"
+    SAVE_CAMERA_IMAGE = False
+    SAVE_CAMERA_IMAGE_ON_CORRECTION = False
+    RECORD_FRAMES = False
+    DETECT_PILLARS = False
+
+
+def scene_frames(size: Tuple[int, int], pillars: bool = False) -> List[np.ndarray]:
+    """BGR frames of the scenes at the size, optionally with a red and a green pillar."""
+    model = synthetic_ground_model()
+    rows, cols = size
+    frames = []
+    for index, (front, left, right) in enumerate(SCENES):
+        frame = render_walls(model, size, front, left, right)
+        if pillars:
+            add_pillar(frame, (40, 40, 200), cols // 2, rows // 3, cols // 20, rows // 8)
+            add_pillar(frame, (40, 180, 40), 3 * cols // 4, rows // 3, cols // 40, rows // 16)
+        gain, gradient, noise = LIGHTING[index % len(LIGHTING)]
+        frames.append(vary_lighting(frame, gain, gradient, noise, seed=index))
+    return frames
+
+
+def recorded_frames(folder: str) -> List[np.ndarray]:
+    """Frames saved by the camera measurements, back in the BGR camera orientation."""
+    frames = []
+    for filename in sorted(glob.glob(os.path.join(folder, "*.jpg"))):
+        image = cv2.imread(filename)
+        if image is None:
+            continue
+        # saved as RGB and rotated 180, see CameraDistanceMeasurements._save_image
+        frames.append(cv2.rotate(cv2.cvtColor(image, cv2.COLOR_RGB2BGR), cv2.ROTATE_180))
+    return frames
+
+
+def lores_planes(frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Y, U and V planes of a frame scaled to the lores size, as the ISP would produce."""
+    rows, cols = LORES_SIZE
+    return yuv_planes(cv2.resize(frame, (cols, rows), interpolation=cv2.INTER_AREA))
+
+
+def time_calls(func: Callable[[Any], Any], inputs: Sequence[Any],
+               rounds: int) -> Tuple[float, float, float, float]:
+    """Calls per second, p50 and p99 ms per call and the peak KiB allocated by a call."""
+    # warm up, sizes the scratch buffers.
+    func(inputs[0])
+    times = np.empty(rounds)
+    for i in range(rounds):
+        start = time.perf_counter()
+        func(inputs[i % len(inputs)])
+        times[i] = time.perf_counter() - start
+
+    # numpy reports its buffers to tracemalloc.
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    func(inputs[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    p50, p99 = np.percentile(times * 1000.0, [50, 99])
+    return rounds / float(times.sum()), float(p50), float(p99), (peak - base) / 1024.0
+
+
+def measurements_for(roi: float, mode: str, use_lores: bool) -> BenchMeasurements:
+    """Measurements configured for the ROI fraction and mode."""
+    measurements = BenchMeasurements(SyntheticCamera(use_lores))  # type: ignore[arg-type]
+    measurements.roi_height_frac = roi
+    if mode == "groundplane":
+        measurements._ground_model = synthetic_ground_model()
+    elif mode == "median_allocating":
+        measurements.THRESHOLD_ENGINE = "median"
+        measurements.ALLOCATION_FREE = False
+    else:
+        measurements.THRESHOLD_ENGINE = mode
+    return measurements
+
+
+def process_measurements(frames: Sequence[np.ndarray], use_lores: bool, detect: bool,
+                         track: bool) -> BenchMeasurements:
+    """Measurements of the whole frame processing, on a camera returning the frames."""
+    camera = SyntheticCamera(use_lores)
+    camera._frames = list(frames)
+    camera._planes = [lores_planes(frame) for frame in frames]
+    camera.FRAMES = len(frames)
+    # the pillar flags are read when the measurements are created.
+    measurements_type = type("ProcessMeasurements", (BenchMeasurements,),
+                             {"DETECT_PILLARS": detect, "TRACK_PILLARS": track})
+    return measurements_type(camera)  # type: ignore[arg-type]
+
+
+def _resolution(size: Tuple[int, int]) -> str:
+    return f"{size[1]}x{size[0]}"
+
+
+def run(rounds: int = ROUNDS, quick: bool = False, stages: Sequence[str] = STAGES,
+        recorded: Optional[Sequence[np.ndarray]] = None) -> List[Result]:
+    """Time the stages, quick runs the smallest resolutions at the default ROI only.
+
+    recorded: camera frames used by the pillar and process_camera stages.
+    """
+    main_sizes = MAIN_SIZES[-1:] if quick else MAIN_SIZES
+    lores_sizes = LORES_SIZES[:1] if quick else LORES_SIZES
+    roi_fracs = (CameraDistanceMeasurements.ROI_HEIGHT_FRAC,) if quick else ROI_FRACS
+    results: List[Result] = []
+
+    def add(stage: str, size: Optional[Tuple[int, int]], roi: float, mode: str,
+            func: Callable[[Any], Any], inputs: Sequence[Any]) -> None:
+        resolution = _resolution(size) if size else "-"
+        results.append(Result(stage, resolution, round(roi, 3), mode,
+                              *time_calls(func, inputs, rounds)))
+
+    if "border" in stages:
+        for size in main_sizes:
+            frames = scene_frames(size)
+            for roi in roi_fracs:
+                for mode in MODES:
+                    measurements = measurements_for(roi, mode, False)
+                    add("border", size, roi, mode,
+                        lambda frame, m=measurements: m._measure_border(frame, 0.0), frames)
+    if "border_yuv" in stages:
+        for size in lores_sizes:
+            planes = [yuv_planes(frame) for frame in scene_frames(size)]
+            for roi in roi_fracs:
+                for mode in MODES:
+                    measurements = measurements_for(roi, mode, True)
+                    add("border_yuv", size, roi, mode,
+                        lambda p, m=measurements: m._measure_border_yuv(*p, 0.0), planes)
+    if "distances" in stages:
+        # the percentage step tables, _colour_to_distance and _colour_to_distance_center.
+        measurements = measurements_for(CameraDistanceMeasurements.ROI_HEIGHT_FRAC,
+                                        "histogram", False)
+        percentages = [tuple(p) for p in np.random.default_rng(1).uniform(0, 100, (64, 3))]
+        add("distances", None, 0.0, "percentage",
+            lambda p: measurements._percentages_to_distances(*p), percentages)
+    if "pillars" in stages:
+        detector = PillarDetector()
+        if recorded:
+            add("pillars", recorded[0].shape[:2], 0.0, "hsv", detector.detect, recorded)
+        else:
+            for size in main_sizes:
+                add("pillars", size, 0.0, "hsv", detector.detect,
+                    scene_frames(size, pillars=True))
+    if "pillars_yuv" in stages:
+        detector = PillarDetector()
+        if recorded:
+            add("pillars_yuv", LORES_SIZE, 0.0, "hsv", lambda p: detector.detect_yuv(*p),
+                [lores_planes(frame) for frame in recorded])
+        else:
+            for size in lores_sizes:
+                planes = [yuv_planes(frame) for frame in scene_frames(size, pillars=True)]
+                add("pillars_yuv", size, 0.0, "hsv", lambda p: detector.detect_yuv(*p),
+                    planes)
+    if "process_camera" in stages:
+        # capture, border measurement and pillars of a frame, as the camera thread runs it.
+        frames = recorded or scene_frames(main_sizes[0], pillars=True)
+        for use_lores in (False, True):
+            size = LORES_SIZE if use_lores else frames[0].shape[:2]
+            for mode, detect, track in PROCESS_MODES:
+                measurements = process_measurements(frames, use_lores, detect, track)
+                add("process_camera", size, measurements.roi_height_frac, mode,
+                    lambda _, m=measurements: m.process_camera(), frames)
+    return results
+
+
+def git_commit() -> str:
+    """Short hash of the checked out commit, with -dirty for local changes."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if status.strip() else "")
+
+
+def save_results(filename: str, results: Sequence[Result], commit: str, rounds: int) -> None:
+    """Write the results with the commit they were measured on."""
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump({"commit": commit, "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                   "rounds": rounds, "results": [r._asdict() for r in results]}, f, indent=1)
+
+
+def load_results(filename: str) -> Dict[str, Any]:
+    """Results written by save_results, the entries as Result."""
+    with open(filename, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data["results"] = [Result(**entry) for entry in data["results"]]
+    return data
+
+
+def print_results(results: Sequence[Result],
+                  baseline: Optional[Sequence[Result]] = None) -> None:
+    """Table of the results, with the p50 change against the baseline."""
+    before = {r.key: r for r in baseline or ()}
+    print(f"{'stage':<15}{'resolution':<11}{'roi':>6} {'mode':<16}{'fps':>9}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'peak KiB':>10}" + ("  p50 change" if baseline else ""))
+    for r in results:
+        line = (f"{r.stage:<15}{r.resolution:<11}{r.roi:>6.2f} {r.mode:<16}{r.fps:>9.1f}"
+                f"{r.p50_ms:>9.3f}{r.p99_ms:>9.3f}{r.peak_kib:>10.1f}")
+        old = before.get(r.key)
+        if old is not None and old.p50_ms > 0:
+            line += f"  {(r.p50_ms / old.p50_ms - 1.0) * 100.0:+10.1f}%"
+        print(line)
+
+
+def main() -> None:
+    """Run the suite, print and store the results."""
+    parser = argparse.ArgumentParser(description="Vision stage benchmarks")
+    parser.add_argument("--rounds", type=int, default=ROUNDS)
+    parser.add_argument("--quick", action="store_true",
+                        help="smallest resolutions at the default ROI only")
+    parser.add_argument("--stage", action="append", choices=STAGES,
+                        help="stages to run, all by default")
+    parser.add_argument("--frames", help="folder of recorded jpg frames for the pillar "
+                        "and process_camera stages")
+    parser.add_argument("--output", help="results file, benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", help="results of an earlier run")
+    args = parser.parse_args()
+    # the measurements warn there is no ground plane calibration file.
+    logging.basicConfig(level=logging.ERROR)
+
+    recorded = recorded_frames(args.frames) if args.frames else None
+    if args.frames and not recorded:
+        parser.error(f"no jpg frames in {args.frames}")
+
+    commit = git_commit()
+    results = run(args.rounds, args.quick, args.stage or STAGES, recorded)
+    baseline = load_results(args.compare) if args.compare else None
+    if baseline is not None:
+        print(f"compared with {baseline['commit']} ({baseline['time']})")
+    print_results(results, baseline["results"] if baseline else None)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    save_results(output, results, commit, args.rounds)
+    print(f"results of {commit} written to {output}")
+
+
+if __name__ == "__main__":
+    main()
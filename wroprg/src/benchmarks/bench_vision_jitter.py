@@ -0,0 +1,66 @@
+"""Tick jitter of a control loop while the camera measurements run in a thread or a process.
+
+Run from the src folder: python -m benchmarks.bench_vision_jitter
+"""
+import math
+import time
+from typing import List
+
+import numpy as np
+
+from benchmarks.synthetic import SyntheticCamera, synthetic_camera
+from hardware.camerameasurements import CameraDistanceMeasurements
+from hardware.visionworker import VisionWorker
+
+TICK_S = 0.01  # 100 Hz control loop
+DURATION_S = 5.0
+USE_LORES = False  # the main stream is the heavier load
+
+
+def control_loop(duration_s: float = DURATION_S) -> List[float]:
+    """Run a fixed rate loop with a bit of Python work, returns the tick errors in ms."""
+    errors: List[float] = []
+    next_tick = time.perf_counter() + TICK_S
+    end = next_tick + duration_s
+    while next_tick < end:
+        # stand in for read_state and the steering computation.
+        value = 0.0
+        for i in range(200):
+            value += math.sin(i)
+        time.sleep(max(0.0, next_tick - time.perf_counter()))
+        errors.append((time.perf_counter() - next_tick) * 1000.0)
+        next_tick += TICK_S
+    return errors
+
+
+def report(name: str, errors: List[float]) -> None:
+    """Print the tick error percentiles."""
+    values = np.array(errors)
+    print(f"{name:<10}{np.percentile(values, 50):>8.3f}{np.percentile(values, 99):>8.3f}"
+          f"{values.max():>8.3f}{values.std():>8.3f}")
+
+
+def main() -> None:
+    """Print the control loop jitter without camera, with the thread and with the process."""
+    print(f"control loop {1 / TICK_S:.0f} Hz for {DURATION_S:.0f} s, tick error in ms")
+    print(f"{'vision':<10}{'p50':>8}{'p99':>8}{'max':>8}{'std':>8}")
+    report("none", control_loop())
+
+    measurements = CameraDistanceMeasurements(SyntheticCamera(USE_LORES))  # type: ignore[arg-type]
+    measurements.start()
+    try:
+        report("thread", control_loop())
+    finally:
+        measurements.shutdown()
+        measurements.camera_thread.join()
+
+    worker = VisionWorker(USE_LORES, camera_factory=synthetic_camera)
+    worker.start()
+    try:
+        report("process", control_loop())
+    finally:
+        worker.shutdown()
+
+
+if __name__ == "__main__":
+    main()
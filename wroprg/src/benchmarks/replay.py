@@ -0,0 +1,77 @@
+"""Replay a frame recording through the camera measurements.
+
+Run from the src folder: python -m benchmarks.replay frames.rec [results.csv [baseline.csv]]
+
+Prints the processing time per frame, writes the distances of each frame to
+results.csv and, with a baseline of an earlier run, counts the frames whose
+distances changed.
+"""
+import csv
+import logging
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+from hardware.camerameasurements import CameraDistanceMeasurements
+from hardware.framerecorder import FrameRecording, ReplayCamera
+
+COLUMNS = ["frame", "front", "left", "right", "frontp", "leftp", "rightp"]
+
+
+class ReplayMeasurements(CameraDistanceMeasurements):
+    """Measurements of recorded frames, the frame rate does not depend on this machine."""
+    ADAPTIVE_FPS = False
+    RECORD_FRAMES = False
+    SAVE_CAMERA_IMAGE = False
+    SAVE_CAMERA_IMAGE_ON_CORRECTION = False
+
+
+def replay(filename: str) -> tuple:
+    """Process every recorded frame, returns the rows and the ms of each frame."""
+    camera = ReplayCamera(FrameRecording(filename))
+    measurements = ReplayMeasurements(camera)  # type: ignore[arg-type]
+    camera.start()
+    rows: List[list] = []
+    times: List[float] = []
+    for index in range(len(camera.recording)):
+        start = time.perf_counter()
+        measurements.process_camera()
+        times.append((time.perf_counter() - start) * 1000.0)
+        metrics = measurements.metrics
+        rows.append([index, measurements.camera_front, measurements.camera_left,
+                     measurements.camera_right, round(metrics['c.frontp'], 3),
+                     round(metrics['c.leftp'], 3), round(metrics['c.rightp'], 3)])
+    return rows, times
+
+
+def main() -> None:
+    """Replay the recording given on the command line."""
+    logging.basicConfig(level=logging.WARNING)
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    rows, times = replay(sys.argv[1])
+    if not rows:
+        print("Empty recording")
+        return
+    p50, p99 = np.percentile(times, [50, 99])
+    print(f"{len(rows)} frames, {p50:.2f} ms p50, {p99:.2f} ms p99, "
+          f"{1000.0 / np.mean(times):.1f} fps")
+
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(rows)
+    if len(sys.argv) > 3:
+        with open(sys.argv[3], "r", newline="", encoding="utf-8") as f:
+            baseline = list(csv.reader(f))[1:]
+        changed = sum(1 for row, base in zip(rows, baseline)
+                      if [float(v) for v in row[1:4]] != [float(v) for v in base[1:4]])
+        print(f"{changed} of {min(len(rows), len(baseline))} frames changed distances")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Synthetic frames and camera, to run the camera code without the Pi camera."""
+import math
+from typing import Tuple
+
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+
+from hardware.camerameasurements import camera_clock
+from hardware.groundplane import GroundPlaneModel
+
+MAIN_SIZE = (990, 1332)  # rows, cols of the main BGR stream
+LORES_SIZE = (240, 320)  # rows, cols of the lores Y plane
+
+
+def synthetic_frame(seed: int = 1, size: Tuple[int, int] = MAIN_SIZE) -> NDArray[np.uint8]:
+    """Bright mat with a dark grey wall covering the left side of the image."""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(170, 230, size=size + (3,), dtype=np.uint8)
+    frame[:, : size[1] // 3] = rng.integers(20, 50, size=(size[0], 1, 1), dtype=np.uint8)
+    return frame
+
+
+def synthetic_planes(seed: int = 1, size: Tuple[int, int] = LORES_SIZE) \
+                    -> Tuple[NDArray[np.uint8], NDArray[np.uint8], NDArray[np.uint8]]:
+    """Y, U and V planes of the same scene, U and V at half resolution."""
+    rng = np.random.default_rng(seed)
+    y_plane = rng.integers(170, 230, size=size, dtype=np.uint8)
+    y_plane[:, : size[1] // 3] = 35
+    half = (size[0] // 2, size[1] // 2)
+    u_plane = rng.integers(120, 137, size=half, dtype=np.uint8)
+    v_plane = rng.integers(120, 137, size=half, dtype=np.uint8)
+    return y_plane, u_plane, v_plane
+
+def add_pillar(frame: NDArray[np.uint8], bgr: Tuple[int, int, int], x: int, y: int,
+               width: int, height: int) -> NDArray[np.uint8]:
+    """Draw a pillar as a filled box of the colour, top left at x, y."""
+    frame[y : y + height, x : x + width] = bgr
+    return frame
+
+
+def pillar_frame(seed: int = 1, size: Tuple[int, int] = MAIN_SIZE) -> NDArray[np.uint8]:
+    """Synthetic frame with a red pillar and a smaller green pillar on the mat."""
+    rows, cols = size
+    frame = synthetic_frame(seed, size)
+    add_pillar(frame, (40, 40, 200), cols // 2, rows // 3, cols // 20, rows // 8)
+    add_pillar(frame, (40, 180, 40), 3 * cols // 4, rows // 3, cols // 40, rows // 16)
+    return frame
+
+
+CALIBRATION_SIZE = (1332, 990)  # width, height of the main stream
+CAMERA_HEIGHT = 12.0  # cm
+CAMERA_PITCH = 25.0  # degree down
+CAMERA_FOCAL = 900.0  # pixels
+
+
+def project_floor(x: NDArray[np.float64], y: NDArray[np.float64]) -> NDArray[np.float64]:
+    """Main stream pixels of floor points (cm, x forward, y left) for the camera mounted
+    upside down, as on the robot."""
+    pitch = math.radians(CAMERA_PITCH)
+    z_c = x * math.cos(pitch) + CAMERA_HEIGHT * math.sin(pitch)
+    x_c = -y
+    y_c = -x * math.sin(pitch) + CAMERA_HEIGHT * math.cos(pitch)
+    u = CALIBRATION_SIZE[0] / 2 + CAMERA_FOCAL * x_c / z_c
+    v = CALIBRATION_SIZE[1] / 2 + CAMERA_FOCAL * y_c / z_c
+    return np.stack([CALIBRATION_SIZE[0] - 1 - u, CALIBRATION_SIZE[1] - 1 - v], axis=1)
+
+
+def synthetic_ground_model() -> GroundPlaneModel:
+    """Ground plane model of the synthetic camera, as a calibration would produce."""
+    x, y = np.meshgrid(np.linspace(15, 80, 6), np.linspace(-30, 30, 5))
+    ground = np.stack([x.ravel(), y.ravel()], axis=1)
+    return GroundPlaneModel.from_correspondences(project_floor(ground[:, 0], ground[:, 1]),
+                                                 ground, CALIBRATION_SIZE)
+
+
+def render_walls(model: GroundPlaneModel, shape: Tuple[int, int], front: float,
+                 left: float, right: float = math.inf) -> NDArray[np.uint8]:
+    """BGR frame of a bright floor and dark walls front cm ahead, left cm to the left
+    and right cm to the right."""
+    rows, cols = shape
+    u, v = np.meshgrid((np.arange(cols) + 0.5) * model.image_size[0] / cols - 0.5,
+                       (np.arange(rows) + 0.5) * model.image_size[1] / rows - 0.5)
+    ground = model.image_to_ground(np.stack([u.ravel(), v.ravel()], axis=1))
+    wall = np.isnan(ground[:, 0]) | (ground[:, 0] >= front) | (ground[:, 1] >= left) \
+                                  | (ground[:, 1] <= -right)
+    frame = np.where(wall, 30, 200).astype(np.uint8).reshape(rows, cols)
+    return np.repeat(frame[:, :, None], 3, axis=2)
+
+
+def vary_lighting(frame: NDArray[np.uint8], gain: float = 1.0, gradient: float = 0.0,
+                  noise: float = 0.0, seed: int = 1) -> NDArray[np.uint8]:
+    """Frame under other lighting: a gain, a left to right brightness gradient (0.2 is
+    +-20% at the borders) and gaussian sensor noise of the given sigma."""
+    cols = frame.shape[1]
+    scale = gain * (1.0 + gradient * np.linspace(-1.0, 1.0, cols, dtype=np.float32))
+    lit = frame.astype(np.float32) * scale[None, :, None]
+    if noise > 0.0:
+        lit += np.random.default_rng(seed).normal(0.0, noise, frame.shape).astype(np.float32)
+    return np.clip(lit, 0, 255).astype(np.uint8)
+
+
+def yuv_planes(frame: NDArray[np.uint8]) \
+                    -> Tuple[NDArray[np.uint8], NDArray[np.uint8], NDArray[np.uint8]]:
+    """Y, U and V planes of a BGR frame, U and V at half resolution as in YUV420."""
+    yuv = cv2.cvtColor(frame, cv2.COLOR_BGR2YUV)
+    return (np.ascontiguousarray(yuv[:, :, 0]), np.ascontiguousarray(yuv[::2, ::2, 1]),
+            np.ascontiguousarray(yuv[::2, ::2, 2]))
+
+
+class SyntheticCamera:
+    """Same interface as MyCamera, returns a few prepared frames in turn."""
+
+    FRAMES = 4
+
+    def __init__(self, use_lores: bool = False) -> None:
+        self.use_lores = use_lores
+        self._frames = [synthetic_frame(seed) for seed in range(self.FRAMES)]
+        self._planes = [synthetic_planes(seed) for seed in range(self.FRAMES)]
+        self._index = 0
+        self.last_timestamp = 0.0
+
+    def start(self) -> None:
+        """Nothing to start."""
+
+    def capture(self) -> NDArray[np.uint8]:
+        """Next BGR frame."""
+        self.last_timestamp = camera_clock()
+        self._index = (self._index + 1) % self.FRAMES
+        return self._frames[self._index]
+
+    def capture_lores(self) -> Tuple[NDArray[np.uint8], NDArray[np.uint8], NDArray[np.uint8]]:
+        """Next Y, U and V planes."""
+        self.last_timestamp = camera_clock()
+        self._index = (self._index + 1) % self.FRAMES
+        return self._planes[self._index]
+
+    def close(self) -> None:
+        """Nothing to close."""
+
+
+def synthetic_camera(use_lores: bool) -> SyntheticCamera:
+    """Camera factory for the vision worker."""
+    return SyntheticCamera(use_lores)
@@ -1,8 +1,15 @@
 """Initialize the hardware package by exposing key classes."""
-from .hardware_interface import HardwareInterface
-from .validator import RobotValidator
-from .robotstate import RobotState
-from .orientation import OrientationEstimator
+import importlib
+from typing import Any
+
+# Imported on first use, so the pure processing modules of this package can be
+# used (benchmarks, tests) on a machine without the Pi libraries.
+_EXPORTS = {
+	"HardwareInterface": "hardware.hardware_interface",
+	"RobotValidator": "hardware.validator",
+	"RobotState": "hardware.robotstate",
+	"OrientationEstimator": "hardware.orientation",
+}
 
 __all__ = [
 	"HardwareInterface",
@@ -10,3 +17,9 @@ __all__ = [
 	"RobotState",
 	"OrientationEstimator",
 ]
+
+
+def __getattr__(name: str) -> Any:
+	if name not in _EXPORTS:
+		raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+	return getattr(importlib.import_module(_EXPORTS[name]), name)
@@ -0,0 +1,222 @@
+"""Camera calibration: intrinsics, focal length and ground plane in one versioned file."""
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+
+from hardware.groundplane import GroundPlaneModel
+
+logger = logging.getLogger(__name__)
+
+BOARD_CORNERS = (7, 5)  # inner corners per row, per column
+SQUARE_SIZE = 3.0  # cm
+
+
+def find_corners(frame: NDArray[np.uint8],
+                 board_corners: Tuple[int, int] = BOARD_CORNERS) -> Optional[NDArray[np.float32]]:
+    """Chessboard inner corners of a BGR frame, refined to sub pixel."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    found, corners = cv2.findChessboardCorners(gray, board_corners)
+    if not found:
+        return None
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+    return cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
+
+
+def board_object_points(board_corners: Tuple[int, int] = BOARD_CORNERS,
+                        square_size: float = SQUARE_SIZE) -> NDArray[np.float32]:
+    """Corner positions on the board in cm, in the order of find_corners."""
+    cols, rows = board_corners
+    points = np.zeros((rows * cols, 3), np.float32)
+    points[:, :2] = np.mgrid[0:cols, 0:rows].T.reshape(-1, 2) * square_size
+    return points
+
+
+def calibrate_intrinsics(views: Sequence[NDArray[np.float32]], image_size: Tuple[int, int],
+                         board_corners: Tuple[int, int] = BOARD_CORNERS,
+                         square_size: float = SQUARE_SIZE) \
+                            -> Tuple[NDArray[np.float64], NDArray[np.float64], float]:
+    """Camera matrix, distortion coefficients and reprojection error in pixels of the
+    chessboard corners found in several views."""
+    object_points = board_object_points(board_corners, square_size)
+    error, camera_matrix, dist_coeffs, _, _ = cv2.calibrateCamera(
+        [object_points] * len(views), list(views), image_size, None, None)
+    return camera_matrix, dist_coeffs.ravel(), float(error)
+
+
+def focal_from_heights(pixel_heights: Sequence[float], object_height: float,
+                       distance: float) -> float:
+    """Focal length in pixels from the heights of an object of known size and distance,
+    the median of the captures."""
+    heights = np.asarray(pixel_heights, dtype=np.float64)
+    heights = heights[heights > 0]
+    if len(heights) == 0:
+        raise ValueError("No object heights to estimate the focal length")
+    return float(np.median(heights)) * distance / object_height
+
+
+class CameraCalibration:
+    """Intrinsics of the main stream, or only its focal length, and the ground plane.
+
+    Everything a frame needs is precomputed once per image size: the undistortion maps,
+    the bearing of each column and the distance of each object height, so the per
+    frame estimates are table lookups.
+    """
+
+    VERSION = 1
+
+    def __init__(self, image_size: Tuple[int, int],
+                 camera_matrix: Optional[NDArray[np.float64]] = None,
+                 dist_coeffs: Optional[NDArray[np.float64]] = None,
+                 focal_length: Optional[float] = None,
+                 ground_plane: Optional[GroundPlaneModel] = None,
+                 reprojection_error: Optional[float] = None,
+                 created: Optional[str] = None) -> None:
+        """image_size: (width, height) of the calibration image.
+        focal_length: pixels at image_size, overrides the camera matrix for distances."""
+        self.image_size = (int(image_size[0]), int(image_size[1]))
+        self.camera_matrix = None if camera_matrix is None else \
+                                np.asarray(camera_matrix, dtype=np.float64).reshape(3, 3)
+        self.dist_coeffs = None if dist_coeffs is None else \
+                                np.asarray(dist_coeffs, dtype=np.float64).ravel()
+        self.focal_length = None if focal_length is None else float(focal_length)
+        self.ground_plane = ground_plane
+        self.reprojection_error = reprojection_error
+        self.created = created or time.strftime("%Y-%m-%d %H:%M:%S")
+        self._undistort_maps: Dict[Tuple[int, int], Tuple[NDArray[Any], NDArray[Any]]] = {}
+        self._bearings: Dict[Tuple[int, int, float], NDArray[np.float64]] = {}
+        self._distances: Dict[Tuple[int, int, float], NDArray[np.float64]] = {}
+
+    def focal_at(self, cols: int) -> Optional[float]:
+        """Focal length in pixels of an image cols wide, None when not calibrated."""
+        if self.focal_length is not None:
+            focal = self.focal_length
+        elif self.camera_matrix is not None:
+            focal = float(self.camera_matrix[1, 1])
+        else:
+            return None
+        return focal * cols / self.image_size[0]
+
+    def scaled_matrix(self, shape: Tuple[int, int]) -> Optional[NDArray[np.float64]]:
+        """Camera matrix of an image of rows x cols pixels of the same field of view."""
+        if self.camera_matrix is None:
+            return None
+        rows, cols = shape
+        scale = np.diag([cols / self.image_size[0], rows / self.image_size[1], 1.0])
+        return scale @ self.camera_matrix
+
+    def undistort_maps(self, shape: Tuple[int, int]) -> Optional[Tuple[NDArray[Any],
+                                                                     NDArray[Any]]]:
+        """cv2.remap maps of an image of rows x cols pixels, None without intrinsics."""
+        maps = self._undistort_maps.get(shape)
+        if maps is None:
+            matrix = self.scaled_matrix(shape)
+            if matrix is None or self.dist_coeffs is None:
+                return None
+            maps = cv2.initUndistortRectifyMap(matrix, self.dist_coeffs, None, matrix,
+                                               (shape[1], shape[0]), cv2.CV_16SC2)
+            self._undistort_maps[shape] = maps
+        return maps
+
+    def undistort(self, image: NDArray[np.uint8]) -> NDArray[np.uint8]:
+        """Undistorted image, the image itself without intrinsics."""
+        maps = self.undistort_maps(image.shape[:2])
+        if maps is None:
+            return image
+        return cv2.remap(image, maps[0], maps[1], cv2.INTER_LINEAR)
+
+    def column_bearings(self, shape: Tuple[int, int], side: float = 1.0) -> NDArray[np.float64]:
+        """Bearing in degrees of every half column (0, 0.5 .. cols) on the center row.
+
+        side is 1 when image columns grow to the left of the robot (camera upside down).
+        """
+        key = (shape[0], shape[1], side)
+        bearings = self._bearings.get(key)
+        if bearings is None:
+            cols = shape[1]
+            columns = np.arange(2 * cols + 1, dtype=np.float64) / 2.0
+            matrix = self.scaled_matrix(shape)
+            if matrix is not None and self.dist_coeffs is not None:
+                points = np.stack([columns, np.full_like(columns, matrix[1, 2])], axis=1)
+                x = cv2.undistortPoints(points.reshape(-1, 1, 2), matrix,
+                                        self.dist_coeffs).reshape(-1, 2)[:, 0]
+            else:
+                focal = self.focal_at(cols)
+                if focal is None:
+                    raise ValueError("The calibration has no focal length")
+                x = (columns - cols / 2.0) / focal
+            bearings = np.degrees(np.arctan(side * x))
+            self._bearings[key] = bearings
+        return bearings
+
+    def height_distances(self, shape: Tuple[int, int], object_height: float) \
+                                                            -> NDArray[np.float64]:
+        """Distance in cm of an upright object of object_height cm for every pixel height
+        0..rows of an image of rows x cols, inf at 0."""
+        key = (shape[0], shape[1], object_height)
+        distances = self._distances.get(key)
+        if distances is None:
+            focal = self.focal_at(shape[1])
+            if focal is None:
+                raise ValueError("The calibration has no focal length")
+            heights = np.arange(shape[0] + 1, dtype=np.float64)
+            with np.errstate(divide="ignore"):
+                distances = object_height * focal / heights
+            self._distances[key] = distances
+        return distances
+
+    def to_dict(self) -> Dict[str, object]:
+        """Serializable form of the calibration."""
+        return {
+            "version": self.VERSION,
+            "created": self.created,
+            "image_size": list(self.image_size),
+            "camera_matrix": None if self.camera_matrix is None else self.camera_matrix.tolist(),
+            "dist_coeffs": None if self.dist_coeffs is None else self.dist_coeffs.tolist(),
+            "focal_length": self.focal_length,
+            "reprojection_error": self.reprojection_error,
+            "ground_plane": None if self.ground_plane is None else self.ground_plane.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CameraCalibration":
+        """Calibration from to_dict output."""
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f"Unsupported camera calibration version {data.get('version')}")
+        ground_plane = data.get("ground_plane")
+        return cls(tuple(data["image_size"]),  # type: ignore[arg-type]
+                   None if data.get("camera_matrix") is None else np.array(data["camera_matrix"]),
+                   None if data.get("dist_coeffs") is None else np.array(data["dist_coeffs"]),
+                   data.get("focal_length"),
+                   None if ground_plane is None else GroundPlaneModel.from_dict(ground_plane),
+                   data.get("reprojection_error"), data.get("created"))
+
+    def save(self, filename: str) -> None:
+        """Write the calibration to a json file."""
+        tmpname = filename + ".tmp"
+        with open(tmpname, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1)
+        os.replace(tmpname, filename)
+
+    @classmethod
+    def load(cls, filename: str) -> Optional["CameraCalibration"]:
+        """Read a calibration, None when the file is missing or invalid."""
+        if not os.path.exists(filename):
+            return None
+        try:
+            with open(filename, "r", encoding="utf-8") as f:
+                calibration = cls.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error("Cannot read camera calibration %s: %s", filename, e)
+            return None
+        focal = calibration.focal_at(calibration.image_size[0])
+        logger.info("Camera calibration of %s: focal %s px, distortion %s, ground plane %s",
+                    calibration.created, "none" if focal is None else f"{focal:.1f}",
+                    calibration.dist_coeffs is not None, calibration.ground_plane is not None)
+        return calibration
+
@@ -1,21 +1,34 @@
 """Generic Camera which handles picamera and webcam on other platform"""
 import logging
+from typing import Tuple
 
 from picamera2 import Picamera2  # type: ignore
 from libcamera import controls
 import numpy as np
 from numpy.typing import NDArray
+from hardware.camerameasurements import camera_clock
 
 logger: logging.Logger = logging.getLogger(__name__)
 class MyCamera:
     """Generic Camera class to handle both PiCamera2 and OpenCV VideoCapture."""
-    def __init__(self):
+
+    MAIN_SIZE: Tuple[int, int] = (1332, 990)
+    # Small YUV420 stream for measurements, width is a multiple of 64 to avoid stride padding.
+    LORES_SIZE: Tuple[int, int] = (320, 240)
+
+    def __init__(self, use_lores: bool = False):
 
         self._pi_capture = Picamera2()
+        self.use_lores = use_lores
+        # SensorTimestamp of the last captured frame, seconds on the camera_clock.
+        self.last_timestamp: float = 0.0
 
         # Configure for ~30 FPS and BGR to avoid extra conversions
+        # The lores stream is scaled by the ISP, so it costs no CPU.
+        lores = {"size": self.LORES_SIZE, "format": "YUV420"} if use_lores else None
         video_config = self._pi_capture.create_video_configuration(
-            main={"size": (1332, 990), "format": "BGR888"},
+            main={"size": self.MAIN_SIZE, "format": "BGR888"},
+            lores=lores,
             buffer_count=3,
             controls={
                 # ~30 FPS => 33,333 microseconds per frame
@@ -49,11 +62,49 @@ class MyCamera:
         except Exception as e:
             logger.warning("Warning: could not enforce 30 FPS after start: %s", e)
 
+    def _capture_array(self, stream: str) -> NDArray[np.uint8]:
+        """Capture a stream and keep the sensor timestamp of the frame."""
+        request = self._pi_capture.capture_request()
+        try:
+            frame: NDArray[np.uint8] = request.make_array(stream)
+            sensor_timestamp = request.get_metadata().get("SensorTimestamp")
+        finally:
+            request.release()
+        if sensor_timestamp is None:
+            self.last_timestamp = camera_clock()
+        else:
+            self.last_timestamp = sensor_timestamp / 1e9
+        return frame
+
     def capture(self) -> NDArray[np.uint8]:
         """capture frame"""
-        frame_bgr:NDArray[np.uint8] = self._pi_capture.capture_array("main")
+        frame_bgr:NDArray[np.uint8] = self._capture_array("main")
         return frame_bgr
 
+    def capture_lores(self) -> Tuple[NDArray[np.uint8], NDArray[np.uint8], NDArray[np.uint8]]:
+        """capture the lores frame, returns the Y, U and V planes.
+
+        The planes are views on the captured buffer, no copy is made.
+        U and V are half the width and height of Y.
+        """
+        if not self.use_lores:
+            raise RuntimeError("Camera is not configured with the lores stream.")
+        yuv:NDArray[np.uint8] = self._capture_array("lores")
+        return split_yuv420(yuv, self.LORES_SIZE)
+
     def close(self):
         """Release the camera resources."""
         self._pi_capture.close()
+
+
+def split_yuv420(yuv: NDArray[np.uint8], size: Tuple[int, int]) \
+                    -> Tuple[NDArray[np.uint8], NDArray[np.uint8], NDArray[np.uint8]]:
+    """Split a planar YUV420 buffer of shape (H*3/2, stride) into Y, U and V views."""
+    width, height = size
+    stride = yuv.shape[1]
+    y_plane = yuv[:height, :width]
+    # U and V rows are packed two per stride row.
+    u_plane = yuv[height:height + height // 4].reshape(height // 2, stride // 2)[:, :width // 2]
+    v_plane = yuv[height + height // 4:height + height // 2].reshape(height // 2, stride // 2)\
+                                                                        [:, :width // 2]
+    return y_plane, u_plane, v_plane
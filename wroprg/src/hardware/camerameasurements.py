@@ -1,18 +1,117 @@
 """Camera Measurements"""
 
+import math
 import os
 import logging
 import threading
 import time
-from typing import Callable, Tuple
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Callable, List, Mapping, NamedTuple, Optional, Tuple
 from typing import Any, Dict
 import cv2
 import numpy as np
 from numpy.typing import NDArray
 from base.shutdown_handling import ShutdownInterface
-from hardware.camera import MyCamera
+from hardware.fpscontroller import AdaptiveFpsController
+from hardware.calibration import CameraCalibration
+from hardware.groundplane import GroundPlaneModel
+from hardware.imagesink import ImageSink
+from round2.pillardetector import PillarDetector, PillarReading
+from round2.pillartracker import EgoMotion, PillarTracker
+from utils.gridstats import band_sums
+from utils.pihealth import PiHealth
+from utils.snapshot import SnapshotPublisher
+if TYPE_CHECKING:
+    # picamera2 is only available on the Pi, keep this module usable for offline work.
+    from hardware.camera import MyCamera
 
 logger = logging.getLogger(__name__)
+# Distance of U/V from the neutral grey value 128
+_UV_DISTANCE_LUT = np.abs(np.arange(256, dtype=np.int16) - 128).clip(0, 255).astype(np.uint8)
+
+
+def camera_clock() -> float:
+    """Clock of the Picamera2 SensorTimestamp (CLOCK_BOOTTIME) in seconds."""
+    if hasattr(time, "CLOCK_BOOTTIME"):
+        return time.clock_gettime(time.CLOCK_BOOTTIME)
+    return time.monotonic()
+
+
+class CameraReading(NamedTuple):
+    """Camera distances of one frame, with its capture and result times on the camera clock."""
+    front: float = -1
+    left: float = -1
+    right: float = -1
+    frame_timestamp: float = 0
+    result_timestamp: float = 0
+    queue_depth: int = 0
+
+    @property
+    def latency_ms(self) -> float:
+        """Time from the frame capture to the result, -1 without a frame."""
+        if self.frame_timestamp <= 0:
+            return -1.0
+        return (self.result_timestamp - self.frame_timestamp) * 1000.0
+
+    def age_ms(self, now: Optional[float] = None) -> float:
+        """Time since the frame capture, -1 without a frame."""
+        if self.frame_timestamp <= 0:
+            return -1.0
+        if now is None:
+            now = camera_clock()
+        return (now - self.frame_timestamp) * 1000.0
+
+    def is_fresh(self, max_age_ms: float, now: Optional[float] = None) -> bool:
+        """Check the frame was captured less than max_age_ms ago."""
+        return 0 <= self.age_ms(now) <= max_age_ms
+
+    def distances(self, max_age_ms: Optional[float] = None) -> Tuple[float, float, float]:
+        """Front, left and right distances, all -1 when the frame is older than max_age_ms."""
+        if max_age_ms is not None and not self.is_fresh(max_age_ms):
+            return (-1.0, -1.0, -1.0)
+        return (self.front, self.left, self.right)
+
+
+def frame_periods_ms(frames: float, fps: float) -> float:
+    """Duration of frames frame periods at fps, 0 while the frame rate is unknown."""
+    return frames * 1000.0 / fps if fps > 0 else 0.0
+
+
+class CameraState(NamedTuple):
+    """Reading and metrics of the same frame, published together."""
+    reading: CameraReading
+    metrics: Mapping[str, Any]
+
+
+def luma_histogram(luma:NDArray[np.uint8], mask:NDArray[np.uint8] | None = None) -> NDArray[np.float32]:
+    """256 bin histogram of an 8 bit image, only the non zero mask pixels when given."""
+    return cv2.calcHist([luma], [0], mask, [256], [0, 256]).ravel()
+
+
+def histogram_median(hist:NDArray[np.float32]) -> float:
+    """Exact median of the values counted in the histogram, same as np.median.
+
+    An empty histogram has a median of 0, its section has no pixels to threshold.
+    """
+    cumulative = np.cumsum(hist)
+    count = int(cumulative[-1])
+    if count == 0:
+        return 0.0
+    # np.median averages the two middle values when the count is even.
+    low = int(np.searchsorted(cumulative, (count - 1) // 2, side="right"))
+    high = int(np.searchsorted(cumulative, count // 2, side="right"))
+    return (low + high) / 2.0
+
+
+def section_median(values:NDArray[np.uint8]) -> float:
+    """Median of a section, 0 for an empty section like histogram_median."""
+    return float(np.median(values)) if values.size else 0.0
+
+
+def dark_percentage(count:float, size:float) -> float:
+    """Percentage of dark pixels in a section, 0 for an empty section."""
+    return count / size * 100.0 if size > 0 else 0.0
+
 # Enable OpenCV optimizations
 cv2.setUseOptimized(True)
 try:
@@ -26,8 +125,14 @@ class CameraDistanceMeasurements(ShutdownInterface):
     SAVE_CAMERA_IMAGE_ON_CORRECTION:bool = False
     CAMERA_OUTPUT_DIR:str= "output"
     SHOW_IMAGE:bool = False
+    # Debug images are converted and encoded by a background thread, the oldest is
+    # dropped when it falls behind.
+    IMAGE_QUEUE_SIZE: int = 8
+    SAVE_IMAGE_EVERY: int = 1       # save only every n-th image
     MIN_FPS: int = 15
     MAX_FPS: int = 25
+    MAX_FPS_LORES: int = 30
+    SENSOR_FRAME_PERIOD: float = 1.0 / 30  # camera runs at a fixed 30 FPS
     ORIENTATION_DEG: int = 180        # 0 or 180; swap L/R logically when 180
     SHOW_DEBUG=False
     # New: use 2/3 of the image height (tunable)
@@ -39,35 +144,143 @@ class CameraDistanceMeasurements(ShutdownInterface):
     DARK_REL_FACTOR: float = 0.90   # more permissive relative threshold
     CHROMA_DIFF_MAX: int = 40       # max(B,G,R) - min(B,G,R) to consider “grey/black”
 
-    def __init__(self,camera: MyCamera):
+    # Measure on the lores YUV420 stream, the full BGR frame is captured only for debug saves.
+    USE_LORES_YUV: bool = True
+    CHROMA_UV_MAX: int = 20         # max(|U-128|, |V-128|) to consider “grey/black”
+
+    # Compute luma, chroma and masks in preallocated scratch buffers (no per frame allocation).
+    ALLOCATION_FREE: bool = True
+    # "histogram": medians and dark counts from 256 bin luma histograms, "median": np.median.
+    THRESHOLD_ENGINE: str = "histogram"
+
+    # "groundplane": continuous distances from the calibrated wall-floor boundary,
+    # "percentage": step tables of the dark percentages. Falls back to "percentage"
+    # when there is no calibration file.
+    DISTANCE_MODEL: str = "groundplane"
+    # Intrinsics, focal length and ground plane, written by tests/calibratecamera.py.
+    CALIBRATION_FILE: str = "camera_calibration.json"
+    # ground plane of older calibrations, used when the calibration file has none.
+    GROUND_PLANE_FILE: str = "ground_plane.json"
+    GROUND_COLUMN_STEP: int = 4     # scan every 4th column for the boundary
+
+    # Record the measured frames (lores planes or main ROI rows) for offline replay,
+    # see hardware/framerecorder.py.
+    RECORD_FRAMES: bool = False
+    RECORD_FILE: str = "frames.rec"
+    # size of the recording file, 4600 lores frames or 270 main ROI frames.
+    RECORD_BUDGET_BYTES: int = 512 * 1024 * 1024
+
+    # Lower the FPS and ROI on CPU heat, throttling, control loop overruns and frame cost.
+    ADAPTIVE_FPS: bool = True
+
+    # Round 2: red and green pillars, detected on the whole frame after the walls.
+    DETECT_PILLARS: bool = False
+    # Average ms per frame for the pillars, a dearer detection runs every few frames.
+    PILLAR_BUDGET_MS: float = 4.0
+    PILLAR_EMA_ALPHA: float = 0.2
+    # Follow the pillars across frames and search only around them on most frames.
+    TRACK_PILLARS: bool = True
+
+    def __init__(self,camera: "MyCamera", overruns: Any = None,
+                 ego_motion: EgoMotion | None = None):
+        """overruns: shared counter of control loop deadline overruns (ControlLoopMonitor).
+        ego_motion: yaw and odometry of the robot for the pillar tracker."""
         super().__init__()
         self.camera = camera
-        self.camera_left = -1
-        self.camera_right = -1
-        self.camera_front = -1
+        self.use_lores = self.USE_LORES_YUV and camera.use_lores
+        self.max_fps = self.MAX_FPS_LORES if self.use_lores else self.MAX_FPS
+        self.roi_height_frac = self.ROI_HEIGHT_FRAC
+        self._calibration = CameraCalibration.load(self.CALIBRATION_FILE)
+        self._ground_model: GroundPlaneModel | None = None
+        if self.DISTANCE_MODEL == "groundplane":
+            if self._calibration is not None:
+                self._ground_model = self._calibration.ground_plane
+            if self._ground_model is None:
+                self._ground_model = GroundPlaneModel.load(self.GROUND_PLANE_FILE)
+            if self._ground_model is None:
+                logger.warning("No ground plane calibration in %s, using percentage distances",
+                               self.CALIBRATION_FILE)
+        self._fps_controller: AdaptiveFpsController | None = None
+        if self.ADAPTIVE_FPS:
+            self._fps_controller = AdaptiveFpsController(self.MIN_FPS, self.max_fps,
+                                                         self.ROI_HEIGHT_FRAC, PiHealth(),
+                                                         overruns)
+        # metrics of the frame being processed, only used by the camera thread.
         self.metrics: Dict[str, Any] = {}
+        # published as a whole after each frame, so readers never see a mix of two frames.
+        self._state: SnapshotPublisher[CameraState] = \
+                        SnapshotPublisher(CameraState(CameraReading(), MappingProxyType({})))
+        self._pillar_detector: PillarDetector | None = None
+        self._pillar_tracker: PillarTracker | None = None
+        if self.DETECT_PILLARS:
+            self._pillar_detector = PillarDetector(self.ORIENTATION_DEG, self._calibration)
+            if self.TRACK_PILLARS:
+                self._pillar_tracker = PillarTracker(self._pillar_detector)
+        self._ego_motion = ego_motion
+        self._pillars = PillarReading()
+        self._pillar_ms: float = 0.0
+        self._pillar_skip: int = 0
 
         #init Thread
         self.camera_thread = CameraCheckThread(self.process_camera,self.MIN_FPS)
+        self._recorder: Any = None
+        self._record_rows = slice(None)
+        self._image_sink: ImageSink | None = None
+        if self.SAVE_CAMERA_IMAGE or self.SAVE_CAMERA_IMAGE_ON_CORRECTION:
+            self._image_sink = ImageSink(self._prepare_image, self.IMAGE_QUEUE_SIZE,
+                                         self.SAVE_IMAGE_EVERY)
 
-        # Preallocated buffers for mask computation
+        # Preallocated buffers for mask computation, sized on the first frame.
         self._mask_initialized = False
-        self._roi_rows: slice | None = None
-        self._mask_bool: np.ndarray | None = None
-        self._tmp_bool: np.ndarray | None = None
+        self._roi_rows: Dict[int, Tuple[slice, bool]] = {}
+        self._mask_bool: NDArray[np.bool_] = np.empty((0, 0), dtype=np.bool_)
+        self._tmp_bool: NDArray[np.bool_] = np.empty((0, 0), dtype=np.bool_)
+        self._luma: NDArray[np.uint8] = np.empty((0, 0), dtype=np.uint8)
+        self._chroma: NDArray[np.uint8] = np.empty((0, 0), dtype=np.uint8)
+        self._cmin: NDArray[np.uint8] = np.empty((0, 0), dtype=np.uint8)
+        self._acc16: NDArray[np.uint16] = np.empty((0, 0), dtype=np.uint16)
+        self._tmp16: NDArray[np.uint16] = np.empty((0, 0), dtype=np.uint16)
+        self._grey_u8: NDArray[np.uint8] = np.empty((0, 0), dtype=np.uint8)
         self._section_w: int = 0
 
         # pause support
         self._paused_event = threading.Event()
 
-    def start(self):
-        """Start the camera."""
+    @property
+    def camera_front(self) -> float:
+        """Front distance of the latest published frame, -1 if none."""
+        return self._state.value.reading.front
 
-        if self.SAVE_CAMERA_IMAGE or self.SAVE_CAMERA_IMAGE_ON_CORRECTION:
-            outputdir:str = self.CAMERA_OUTPUT_DIR
-            os.makedirs(outputdir, exist_ok=True)
+    @property
+    def camera_left(self) -> float:
+        """Left distance of the latest published frame, -1 if none."""
+        return self._state.value.reading.left
+
+    @property
+    def camera_right(self) -> float:
+        """Right distance of the latest published frame, -1 if none."""
+        return self._state.value.reading.right
+
+    def _publish(self, reading: CameraReading) -> None:
+        """Publish the reading with a copy of the current metrics."""
+        self._state.publish(CameraState(reading, MappingProxyType(dict(self.metrics))))
+
+    def start_outputs(self) -> None:
+        """Start the debug image sink and the frame recording, without the camera thread.
 
+        Called with the camera started. The vision worker calls process_camera from its
+        own loop and only starts these.
+        """
+        if self._image_sink is not None:
+            os.makedirs(self.CAMERA_OUTPUT_DIR, exist_ok=True)
+            self._image_sink.start()
+        if self.RECORD_FRAMES and self._recorder is None:
+            self._open_recorder()
+
+    def start(self):
+        """Start the camera."""
         self.camera.start()
+        self.start_outputs()
         self.camera_thread.start()
         logger.info("Camera Distance Measurements started")
 
@@ -85,71 +298,270 @@ class CameraDistanceMeasurements(ShutdownInterface):
         return self._paused_event.is_set()
 
     def shutdown(self):
-        return self.camera_thread.shutdown()
+        self.camera_thread.shutdown()
+        if self._image_sink is not None:
+            self._image_sink.shutdown()
+        if self._recorder is not None:
+            self._recorder.shutdown()
 
     def process_camera(self)-> int:
         """Process the camera frame and extract distance measurements."""
         # Short-circuit when paused to save CPU; keep low FPS
         if self._paused_event.is_set():
-            self.camera_front = self.camera_left = self.camera_right = -1
+            self._pillars = PillarReading()
             # keep metrics but mark paused
             self.metrics['paused'] = True
+            self._publish(CameraReading())
             return 5  # very low FPS when paused
 
         self.metrics['paused'] = False
-        frame:NDArray[np.uint8] = self.camera.capture()
         counter:float = time.time()
 
-
-        (center_p,left_p,right_p,self.camera_front,self.camera_left,self.camera_right) = \
+        if self.use_lores:
+            (y_plane, u_plane, v_plane) = self.camera.capture_lores()
+            start_time = time.perf_counter()
+            frame_timestamp = self.camera.last_timestamp
+            queue_depth = self._queue_depth(frame_timestamp)
+            if self._recorder is not None:
+                self._record_frame(frame_timestamp, y_plane, u_plane, v_plane)
+            (center_p,left_p,right_p,front,left,right) = \
+                                    self._measure_border_yuv(y_plane,u_plane,v_plane,counter)
+            if self._pillar_detector is not None and self._pillar_due():
+                self._update_pillars(self._pillar_detector.detect_yuv, frame_timestamp,
+                                     y_plane, u_plane, v_plane)
+        else:
+            frame:NDArray[np.uint8] = self.camera.capture()
+            start_time = time.perf_counter()
+            frame_timestamp = self.camera.last_timestamp
+            queue_depth = self._queue_depth(frame_timestamp)
+            if self._recorder is not None:
+                self._record_frame(frame_timestamp, frame)
+            (center_p,left_p,right_p,front,left,right) = \
                                     self._measure_border(frame,counter)
+            if self._pillar_detector is not None and self._pillar_due():
+                self._update_pillars(self._pillar_detector.detect, frame_timestamp, frame)
 
+        reading = CameraReading(front, left, right, frame_timestamp, camera_clock(),
+                                queue_depth)
 
         #lets add extra metrics , for now we will just use the timestamp
         self.metrics['c.frontp'] = center_p
         self.metrics['c.rightp'] = right_p
         self.metrics['c.leftp'] =  left_p
-        self.metrics['c.frontd'] = self.camera_front
-        self.metrics['c.rightd'] = self.camera_right
-        self.metrics['c.leftd'] = self.camera_left
-
-        if self.camera_front == -1 and self.camera_left == -1 and self.camera_right == -1:
-            return self.MIN_FPS
+        self.metrics['c.frontd'] = front
+        self.metrics['c.rightd'] = right
+        self.metrics['c.leftd'] = left
+        self.metrics['c.latency_ms'] = reading.latency_ms
+        self.metrics['c.queue'] = queue_depth
+
+        detected = front != -1 or left != -1 or right != -1
+        if self._fps_controller is None:
+            fps = self.max_fps if detected else self.MIN_FPS
+            self.metrics['c.fps'] = fps
+            self._publish(reading)
+            return fps
+
+        process_ms = (time.perf_counter() - start_time) * 1000.0
+        setting = self._fps_controller.update(detected, process_ms)
+        if setting.roi_frac != self.roi_height_frac:
+            self.roi_height_frac = setting.roi_frac
+            self._roi_rows.clear()
+        self.metrics['c.process_ms'] = process_ms
+        self.metrics['c.fps'] = setting.fps
+        self.metrics['c.level'] = setting.level
+        self._publish(reading)
+        return setting.fps
+
+    def _queue_depth(self, frame_timestamp:float) -> int:
+        """Frames the sensor completed after this one by the time it was handed to us."""
+        if frame_timestamp <= 0:
+            return 0
+        return max(0, int((camera_clock() - frame_timestamp) / self.SENSOR_FRAME_PERIOD))
+
+    def _pillar_due(self) -> bool:
+        """Check the pillar detection fits in the budget of this frame."""
+        if self._pillar_skip > 0:
+            self._pillar_skip -= 1
+            return False
+        return True
+
+    def _update_pillars(self, detect: Callable[..., Any], frame_timestamp: float,
+                        *planes: NDArray[np.uint8]) -> None:
+        """Detect the pillars and plan the frames to skip to stay within the budget."""
+        start_time = time.perf_counter()
+        tracker = self._pillar_tracker
+        if tracker is None:
+            pillars = detect(*planes)
+        else:
+            yaw: float | None = None
+            travelled = math.nan
+            if self._ego_motion is not None:
+                yaw, travelled = self._ego_motion.read()
+            pillars = tracker.update(lambda rois: detect(*planes, rois=rois), frame_timestamp,
+                                     yaw, travelled)
+            self.metrics['c.pillar_full_scans'] = tracker.full_scans
+        self._pillars = PillarReading(pillars, frame_timestamp)
+        cost_ms = (time.perf_counter() - start_time) * 1000.0
+        if self._pillar_ms == 0.0:
+            self._pillar_ms = cost_ms
         else:
-            # logger.info("Increasing FPS-----, %.2f,%.2f,%.2f", self.camera_front,\
-            #                      self.camera_left, self.camera_right)
-            return self.MAX_FPS
+            self._pillar_ms += self.PILLAR_EMA_ALPHA * (cost_ms - self._pillar_ms)
+        self._pillar_skip = max(0, math.ceil(self._pillar_ms / self.PILLAR_BUDGET_MS) - 1)
+        self.metrics['c.pillars'] = len(self._pillars.pillars)
+        self.metrics['c.pillar_ms'] = self._pillar_ms
 
-    def get_distance(self,)-> Tuple[float,float,float, Dict[str, Any]]:
-        """Measure distance using the camera."""
-        # Implement distance measurement logic here
+    def get_reading(self) -> CameraReading:
+        """Latest camera reading with its frame timestamp."""
+        return self._state.value.reading
 
-        return (self.camera_front,self.camera_left,self.camera_right,self.metrics)
+    def get_pillars(self) -> PillarReading:
+        """Pillars of the latest detection, with the timestamp of their frame."""
+        return self._pillars
 
-    def _save_image(self,image,counter:float,suffix:str="")-> None:
+    def get_distance(self, max_age_ms: Optional[float] = None,
+                     max_age_frames: Optional[float] = None) \
+                                        -> Tuple[float,float,float, Dict[str, Any]]:
+        """Latest camera distances, -1 when the frame is older than max_age_ms.
 
-        if self.SAVE_CAMERA_IMAGE or self.SAVE_CAMERA_IMAGE_ON_CORRECTION:
-            # img_rgb = image
-            img_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            #rotate 180
-            img_rgb =  cv2.rotate(img_rgb, cv2.ROTATE_180)
+        max_age_frames: the limit in frame periods at the current frame rate instead.
+        """
+        state = self._state.value
+        reading = state.reading
+        metrics = dict(state.metrics)
+        metrics['c.age_ms'] = reading.age_ms()
+        if max_age_frames is not None:
+            max_age_ms = frame_periods_ms(max_age_frames, metrics.get('c.fps', 0))
+        return reading.distances(max_age_ms) + (metrics,)
+
+    @staticmethod
+    def _prepare_image(image:NDArray[np.uint8]) -> NDArray[np.uint8]:
+        """Conversion of a debug image, runs on the image sink thread."""
+        # img_rgb = image
+        img_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        #rotate 180
+        return cv2.rotate(img_rgb, cv2.ROTATE_180)
+
+    def _save_image(self,image,counter:float,suffix:str="")-> None:
+        """Queue the image for the sink, the frame buffer is not reused so no copy."""
+        if self._image_sink is not None:
             filename = os.path.join(self.CAMERA_OUTPUT_DIR, \
                             f"frame_{int(counter * 1000):013d}_{suffix}.jpg")
-            cv2.imwrite(filename, img_rgb)
+            self._image_sink.submit(filename, image)
+            self.metrics['c.img_dropped'] = self._image_sink.dropped
             if self.SHOW_DEBUG:
-                logger.info("Saved: %s",filename)
+                logger.info("Queued: %s",filename)
 
 
-    def _measure_border(self, image:NDArray[np.uint8],counter:float) -> Tuple[float, float, float, float, float, float]:
-        # ROI selection without rotation
-        H, W = image.shape[:2]
-        roi_h = max(1, int(H * self.ROI_HEIGHT_FRAC))
+    def _roi_slice(self, H:int, height_frac:float) -> Tuple[slice, bool]:
+        """Rows of the ROI and if left/right are swapped."""
+        roi_h = max(1, int(H * height_frac))
         if self.ORIENTATION_DEG == 180:
-            roi = image[: roi_h, :]
-            swap_lr = True
+            return slice(0, roi_h), True
+        return slice(H - roi_h, H), False
+
+    def _roi(self, image:NDArray[np.uint8]) -> Tuple[NDArray[np.uint8], bool]:
+        """ROI selection without rotation, returns the ROI and if left/right are swapped."""
+        H = image.shape[0]
+        roi_rows = self._roi_rows.get(H)
+        if roi_rows is None:
+            roi_rows = self._roi_slice(H, self.roi_height_frac)
+            self._roi_rows[H] = roi_rows
+        return image[roi_rows[0]], roi_rows[1]
+
+    def _open_recorder(self) -> None:
+        """Create the frame recording, sized from a captured frame and the byte budget.
+
+        Recording is left off when the file cannot be allocated.
+        """
+        # pylint: disable=import-outside-toplevel
+        from hardware.framerecorder import FrameRecorder
+        if self.use_lores:
+            shapes = [plane.shape for plane in self.camera.capture_lores()]
+            metadata: Dict[str, Any] = {"use_lores": True}
+        else:
+            # the full ROI, the adaptive ROI only gets smaller.
+            frame = self.camera.capture()
+            H = frame.shape[0]
+            self._record_rows, _ = self._roi_slice(H, self.ROI_HEIGHT_FRAC)
+            shapes = [frame[self._record_rows].shape]
+            metadata = {"use_lores": False, "frame_height": H,
+                        "row_offset": self._record_rows.start}
+        frame_bytes = sum(int(np.prod(shape)) for shape in shapes)
+        capacity = max(1, self.RECORD_BUDGET_BYTES // frame_bytes)
+        try:
+            self._recorder = FrameRecorder(self.RECORD_FILE, shapes, capacity, metadata)
+        except OSError as e:
+            logger.error("Cannot allocate the frame recording %s (%d frames of %d bytes): %s,"
+                         " recording disabled", self.RECORD_FILE, capacity, frame_bytes, e)
+            self._recorder = None
+
+    def _record_frame(self, frame_timestamp:float, *planes:NDArray[np.uint8]) -> None:
+        """Append the measured frame to the recording."""
+        if self.use_lores:
+            self._recorder.append(frame_timestamp, *planes)
+        else:
+            self._recorder.append(frame_timestamp, planes[0][self._record_rows])
+
+    def _ensure_scratch(self, shape:Tuple[int, ...]) -> None:
+        """Size the scratch buffers on the first frame, or when the ROI size changes."""
+        if self._mask_initialized and self._mask_bool.shape == shape:
+            return
+        self._mask_bool = np.empty(shape, dtype=np.bool_)
+        self._tmp_bool = np.empty(shape, dtype=np.bool_)
+        self._luma = np.empty(shape, dtype=np.uint8)
+        self._chroma = np.empty(shape, dtype=np.uint8)
+        self._cmin = np.empty(shape, dtype=np.uint8)
+        self._acc16 = np.empty(shape, dtype=np.uint16)
+        self._tmp16 = np.empty(shape, dtype=np.uint16)
+        self._grey_u8 = np.empty(shape, dtype=np.uint8)
+        self._section_w = shape[1] // 4
+        self._mask_initialized = True
+        logger.info("Camera scratch buffers sized for ROI %s", shape)
+
+    def _measure_border_yuv(self, y_plane:NDArray[np.uint8], u_plane:NDArray[np.uint8],
+                            v_plane:NDArray[np.uint8], counter:float) \
+                                -> Tuple[float, float, float, float, float, float]:
+        """Measure on the lores planes, luma is used as is, chroma comes from U/V."""
+        y_roi, swap_lr = self._roi(y_plane)
+        u_roi, _ = self._roi(u_plane)
+        v_roi, _ = self._roi(v_plane)
+
+        # Work at the chroma resolution, Y is subsampled with a strided view.
+        rows, cols = u_roi.shape
+        y_luma = y_roi[: 2 * rows : 2, : 2 * cols : 2]
+        if self.ALLOCATION_FREE:
+            self._ensure_scratch(u_roi.shape)
+            # contiguous copy of the subsampled luma, the histograms read it faster.
+            np.copyto(self._luma, y_luma)
+            y_luma = self._luma
+            cv2.LUT(u_roi, _UV_DISTANCE_LUT, dst=self._chroma)
+            cv2.LUT(v_roi, _UV_DISTANCE_LUT, dst=self._cmin)
+            chroma = cv2.max(self._chroma, self._cmin, dst=self._chroma)
         else:
-            roi = image[H - roi_h :, :]
-            swap_lr = False
+            chroma = cv2.max(cv2.LUT(u_roi, _UV_DISTANCE_LUT), cv2.LUT(v_roi, _UV_DISTANCE_LUT))
+
+        distances = self._distances(y_luma, chroma, self.CHROMA_UV_MAX, swap_lr, u_plane.shape[0])
+
+        if self._should_save_image():
+            self._save_image(self.camera.capture(),counter,"full")
+
+        return distances
+
+    def _should_save_image(self) -> bool:
+        return self.SAVE_CAMERA_IMAGE or (self.SAVE_CAMERA_IMAGE_ON_CORRECTION and \
+                                      (self.camera_front != -1 or self.camera_left != -1 \
+                                        or self.camera_right != -1))
+
+    def _measure_border(self, image:NDArray[np.uint8],counter:float) -> Tuple[float, float, float, float, float, float]:
+        roi, swap_lr = self._roi(image)
+
+        if self.ALLOCATION_FREE:
+            y_luma, chroma = self._luma_chroma_inplace(roi)
+            distances = self._distances(y_luma, chroma, self.CHROMA_DIFF_MAX, swap_lr,
+                                        image.shape[0])
+            if self._should_save_image():
+                self._save_image(roi,counter,"full")
+            return distances
 
         # Fast integer luma (0..255) from BGR
         b = roi[:, :, 0].astype(np.uint16, copy=False)
@@ -162,43 +574,179 @@ class CameraDistanceMeasurements(ShutdownInterface):
         cmin = np.minimum(np.minimum(r, g), b)
         chroma = (cmax - cmin).astype(np.uint8, copy=False)
 
+        distances = self._distances(y_luma, chroma, self.CHROMA_DIFF_MAX, swap_lr, image.shape[0])
+
+        if self._should_save_image():
+            self._save_image(roi,counter,"full")
+
+        return distances
+
+    def _distances(self, y_luma:NDArray[np.uint8], chroma:NDArray[np.uint8], chroma_max:int,
+                   swap_lr:bool, height:int) -> Tuple[float, float, float, float, float, float]:
+        """Percentages and distances with the configured distance model."""
+        if self._ground_model is None:
+            percentages = self._dark_percentages(y_luma, chroma, chroma_max, swap_lr)
+            return self._percentages_to_distances(*percentages)
+
+        rows, _ = self._roi_rows[height]
+        # 180: the top rows of the sensor see the floor nearest to the robot.
+        near_first = self.ORIENTATION_DEG == 180
+        scanner = self._ground_model.scanner((height, y_luma.shape[1]), rows, near_first,
+                                             self.GROUND_COLUMN_STEP)
+        section_w = y_luma.shape[1] // 4
+        sections = ((slice(None), slice(0, section_w)),
+                    (slice(None), slice(section_w, 3 * section_w)),
+                    (slice(None), slice(3 * section_w, y_luma.shape[1])))
+        thresholds = self._thresholds(
+            [luma_histogram(y_luma[section]) for section in sections])
+        reading = scanner.scan(y_luma, chroma, thresholds, chroma_max, swap_lr)
+        self.metrics['c.frontangle'] = reading.front_angle
+        self.metrics['c.leftangle'] = reading.left_angle
+        self.metrics['c.rightangle'] = reading.right_angle
+        return (reading.front_p, reading.left_p, reading.right_p,
+                reading.front, reading.left, reading.right)
+
+    def _luma_chroma_inplace(self, roi:NDArray[np.uint8]) \
+                                    -> Tuple[NDArray[np.uint8], NDArray[np.uint8]]:
+        """Same integer luma and chroma as the allocating path, computed in scratch buffers."""
+        self._ensure_scratch(roi.shape[:2])
+        b = roi[:, :, 0]
+        g = roi[:, :, 1]
+        r = roi[:, :, 2]
+        acc = self._acc16
+        tmp = self._tmp16
+
+        # (77 * r + 150 * g + 29 * b) >> 8, uint16 cannot overflow (max 65280)
+        np.multiply(r, 77, out=acc, dtype=np.uint16)
+        np.multiply(g, 150, out=tmp, dtype=np.uint16)
+        np.add(acc, tmp, out=acc)
+        np.multiply(b, 29, out=tmp, dtype=np.uint16)
+        np.add(acc, tmp, out=acc)
+        np.right_shift(acc, 8, out=acc)
+        np.copyto(self._luma, acc, casting="unsafe")
+
+        # max(B,G,R) - min(B,G,R)
+        np.maximum(r, g, out=self._chroma)
+        np.maximum(self._chroma, b, out=self._chroma)
+        np.minimum(r, g, out=self._cmin)
+        np.minimum(self._cmin, b, out=self._cmin)
+        np.subtract(self._chroma, self._cmin, out=self._chroma)
+        return self._luma, self._chroma
+
+    def _section_masks(self, y_luma:NDArray[np.uint8], chroma:NDArray[np.uint8],
+                       thresholds:Tuple[int, ...], chroma_max:int,
+                       sections:Tuple[Any, ...]) -> Tuple[NDArray[np.bool_], ...]:
+        """Dark and grey masks of each section, written in the scratch mask buffer."""
+        self._ensure_scratch(y_luma.shape)
+        masks = []
+        for thr, section in zip(thresholds, sections):
+            mask = self._mask_bool[section]
+            tmp = self._tmp_bool[section]
+            np.less(y_luma[section], thr, out=mask)
+            np.less_equal(chroma[section], chroma_max, out=tmp)
+            np.logical_and(mask, tmp, out=mask)
+            masks.append(mask)
+        return tuple(masks)
+
+    def _dark_percentages(self, y_luma:NDArray[np.uint8], chroma:NDArray[np.uint8],
+                          chroma_max:int, swap_lr:bool) -> Tuple[float, float, float]:
+        """Percentage of dark grey pixels in the center, left and right sections."""
         # Split once into left / center / right (center is 50%)
-        w_roi = roi.shape[1]
+        w_roi = y_luma.shape[1]
         section_w = w_roi // 4
         l_slice = (slice(None), slice(0, section_w))
         c_slice = (slice(None), slice(section_w, 3 * section_w))
         r_slice = (slice(None), slice(3 * section_w, w_roi))
+        edges = (0, section_w, 3 * section_w, w_roi)
+
+        if self.THRESHOLD_ENGINE == "histogram":
+            return self._dark_percentages_histogram(y_luma, chroma, chroma_max, swap_lr,
+                                                    (l_slice, c_slice, r_slice))
 
         if self.USE_SECTION_THRESHOLDS:
             # Per-section medians -> per-section thresholds (use max => more inclusive)
-            med_l = float(np.median(y_luma[l_slice]))
-            med_c = float(np.median(y_luma[c_slice]))
-            med_r = float(np.median(y_luma[r_slice]))
+            med_l = section_median(y_luma[l_slice])
+            med_c = section_median(y_luma[c_slice])
+            med_r = section_median(y_luma[r_slice])
             thr_l = max(self.DARK_ABS_LUMA, int(self.DARK_REL_FACTOR * med_l))
             thr_c = max(self.DARK_ABS_LUMA, int(self.DARK_REL_FACTOR * med_c))
             thr_r = max(self.DARK_ABS_LUMA, int(self.DARK_REL_FACTOR * med_r))
 
-            left_mask   = (y_luma[l_slice] < thr_l) & (chroma[l_slice]  <= self.CHROMA_DIFF_MAX)
-            center_mask = (y_luma[c_slice] < thr_c) & (chroma[c_slice]  <= self.CHROMA_DIFF_MAX)
-            right_mask  = (y_luma[r_slice] < thr_r) & (chroma[r_slice]  <= self.CHROMA_DIFF_MAX)
+            if self.ALLOCATION_FREE:
+                # the sections cover the whole scratch mask
+                self._section_masks(y_luma, chroma, (thr_l, thr_c, thr_r), chroma_max,
+                                    (l_slice, c_slice, r_slice))
+                counts = band_sums(self._mask_bool, edges)
+            else:
+                # counted per section, no mask of the whole ROI is put together.
+                counts = [np.count_nonzero((y_luma[section] < thr) &
+                                           (chroma[section] <= chroma_max))
+                          for thr, section in ((thr_l, l_slice), (thr_c, c_slice),
+                                               (thr_r, r_slice))]
         else:
             # Global median -> global threshold
-            med = float(np.median(y_luma))
+            med = section_median(y_luma)
             thr = max(self.DARK_ABS_LUMA, int(self.DARK_REL_FACTOR * med))
-            mask = (y_luma < thr) & (chroma <= self.CHROMA_DIFF_MAX)
-            left_mask   = mask[:, :section_w]
-            center_mask = mask[:, section_w : 3 * section_w]
-            right_mask  = mask[:, 3 * section_w :]
+            if self.ALLOCATION_FREE:
+                all_rows = (slice(None), slice(None))
+                (mask,) = self._section_masks(y_luma, chroma, (thr,), chroma_max, (all_rows,))
+            else:
+                mask = (y_luma < thr) & (chroma <= chroma_max)
+            counts = band_sums(mask, edges)
 
         # Percent dark per section
-        left_black_percentage   = (np.count_nonzero(left_mask)   / left_mask.size)   * 100.0
-        center_black_percentage = (np.count_nonzero(center_mask) / center_mask.size) * 100.0
-        right_black_percentage  = (np.count_nonzero(right_mask)  / right_mask.size)  * 100.0
+        sizes = np.diff(edges) * y_luma.shape[0]
+        left_black_percentage, center_black_percentage, right_black_percentage = \
+                (dark_percentage(float(count), float(size))
+                 for count, size in zip(counts, sizes))
 
         if swap_lr:
             left_black_percentage, right_black_percentage = \
                     right_black_percentage, left_black_percentage
 
+        return center_black_percentage, left_black_percentage, right_black_percentage
+
+    def _dark_threshold(self, median:float) -> int:
+        return max(self.DARK_ABS_LUMA, int(self.DARK_REL_FACTOR * median))
+
+    def _thresholds(self, luma_hists:List[NDArray[np.float32]]) -> List[int]:
+        """Dark thresholds of the left, center and right sections from their histograms."""
+        if self.USE_SECTION_THRESHOLDS:
+            return [self._dark_threshold(histogram_median(hist)) for hist in luma_hists]
+        # Global median -> global threshold
+        thr = self._dark_threshold(histogram_median(sum(luma_hists)))
+        return [thr, thr, thr]
+
+    def _dark_percentages_histogram(self, y_luma:NDArray[np.uint8], chroma:NDArray[np.uint8],
+                                    chroma_max:int, swap_lr:bool,
+                                    sections:Tuple[Any, Any, Any]) -> Tuple[float, float, float]:
+        """Dark percentages from a luma histogram and a grey luma histogram per section.
+
+        The median of a section comes from its luma histogram, the dark count is the
+        number of grey pixels below the threshold in the grey histogram.
+        """
+        self._ensure_scratch(y_luma.shape)
+        # 255 where the pixel is grey, chroma <= chroma_max
+        cv2.threshold(chroma, chroma_max, 255, cv2.THRESH_BINARY_INV, dst=self._grey_u8)
+
+        luma_hists = [luma_histogram(y_luma[section]) for section in sections]
+        grey_hists = [luma_histogram(y_luma[section], self._grey_u8[section])
+                      for section in sections]
+
+        thresholds = self._thresholds(luma_hists)
+
+        left, center, right = (
+            dark_percentage(float(grey_hist[:thr].sum()), float(luma_hist.sum()))
+            for grey_hist, luma_hist, thr in zip(grey_hists, luma_hists, thresholds))
+
+        if swap_lr:
+            left, right = right, left
+        return center, left, right
+
+    def _percentages_to_distances(self, center_black_percentage:float,
+                                  left_black_percentage:float, right_black_percentage:float) \
+                                    -> Tuple[float, float, float, float, float, float]:
+        """Convert the dark percentages to distances."""
         center_distance = -1.0
         left_distance = -1.0
         right_distance = -1.0
@@ -210,11 +758,6 @@ class CameraDistanceMeasurements(ShutdownInterface):
             left_distance = self._colour_to_distance(left_black_percentage)
             right_distance = self._colour_to_distance(right_black_percentage)
 
-        if self.SAVE_CAMERA_IMAGE or (self.SAVE_CAMERA_IMAGE_ON_CORRECTION and \
-                                      (self.camera_front != -1 or self.camera_left != -1 \
-                                        or self.camera_right != -1)):
-            self._save_image(roi,counter,"full")
-
         # logger.info(
         #     "Camera Percentage: Center: %.2f, Left: %.2f, Right: %.2f",
         #     center_black_percentage, left_black_percentage, right_black_percentage
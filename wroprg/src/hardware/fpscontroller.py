@@ -0,0 +1,139 @@
+"""Load and thermal aware frame rate and ROI selection for the camera."""
+import logging
+import multiprocessing
+import time
+from typing import Any, NamedTuple, Optional
+
+from utils.pihealth import PiHealth
+
+logger = logging.getLogger(__name__)
+
+
+class ControlLoopMonitor:
+    """Counts control loop ticks which missed their deadline.
+
+    The count is kept in shared memory, so the vision process can read it too.
+    """
+
+    DEADLINE_MS = 50.0
+    # A longer gap is the loop being stopped (waiting between walks), not an overrun.
+    IDLE_GAP_MS = 500.0
+
+    def __init__(self) -> None:
+        self.overruns: Any = multiprocessing.get_context("spawn").RawValue("q", 0)
+        self.ticks = 0
+        self._last_tick: Optional[float] = None
+
+    def tick(self, now: Optional[float] = None) -> None:
+        """Call once per control loop iteration."""
+        if now is None:
+            now = time.monotonic()
+        if self._last_tick is not None:
+            period_ms = (now - self._last_tick) * 1000.0
+            if self.DEADLINE_MS < period_ms < self.IDLE_GAP_MS:
+                self.overruns.value += 1
+        self._last_tick = now
+        self.ticks += 1
+
+
+class FpsSetting(NamedTuple):
+    """Frame rate and ROI height fraction picked by the controller."""
+    fps: int
+    roi_frac: float
+    level: int
+
+
+class AdaptiveFpsController:
+    """Picks the camera frame rate and ROI size from the load of the Pi.
+
+    The detection state picks between the min and max frame rate as before. A
+    degradation level then lowers the frame rate and the ROI height when the CPU is
+    hot or throttled, or when the control loop misses its deadlines. The level goes
+    up at once under pressure and comes back one step at a time once it is gone.
+    The frame rate is also capped so the frame processing stays within its budget.
+    """
+
+    # (fps scale, ROI height scale) of each level.
+    LEVELS = ((1.0, 1.0), (0.8, 1.0), (0.6, 0.8), (0.4, 0.67))
+    TEMP_SOFT = 70.0  # °C, firmware soft limit is 80
+    TEMP_HARD = 78.0
+    BUDGET_FRACTION = 0.5  # share of a core the frame processing may use
+    FLOOR_FPS = 5
+    HEALTH_INTERVAL_S = 1.0
+    STEP_INTERVAL_S = 0.5
+    RECOVERY_S = 3.0
+    PROCESS_EMA_ALPHA = 0.2
+
+    def __init__(self, min_fps: int, max_fps: int, roi_frac: float,
+                 health: Optional[PiHealth] = None, overruns: Optional[Any] = None) -> None:
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.roi_frac = roi_frac
+        self._health = health
+        self._overruns = overruns
+        self._last_overruns = overruns.value if overruns is not None else 0
+        self.level = 0
+        self.process_ms = 0.0
+        self.temperature: Optional[float] = None
+        self.throttled = False
+        self._next_health = 0.0
+        self._last_step = -float("inf")
+        self._last_pressure = -float("inf")
+
+    def _read_health(self, now: float) -> None:
+        if self._health is None or now < self._next_health:
+            return
+        self._next_health = now + self.HEALTH_INTERVAL_S
+        self.temperature = self._health.read_temperature()
+        self.throttled = self._health.is_throttling()
+
+    def _new_overruns(self) -> int:
+        if self._overruns is None:
+            return 0
+        count = self._overruns.value
+        new = count - self._last_overruns
+        self._last_overruns = count
+        return new
+
+    def _update_level(self, now: float) -> None:
+        hot = self.temperature is not None and self.temperature >= self.TEMP_HARD
+        if hot or self.throttled:
+            self._set_level(len(self.LEVELS) - 1, now)
+            self._last_pressure = now
+            return
+
+        warm = self.temperature is not None and self.temperature >= self.TEMP_SOFT
+        overruns = self._new_overruns()
+        if warm or overruns > 0:
+            self._last_pressure = now
+            if now - self._last_step >= self.STEP_INTERVAL_S:
+                self._set_level(min(self.level + 1, len(self.LEVELS) - 1), now)
+        elif self.level > 0 and now - max(self._last_pressure, self._last_step) >= self.RECOVERY_S:
+            self._set_level(self.level - 1, now)
+
+    def _set_level(self, level: int, now: float) -> None:
+        self._last_step = now
+        if level != self.level:
+            logger.info("Camera load level %d -> %d, temp %s, throttled %s, frame %.1f ms",
+                        self.level, level, self.temperature, self.throttled, self.process_ms)
+            self.level = level
+
+    def update(self, detected: bool, process_ms: float,
+               now: Optional[float] = None) -> FpsSetting:
+        """Frame rate and ROI for the next frame, after a frame took process_ms."""
+        if now is None:
+            now = time.monotonic()
+        if self.process_ms == 0.0:
+            self.process_ms = process_ms
+        else:
+            self.process_ms += self.PROCESS_EMA_ALPHA * (process_ms - self.process_ms)
+
+        self._read_health(now)
+        self._update_level(now)
+
+        fps_scale, roi_scale = self.LEVELS[self.level]
+        fps = (self.max_fps if detected else self.min_fps) * fps_scale
+        if self.process_ms > 0:
+            fps = min(fps, self.BUDGET_FRACTION * 1000.0 / self.process_ms)
+        fps = int(max(self.FLOOR_FPS, min(self.max_fps, fps)))
+        return FpsSetting(fps, self.roi_frac * roi_scale, self.level)
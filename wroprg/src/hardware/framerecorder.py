@@ -0,0 +1,209 @@
+"""Raw camera frames recorded to a memory mapped file, and replayed without the Pi camera."""
+import json
+import logging
+import os
+import struct
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+
+from base.shutdown_handling import ShutdownInterface
+from hardware.camerameasurements import camera_clock
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"WROFRAME"
+VERSION = 1
+HEADER_SIZE = 4096
+# magic, frame count, metadata json length; the json follows.
+_HEADER = struct.Struct("<8sqI")
+
+
+def _layout(plane_shapes: Sequence[Tuple[int, ...]], capacity: int) \
+                                            -> Tuple[List[int], int, int]:
+    """Plane sizes, bytes per record and the file size."""
+    sizes = [int(np.prod(shape)) for shape in plane_shapes]
+    record_bytes = sum(sizes)
+    return sizes, record_bytes, HEADER_SIZE + 8 * capacity + record_bytes * capacity
+
+
+class FrameRecorder(ShutdownInterface):
+    """Appends frames and their timestamps to a preallocated memory mapped file.
+
+    A frame is one or more uint8 planes of fixed shapes (the Y, U and V lores planes,
+    or the ROI rows of the main frame). Appending is a copy into the page cache, the
+    kernel writes the pages back. The frame count in the header is updated after each
+    frame, so a recording stays readable when the run is killed.
+    """
+
+    def __init__(self, filename: str, plane_shapes: Sequence[Tuple[int, ...]], capacity: int,
+                 metadata: Optional[Dict[str, Any]] = None) -> None:
+        self.filename = filename
+        self.plane_shapes = [tuple(shape) for shape in plane_shapes]
+        self.capacity = capacity
+        self._sizes, record_bytes, file_size = _layout(self.plane_shapes, capacity)
+        info = dict(metadata or {})
+        info.update(version=VERSION, capacity=capacity,
+                    planes=[list(shape) for shape in self.plane_shapes])
+        info_bytes = json.dumps(info).encode("utf-8")
+        if _HEADER.size + len(info_bytes) > HEADER_SIZE:
+            raise ValueError("Frame recording metadata is too large")
+
+        try:
+            with open(filename, "wb") as f:
+                f.truncate(file_size)
+                if hasattr(os, "posix_fallocate"):
+                    # reserve the blocks now, the run does not fail on a full disk later.
+                    os.posix_fallocate(f.fileno(), 0, file_size)
+        except OSError:
+            # no partly allocated file is left behind on a full disk.
+            if os.path.exists(filename):
+                os.remove(filename)
+            raise
+        self._map: Any = np.memmap(filename, dtype=np.uint8, mode="r+", shape=(file_size,))
+        self._map[: _HEADER.size + len(info_bytes)] = np.frombuffer(
+            _HEADER.pack(MAGIC, 0, len(info_bytes)) + info_bytes, dtype=np.uint8)
+        self._count = self._map[8:16].view(np.int64)
+        self._timestamps = self._map[HEADER_SIZE : HEADER_SIZE + 8 * capacity].view(np.float64)
+        self._records = self._map[HEADER_SIZE + 8 * capacity :].reshape(capacity, record_bytes)
+        self.count = 0
+        self._full_logged = False
+        logger.info("Recording frames to %s, %d frames of %d bytes", filename, capacity,
+                    record_bytes)
+
+    def append(self, timestamp: float, *planes: NDArray[np.uint8]) -> bool:
+        """Record a frame, returns False when the file is full."""
+        if self.count >= self.capacity:
+            if not self._full_logged:
+                logger.warning("Frame recording %s is full", self.filename)
+                self._full_logged = True
+            return False
+        record = self._records[self.count]
+        offset = 0
+        for plane, shape, size in zip(planes, self.plane_shapes, self._sizes):
+            np.copyto(record[offset : offset + size].reshape(shape), plane)
+            offset += size
+        self._timestamps[self.count] = timestamp
+        self.count += 1
+        self._count[0] = self.count
+        return True
+
+    def shutdown(self) -> None:
+        """Flush and close the file."""
+        if self._map is None:
+            return
+        self._map.flush()
+        del self._count, self._timestamps, self._records
+        self._map = None
+        logger.info("Recorded %d frames to %s", self.count, self.filename)
+
+
+class FrameRecording:
+    """Read only view of a file written by FrameRecorder."""
+
+    def __init__(self, filename: str) -> None:
+        with open(filename, "rb") as f:
+            magic, count, info_length = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{filename} is not a frame recording")
+            self.metadata: Dict[str, Any] = json.loads(f.read(info_length))
+        if self.metadata.get("version") != VERSION:
+            raise ValueError(f"Unsupported frame recording version {self.metadata.get('version')}")
+        self.plane_shapes = [tuple(shape) for shape in self.metadata["planes"]]
+        capacity = int(self.metadata["capacity"])
+        self._sizes, record_bytes, file_size = _layout(self.plane_shapes, capacity)
+        self._map: Any = np.memmap(filename, dtype=np.uint8, mode="r", shape=(file_size,))
+        self.count = int(count)
+        self.timestamps = self._map[HEADER_SIZE : HEADER_SIZE + 8 * self.count].view(np.float64)
+        self._records = self._map[HEADER_SIZE + 8 * capacity :].reshape(capacity, record_bytes)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def planes(self, index: int) -> Tuple[NDArray[np.uint8], ...]:
+        """Planes of a frame, read only views of the file."""
+        record = self._records[index]
+        planes = []
+        offset = 0
+        for shape, size in zip(self.plane_shapes, self._sizes):
+            planes.append(record[offset : offset + size].reshape(shape))
+            offset += size
+        return tuple(planes)
+
+
+class ReplayCamera:
+    """Same interface as MyCamera, returns the frames of a recording.
+
+    With pace the frames come at their recorded rate, their timestamps moved to the
+    camera clock of the replay. Otherwise they come as fast as they are asked for,
+    stamped with the time of the capture, so frame ages and latencies stay meaningful
+    either way. recorded_timestamp keeps the original time. After the last frame
+    capture raises EOFError, or starts again with loop.
+    """
+
+    def __init__(self, recording: FrameRecording, pace: bool = False, loop: bool = False) -> None:
+        self.recording = recording
+        self.use_lores = bool(recording.metadata.get("use_lores", False))
+        self.pace = pace
+        self.loop = loop
+        self.index = 0
+        self.last_timestamp = 0.0
+        self.recorded_timestamp = 0.0
+        self._offset = 0.0
+
+    def start(self) -> None:
+        """Align the first recorded frame to now."""
+        self.index = 0
+        if len(self.recording):
+            self._offset = camera_clock() - float(self.recording.timestamps[0])
+
+    def _next(self) -> Tuple[NDArray[np.uint8], ...]:
+        if self.index >= len(self.recording):
+            if not self.loop or not len(self.recording):
+                raise EOFError("End of the frame recording")
+            self.start()
+        self.recorded_timestamp = float(self.recording.timestamps[self.index])
+        if self.pace:
+            timestamp = self.recorded_timestamp + self._offset
+            time.sleep(max(0.0, timestamp - camera_clock()))
+            self.last_timestamp = timestamp
+        else:
+            self.last_timestamp = camera_clock()
+        planes = self.recording.planes(self.index)
+        self.index += 1
+        return planes
+
+    def capture(self) -> NDArray[np.uint8]:
+        """Next frame as a BGR image of the recorded frame size."""
+        if self.use_lores:
+            # only debug saves capture the main frame in lores mode, convert the planes.
+            y_plane, u_plane, v_plane = self.capture_lores()
+            i420 = np.concatenate([y_plane.ravel(), u_plane.ravel(), v_plane.ravel()])
+            return cv2.cvtColor(i420.reshape(-1, y_plane.shape[1]), cv2.COLOR_YUV2BGR_I420)
+        (roi,) = self._next()
+        # rows outside the recorded ROI are black, the measurements do not read them.
+        metadata = self.recording.metadata
+        frame = np.zeros((int(metadata["frame_height"]),) + roi.shape[1:], dtype=np.uint8)
+        row_offset = int(metadata.get("row_offset", 0))
+        frame[row_offset : row_offset + roi.shape[0]] = roi
+        return frame
+
+    def capture_lores(self) -> Tuple[NDArray[np.uint8], NDArray[np.uint8], NDArray[np.uint8]]:
+        """Next Y, U and V planes."""
+        y_plane, u_plane, v_plane = self._next()
+        return y_plane, u_plane, v_plane
+
+    def close(self) -> None:
+        """Nothing to close, the recording stays open."""
+
+
+def replay_camera(filename: str, use_lores: bool) -> ReplayCamera:
+    """Camera factory for the vision worker, use functools.partial(replay_camera, filename)."""
+    camera = ReplayCamera(FrameRecording(filename), pace=True, loop=True)
+    if camera.use_lores != use_lores:
+        logger.warning("Recording %s lores %s, the worker asked for %s", filename,
+                       camera.use_lores, use_lores)
+    return camera
@@ -0,0 +1,245 @@
+"""Calibrated ground plane camera model, wall distances from the wall-floor boundary."""
+import json
+import logging
+import math
+import os
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+
+logger = logging.getLogger(__name__)
+
+
+class GroundReading(NamedTuple):
+    """Wall distances in cm (-1 when not seen) and wall angles in degrees (nan when not seen).
+
+    The front angle is 0 for a wall square to the heading, the side angles are 0 for a
+    wall parallel to the heading.
+    """
+    front: float = -1
+    left: float = -1
+    right: float = -1
+    front_angle: float = math.nan
+    left_angle: float = math.nan
+    right_angle: float = math.nan
+    front_p: float = 0
+    left_p: float = 0
+    right_p: float = 0
+
+
+class GroundPlaneModel:
+    """Camera intrinsics and the homography from image pixels to the floor.
+
+    Floor coordinates are in cm, x forward and y to the left of the robot, measured from
+    the reference point used during the calibration (front bumper center).
+    """
+
+    VERSION = 1
+    MAX_RANGE = 300.0  # cm, pixels mapping further away are treated as above the horizon
+
+    def __init__(self, homography: NDArray[np.float64], image_size: Tuple[int, int],
+                 camera_matrix: Optional[NDArray[np.float64]] = None,
+                 dist_coeffs: Optional[NDArray[np.float64]] = None) -> None:
+        """image_size: (width, height) of the calibration image."""
+        self.homography = np.asarray(homography, dtype=np.float64).reshape(3, 3)
+        self.image_size = (int(image_size[0]), int(image_size[1]))
+        self.camera_matrix = None if camera_matrix is None else \
+                                np.asarray(camera_matrix, dtype=np.float64).reshape(3, 3)
+        self.dist_coeffs = None if dist_coeffs is None else \
+                                np.asarray(dist_coeffs, dtype=np.float64).ravel()
+        self._scanners: Dict[Tuple[int, ...], "BoundaryScanner"] = {}
+
+    @classmethod
+    def from_correspondences(cls, image_points: NDArray[np.float64],
+                             ground_points: NDArray[np.float64], image_size: Tuple[int, int],
+                             camera_matrix: Optional[NDArray[np.float64]] = None,
+                             dist_coeffs: Optional[NDArray[np.float64]] = None) \
+                                                                    -> "GroundPlaneModel":
+        """Fit the homography from image points and their floor coordinates in cm."""
+        image_points = np.asarray(image_points, dtype=np.float64).reshape(-1, 1, 2)
+        if camera_matrix is not None and dist_coeffs is not None:
+            image_points = cv2.undistortPoints(image_points, camera_matrix, dist_coeffs,
+                                               P=camera_matrix)
+        homography, _ = cv2.findHomography(image_points,
+                                           np.asarray(ground_points, dtype=np.float64), 0)
+        if homography is None:
+            raise ValueError("Cannot fit the ground plane homography")
+        return cls(homography, image_size, camera_matrix, dist_coeffs)
+
+    def image_to_ground(self, points: NDArray[np.float64]) -> NDArray[np.float64]:
+        """Floor coordinates (x, y) of calibration image pixels (u, v), nan above the horizon."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if self.camera_matrix is not None and self.dist_coeffs is not None:
+            points = cv2.undistortPoints(points.reshape(-1, 1, 2), self.camera_matrix,
+                                         self.dist_coeffs, P=self.camera_matrix).reshape(-1, 2)
+        homogeneous = np.hstack([points, np.ones((len(points), 1))]) @ self.homography.T
+        w = homogeneous[:, 2]
+        ground = np.full((len(points), 2), np.nan)
+        visible = w > 1e-9
+        ground[visible] = homogeneous[visible, :2] / w[visible, None]
+        far = np.hypot(ground[:, 0], ground[:, 1]) > self.MAX_RANGE
+        ground[far] = np.nan
+        return ground
+
+    def scanner(self, shape: Tuple[int, int], rows: slice, near_first: bool,
+                column_step: int) -> "BoundaryScanner":
+        """Boundary scanner of a ROI of a measurement image, built once per geometry."""
+        key = (shape[0], shape[1], rows.start, rows.stop, near_first, column_step)
+        scanner = self._scanners.get(key)
+        if scanner is None:
+            scanner = BoundaryScanner(self, shape, rows, near_first, column_step)
+            self._scanners[key] = scanner
+        return scanner
+
+    def to_dict(self) -> Dict[str, object]:
+        """Serializable form of the model."""
+        return {
+            "version": self.VERSION,
+            "image_size": list(self.image_size),
+            "homography": self.homography.tolist(),
+            "camera_matrix": None if self.camera_matrix is None else self.camera_matrix.tolist(),
+            "dist_coeffs": None if self.dist_coeffs is None else self.dist_coeffs.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object]) -> "GroundPlaneModel":
+        """Model from to_dict output."""
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f"Unsupported ground plane version {data.get('version')}")
+        return cls(np.array(data["homography"]), tuple(data["image_size"]),  # type: ignore
+                   None if data.get("camera_matrix") is None else np.array(data["camera_matrix"]),
+                   None if data.get("dist_coeffs") is None else np.array(data["dist_coeffs"]))
+
+    def save(self, filename: str) -> None:
+        """Write the model to a json file."""
+        tmpname = filename + ".tmp"
+        with open(tmpname, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1)
+        os.replace(tmpname, filename)
+
+    @classmethod
+    def load(cls, filename: str) -> Optional["GroundPlaneModel"]:
+        """Read a model, None when the file is missing or invalid."""
+        if not os.path.exists(filename):
+            return None
+        try:
+            with open(filename, "r", encoding="utf-8") as f:
+                return cls.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error("Cannot read ground plane model %s: %s", filename, e)
+            return None
+
+
+class BoundaryScanner:
+    """Finds the wall-floor boundary of each sampled column of a ROI.
+
+    The floor coordinates of every ROI pixel of the sampled columns are computed once,
+    so the boundary row of a column is turned into a distance with a table lookup.
+    """
+
+    MIN_COLUMNS_FRAC = 0.25  # of the section columns, to accept a wall
+    # A steeper boundary is the other wall seen in this section (front wall in a side section).
+    MAX_WALL_ANGLE = 45.0
+
+    def __init__(self, model: GroundPlaneModel, shape: Tuple[int, int], rows: slice,
+                 near_first: bool, column_step: int) -> None:
+        height, width = shape
+        self.rows = rows
+        self.near_first = near_first
+        self.column_step = column_step
+        roi_h = rows.stop - rows.start
+        self.columns = np.arange(0, width, column_step)
+        section_w = width // 4
+        # 0: left, 1: center, 2: right, same split as the percentages.
+        self.section = np.digitize(self.columns, [section_w, 3 * section_w]).astype(np.intp)
+        bounds = np.searchsorted(self.section, [1, 2])
+        self.sections = (slice(0, int(bounds[0])), slice(int(bounds[0]), int(bounds[1])),
+                         slice(int(bounds[1]), len(self.columns)))
+
+        # calibration pixel of the center of each measurement pixel.
+        scale_x = model.image_size[0] / width
+        scale_y = model.image_size[1] / height
+        row_index = np.arange(rows.start, rows.stop)
+        if not near_first:
+            row_index = row_index[::-1]
+        u, v = np.meshgrid((self.columns + 0.5) * scale_x - 0.5,
+                           (row_index + 0.5) * scale_y - 0.5)
+        ground = model.image_to_ground(np.stack([u.ravel(), v.ravel()], axis=1))
+        # rows ordered from the near edge of the ROI.
+        self.ground_x = ground[:, 0].reshape(roi_h, len(self.columns))
+        self.ground_y = ground[:, 1].reshape(roi_h, len(self.columns))
+
+        self._column_index = np.arange(len(self.columns))
+        self._thresholds = np.empty(len(self.columns), dtype=np.uint8)
+        # column major, argmax along the rows then reads contiguous memory without a copy.
+        self._mask = np.empty((roi_h, len(self.columns)), dtype=np.bool_, order="F")
+        self._tmp = np.empty((roi_h, len(self.columns)), dtype=np.bool_, order="F")
+        self._pair = np.empty((roi_h - 1, len(self.columns)), dtype=np.bool_, order="F")
+
+    def scan(self, y_roi: NDArray[np.uint8], chroma_roi: NDArray[np.uint8],
+             thresholds: Sequence[int], chroma_max: int, swap_lr: bool) -> GroundReading:
+        """Distances and angles of the walls seen in the ROI."""
+        step = self.column_step
+        order = slice(None) if self.near_first else slice(None, None, -1)
+        y_cols = y_roi[order, ::step]
+        chroma_cols = chroma_roi[order, ::step]
+
+        np.take(np.asarray(thresholds, dtype=np.uint8), self.section, out=self._thresholds)
+        mask = self._mask
+        np.less(y_cols, self._thresholds, out=mask)
+        np.less_equal(chroma_cols, chroma_max, out=self._tmp)
+        np.logical_and(mask, self._tmp, out=mask)
+
+        # the boundary is the first of two dark rows from the near edge, ignores single pixels.
+        pair = self._pair
+        np.logical_and(mask[:-1], mask[1:], out=pair)
+        boundary = pair.argmax(axis=0)
+        found = pair[boundary, self._column_index]
+        ground_x = self.ground_x[boundary, self._column_index]
+        ground_y = self.ground_y[boundary, self._column_index]
+        found &= ~np.isnan(ground_x)
+
+        percentages: List[float] = []
+        for columns in self.sections:
+            section_mask = mask[:, columns]
+            percentages.append(float(np.count_nonzero(section_mask)) / max(1, section_mask.size)
+                               * 100.0)
+
+        left = self._side(found, ground_x, ground_y, 0)
+        front = self._front(found, ground_x, ground_y)
+        right = self._side(found, ground_x, ground_y, 2)
+        left_p, center_p, right_p = percentages
+        if swap_lr:
+            left, right = right, left
+            left_p, right_p = right_p, left_p
+        return GroundReading(front[0], left[0], right[0], front[1], left[1], right[1],
+                             center_p, left_p, right_p)
+
+    def _section_points(self, found: NDArray[np.bool_], section: int) -> NDArray[np.intp]:
+        columns = self.sections[section]
+        points = np.flatnonzero(found[columns]) + columns.start
+        if len(points) < max(2, int(self.MIN_COLUMNS_FRAC * (columns.stop - columns.start))):
+            return points[:0]
+        return points
+
+    def _front(self, found: NDArray[np.bool_], ground_x: NDArray[np.float64],
+               ground_y: NDArray[np.float64]) -> Tuple[float, float]:
+        columns = self._section_points(found, 1)
+        if len(columns) == 0:
+            return -1.0, math.nan
+        angle = math.degrees(math.atan(np.polyfit(ground_y[columns], ground_x[columns], 1)[0]))
+        if abs(angle) > self.MAX_WALL_ANGLE:
+            return -1.0, math.nan
+        return float(np.median(ground_x[columns])), angle
+
+    def _side(self, found: NDArray[np.bool_], ground_x: NDArray[np.float64],
+              ground_y: NDArray[np.float64], section: int) -> Tuple[float, float]:
+        columns = self._section_points(found, section)
+        if len(columns) == 0:
+            return -1.0, math.nan
+        angle = math.degrees(math.atan(np.polyfit(ground_x[columns], ground_y[columns], 1)[0]))
+        if abs(angle) > self.MAX_WALL_ANGLE:
+            return -1.0, math.nan
+        return float(np.median(np.abs(ground_y[columns]))), angle
@@ -9,7 +9,7 @@ import time
 import math
 import threading
 from typing import Callable
-from typing import List, Optional
+from typing import List, Optional, Union
 from board import SCL, SDA
 import busio
 import adafruit_ssd1306
@@ -26,6 +26,10 @@ from hardware.orientation import OrientationEstimator
 from hardware.camerameasurements import CameraDistanceMeasurements
 from hardware.screenlogger import ScreenLogger
 from hardware.camera import MyCamera
+from hardware.visionworker import VisionWorker
+from hardware.fpscontroller import ControlLoopMonitor
+from round2.pillardetector import PillarReading
+from round2.pillartracker import EgoMotion
 from utils import constants
 
 logger = logging.getLogger(__name__)
@@ -45,6 +49,11 @@ class HardwareInterface(ShutdownInterface):
     RIGHT_LASER_CHANNEL = 2
     DEVICE_I2C_CHANNEL = 6
     DISTANCE_FUSION = True
+    # Run the camera capture and measurements in a separate process.
+    USE_VISION_WORKER = True
+    # Camera distances from frames older than this many frame periods are not used,
+    # the period follows the frame rate the adaptive controller picks.
+    CAMERA_MAX_AGE_FRAMES = 2.0
 
     DISTANCE_SENSOR_DISTANCE = 12.5  # cm distance between sensors
 
@@ -178,8 +187,10 @@ class HardwareInterface(ShutdownInterface):
         )
         self.jumper_pin = Button(self.JUMPER_PIN, hold_time=1)
 
-        # Camera
-        self.camera = MyCamera()
+        # Camera, owned by the vision process when it is used.
+        self.camera: Optional[MyCamera] = None
+        if not self.USE_VISION_WORKER:
+            self.camera = MyCamera(use_lores=CameraDistanceMeasurements.USE_LORES_YUV)
 
         logger.info("Raspberry Pi peripherals initialized successfully.")
 
@@ -224,8 +235,25 @@ class HardwareInterface(ShutdownInterface):
 
         # Measurements
         self._measurements_manager: MeasurementFileLog = MeasurementFileLog(self)
-
-        self.camera_measurements = CameraDistanceMeasurements(self.camera)
+        # last steering angle read by the control loop, logged with its states.
+        self._steering_angle = 0.0
+
+        # ticked by the walker's read_state(tick=True) once per control loop iteration, the
+        # camera backs off on overruns.
+        self.loop_monitor = ControlLoopMonitor()
+        # yaw for the pillar tracker, written by read_state, and the distance driven,
+        # added by the walker.
+        self.ego_motion = EgoMotion()
+        self.camera_measurements: Union[CameraDistanceMeasurements, VisionWorker]
+        if self.camera is None:
+            use_lores = CameraDistanceMeasurements.USE_LORES_YUV
+            self.camera_measurements = VisionWorker(use_lores,
+                                                    overruns=self.loop_monitor.overruns,
+                                                    ego_motion=self.ego_motion)
+        else:
+            self.camera_measurements = CameraDistanceMeasurements(self.camera,
+                                                                  self.loop_monitor.overruns,
+                                                                  self.ego_motion)
 
     def camera_pause(self):
         """Camera Pause"""
@@ -235,6 +263,10 @@ class HardwareInterface(ShutdownInterface):
         "Camera Restart readings"
         self.camera_measurements.resume_readings()
 
+    def get_pillars(self) -> PillarReading:
+        """Pillars seen by the camera, needs CameraDistanceMeasurements.DETECT_PILLARS."""
+        return self.camera_measurements.get_pillars()
+
     def _full_initialization(self) -> None:
         """Initialize all hardware components."""
         self._lego_drive_base = BuildHatDriveBase(
@@ -289,9 +321,21 @@ class HardwareInterface(ShutdownInterface):
         )
         self._paint_display(image)
 
-    def get_yaw(self) -> float:
-        """Get the current yaw in degrees."""
-        return self._orientation_estimator.get_yaw()
+    def get_yaw(self, at: Optional[float] = None) -> float:
+        """Get the current yaw in degrees, or the yaw at the time.monotonic() time at."""
+        return self._orientation_estimator.get_yaw(at)
+
+    def get_heading(self, at: Optional[float] = None) -> float:
+        """Get the continuous heading in degrees since the start, counts past +-180."""
+        return self._orientation_estimator.get_heading(at)
+
+    def get_predicted_yaw(self, at: float) -> float:
+        """Get the yaw predicted at the time.monotonic() time at, from the gyro rate."""
+        return self._orientation_estimator.get_predicted_yaw(at)
+
+    def get_yaw_zero_heading(self) -> float:
+        """Get the heading of the yaw zero set by the last reset_gyro()."""
+        return self._orientation_estimator.get_yaw_zero_heading()
 
     def _buzzer_off_cb(self) -> None:
         with self._buzzer_lock:
@@ -421,7 +465,8 @@ class HardwareInterface(ShutdownInterface):
         except Exception as e:  # pylint: disable=broad-except
             logger.error("Error flushing OLED messages during shutdown: %s", e)
 
-        self.camera.close()
+        if self.camera is not None:
+            self.camera.close()
 
         try:
             # Ensure any async buzzer timers are cancelled and buzzer is off
@@ -475,7 +520,7 @@ class HardwareInterface(ShutdownInterface):
         self._lego_drive_base.reset_front_motor()
 
     def reset_gyro(self) -> float:
-        """Reset the yaw angle to zero."""
+        """Reset the yaw angle to zero, returns the turn since the previous reset."""
         if self._orientation_estimator is not None:
             return self._orientation_estimator.reset_yaw()
         else:
@@ -542,18 +587,30 @@ class HardwareInterface(ShutdownInterface):
         """Get the current steering angle in degrees."""
         if self._lego_drive_base is None:
             raise RuntimeError("LEGO Drive Base not initialized. Call full_initialization() first.")
-        return self._lego_drive_base.get_steering_angle()
+        self._steering_angle = self._lego_drive_base.get_steering_angle()
+        return self._steering_angle
 
     ## End of LEGO Driver Methods
-    def read_state(self) -> RobotState:
-        """Read the current state of the robot."""
+    def read_state(self, tick: bool = False) -> RobotState:
+        """Read the current state of the robot.
+
+        tick: the read is an iteration of the control loop, only the walker passes it so
+        the loop monitor does not count the reads of the measurement log or the validator.
+        """
+        if tick:
+            self.loop_monitor.tick()
+        start = time.monotonic()
         front = self._get_front_distance()
         left = self._get_left_distance()
         right = self._get_right_distance()
-        yaw = self.get_yaw()
-
-        (camera_front, camera_left, camera_right, _) = self.camera_measurements.get_distance()
-        return RobotState(
+        # yaw at the middle of the distance reads, interpolated between the IMU samples.
+        yaw = self.get_yaw(at=(start + time.monotonic()) / 2.0)
+        self.ego_motion.set_yaw(yaw)
+
+        (camera_front, camera_left, camera_right, metrics) = \
+                self.camera_measurements.get_distance(
+                    max_age_frames=self.CAMERA_MAX_AGE_FRAMES)
+        state = RobotState(
             front=front,
             left=left,
             right=right,
@@ -561,7 +618,12 @@ class HardwareInterface(ShutdownInterface):
             camera_front=camera_front,
             camera_left=camera_left,
             camera_right=camera_right,
+            camera_age=metrics.get('c.age_ms', -1),
         )
+        if tick:
+            # the measurement log records the states of the control loop, no reads of its own.
+            self._measurements_manager.push_state(state, self._steering_angle)
+        return state
 
     def disable_logger(self) -> None:
         """Disable the logger."""
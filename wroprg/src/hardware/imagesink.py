@@ -0,0 +1,100 @@
+"""Background writer of debug images, so JPEG encoding stays off the camera thread."""
+import collections
+import logging
+import threading
+from typing import Callable, Deque, Optional, Tuple
+
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+
+from base.shutdown_handling import ShutdownInterface
+
+logger = logging.getLogger(__name__)
+
+
+class ImageSink(ShutdownInterface):
+    """Writes images queued by the camera thread from a background thread.
+
+    submit() only keeps a reference to the image, so the caller must not reuse its
+    buffer. The queue is bounded: when the writer falls behind, the oldest image is
+    dropped. Only every decimation-th submitted image is queued.
+    """
+
+    QUEUE_SIZE = 8
+    STOP_TIMEOUT = 2.0
+
+    def __init__(self, prepare: Optional[Callable[[NDArray[np.uint8]], NDArray[np.uint8]]] = None,
+                 queue_size: int = QUEUE_SIZE, decimation: int = 1) -> None:
+        """prepare: conversion run on the writer thread before encoding."""
+        self._prepare = prepare
+        self._decimation = max(1, decimation)
+        self._queue: Deque[Tuple[str, NDArray[np.uint8]]] = collections.deque(maxlen=queue_size)
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.submitted = 0
+        self.decimated = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        """Start the writer thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._write_loop, name="imagesink",
+                                            daemon=True)
+            self._thread.start()
+
+    def submit(self, filename: str, image: NDArray[np.uint8]) -> bool:
+        """Queue an image, returns False when it is skipped by the decimation."""
+        self.submitted += 1
+        if (self.submitted - 1) % self._decimation:
+            self.decimated += 1
+            return False
+        with self._condition:
+            if len(self._queue) == self._queue.maxlen:
+                # the deque drops the oldest entry on append.
+                self.dropped += 1
+            self._queue.append((filename, image))
+            self._condition.notify()
+        return True
+
+    def pending(self) -> int:
+        """Images waiting to be written."""
+        return len(self._queue)
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue and not self._stop_event.is_set():
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                filename, image = self._queue.popleft()
+            self._write(filename, image)
+
+    def _write(self, filename: str, image: NDArray[np.uint8]) -> None:
+        try:
+            if self._prepare is not None:
+                image = self._prepare(image)
+            if cv2.imwrite(filename, image):
+                self.written += 1
+                return
+            logger.warning("Could not write image %s", filename)
+        except (cv2.error, OSError) as e:
+            logger.warning("Could not write image %s: %s", filename, e)
+        self.failed += 1
+
+    def shutdown(self) -> None:
+        """Write the queued images and stop the writer thread."""
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(self.STOP_TIMEOUT)
+            self._thread = None
+        if self.submitted:
+            logger.info("Image sink: %d submitted, %d written, %d dropped, %d decimated",
+                        self.submitted, self.written, self.dropped, self.decimated)
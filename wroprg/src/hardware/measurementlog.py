@@ -0,0 +1,312 @@
+"""Binary append-only measurement log, written by a background thread.
+
+Convert a log to the csv of MeasurementsLogger from the src folder:
+    python -m hardware.measurementlog measurements.bin [measurements.csv]
+
+The file is a header and a sequence of records, each a one byte tag and a fixed
+struct:
+    K  key:      key id, kind (f float, i int, b bool), name length; the utf-8 name
+    M  measure:  timestamp, left, right, front, steering, yaw, metric count;
+                 (key id, value) per metric
+    C  comment:  timestamp, text length; the utf-8 text
+Metric names are written once as K records and referred to by id after that.
+"""
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from base.shutdown_handling import ShutdownInterface
+
+if TYPE_CHECKING:
+    from hardware.measurements import Measurement
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"WROMLOG\0"
+VERSION = 1
+# magic, version
+_HEADER = struct.Struct("<8sI")
+_KEY = struct.Struct("<HcH")
+_MEASUREMENT = struct.Struct("<6dH")
+_METRIC = struct.Struct("<Hd")
+_COMMENT = struct.Struct("<dH")
+TAG_KEY = b"K"
+TAG_MEASUREMENT = b"M"
+TAG_COMMENT = b"C"
+
+COLUMNS = ("left_distance", "right_distance", "front_distance", "steering_angle", "yaw",
+           "timestamp")
+CSV_HEADER = ",".join(COLUMNS) + ",extra_metrics\n"
+# the numpy columns of load_measurements, in the order of the struct.
+MEASUREMENT_DTYPE = np.dtype([("timestamp", np.float64), ("left_distance", np.float64),
+                              ("right_distance", np.float64), ("front_distance", np.float64),
+                              ("steering_angle", np.float64), ("yaw", np.float64)])
+
+
+def _kind(value: Any) -> Optional[bytes]:
+    """Kind of a metric value, None when it is not a number."""
+    if isinstance(value, bool):
+        return b"b"
+    if isinstance(value, (int, np.integer)):
+        return b"i"
+    if isinstance(value, (float, np.floating)):
+        return b"f"
+    return None
+
+
+class BinaryMeasurementsLogger(ShutdownInterface):
+    """Same interface as MeasurementsLogger, writes the binary log.
+
+    The records are packed by the caller into a memory buffer, a background thread
+    writes the buffer every FLUSH_INTERVAL_S (or when it holds BUFFER_SIZE bytes) in one
+    write and calls fsync every FSYNC_INTERVAL_S. A crash loses at most the last
+    FSYNC_INTERVAL_S of records, the reader ignores a truncated last record.
+    """
+
+    BUFFER_SIZE = 256 * 1024
+    FLUSH_INTERVAL_S = 0.5
+    FSYNC_INTERVAL_S = 5.0
+
+    def __init__(self, filename: str = "measurements.bin") -> None:
+        self.filename = filename
+        self._file: Optional[Any] = None
+        self._buffer = bytearray()
+        self._keys: Dict[Tuple[str, bytes], int] = {}
+        # between the callers and the writer thread, guards the buffer and the keys.
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.records = 0
+        self.skipped_metrics = 0
+        self.bytes_written = 0
+
+    def open_file(self) -> None:
+        """Open the file for writing measurements, rotating if it already exists."""
+        if os.path.exists(self.filename):
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            root, ext = os.path.splitext(self.filename)
+            os.rename(self.filename, f"{root}_{timestamp}{ext}")
+        self._file = open(self.filename, "wb")  # pylint: disable=consider-using-with
+        with self._lock:
+            self._keys.clear()
+            self._buffer = bytearray(_HEADER.pack(MAGIC, VERSION))
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._write_loop, name="measurementlog",
+                                        daemon=True)
+        self._thread.start()
+
+    def writeheader(self) -> None:
+        """Open the file, the header is part of the format."""
+        self.open_file()
+
+    def _key_id(self, name: str, kind: bytes) -> int:
+        """Id of the metric, writes its K record the first time. Called with the lock."""
+        key = (name, kind)
+        key_id = self._keys.get(key)
+        if key_id is None:
+            key_id = len(self._keys)
+            self._keys[key] = key_id
+            encoded = name.encode("utf-8")
+            self._buffer += TAG_KEY + _KEY.pack(key_id, kind, len(encoded)) + encoded
+        return key_id
+
+    def write_measurement(self, measurement: "Measurement") -> None:
+        """Queue a measurement, its metrics that are not numbers are skipped."""
+        if self._file is None:
+            return
+        with self._lock:
+            metrics = bytearray()
+            count = 0
+            for name, value in measurement.extra_metrics.items():
+                kind = _kind(value)
+                if kind is None:
+                    self.skipped_metrics += 1
+                    continue
+                metrics += _METRIC.pack(self._key_id(name, kind), float(value))
+                count += 1
+            self._buffer += TAG_MEASUREMENT + _MEASUREMENT.pack(
+                measurement.timestamp, measurement.left_distance, measurement.right_distance,
+                measurement.front_distance, measurement.steering_angle, measurement.yaw,
+                count)
+            self._buffer += metrics
+            self.records += 1
+            full = len(self._buffer) >= self.BUFFER_SIZE
+        if full:
+            self._wakeup.set()
+
+    def write_comment(self, comment: str, timestamp: Optional[float] = None) -> None:
+        """Queue a comment."""
+        if self._file is None:
+            return
+        encoded = comment.encode("utf-8")[:0xFFFF]
+        with self._lock:
+            self._buffer += TAG_COMMENT + _COMMENT.pack(
+                time.time() if timestamp is None else timestamp, len(encoded)) + encoded
+
+    def _flush(self, fsync: bool) -> None:
+        """Write the buffered records, called by the writer thread."""
+        with self._lock:
+            data, self._buffer = self._buffer, bytearray()
+        if self._file is None:
+            return
+        try:
+            if data:
+                self._file.write(data)
+                self._file.flush()
+                self.bytes_written += len(data)
+            if fsync:
+                os.fsync(self._file.fileno())
+        except OSError as e:
+            logger.error("Cannot write measurement log %s: %s", self.filename, e)
+
+    def _write_loop(self) -> None:
+        last_fsync = time.monotonic()
+        while not self._stop_event.is_set():
+            self._wakeup.wait(self.FLUSH_INTERVAL_S)
+            self._wakeup.clear()
+            now = time.monotonic()
+            fsync = now - last_fsync >= self.FSYNC_INTERVAL_S
+            if fsync:
+                last_fsync = now
+            self._flush(fsync)
+
+    def close_file(self) -> None:
+        """Write the buffered records, sync and close the file."""
+        self._stop_event.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self._flush(fsync=True)
+            self._file.close()
+            self._file = None
+            logger.info("Measurement log %s: %d records, %d bytes", self.filename,
+                        self.records, self.bytes_written)
+
+    def shutdown(self) -> None:
+        self.close_file()
+
+
+class LogRecord(NamedTuple):
+    """A record of the log: a measurement with its metrics, or a comment."""
+    tag: bytes
+    timestamp: float
+    values: Tuple[float, ...]  # left, right, front, steering, yaw of a measurement
+    metrics: Dict[str, Any]
+    comment: str = ""
+
+
+def read_records(filename: str) -> Iterator[LogRecord]:
+    """Measurements and comments of a binary log in the order they were written."""
+    with open(filename, "rb") as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        raise ValueError(f"{filename} is not a measurement log")
+    magic, version = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{filename} is not a version {VERSION} measurement log")
+    keys: Dict[int, Tuple[str, bytes]] = {}
+    kinds = {b"f": float, b"i": int, b"b": bool}
+    offset = _HEADER.size
+    try:
+        while offset < len(data):
+            tag = data[offset:offset + 1]
+            offset += 1
+            if tag == TAG_KEY:
+                key_id, kind, length = _KEY.unpack_from(data, offset)
+                offset += _KEY.size
+                keys[key_id] = (data[offset:offset + length].decode("utf-8"), kind)
+                offset += length
+            elif tag == TAG_MEASUREMENT:
+                timestamp, *values, count = _MEASUREMENT.unpack_from(data, offset)
+                offset += _MEASUREMENT.size
+                metrics: Dict[str, Any] = {}
+                for _ in range(count):
+                    key_id, value = _METRIC.unpack_from(data, offset)
+                    offset += _METRIC.size
+                    name, kind = keys[key_id]
+                    metrics[name] = kinds[kind](value)
+                yield LogRecord(tag, timestamp, tuple(values), metrics)
+            elif tag == TAG_COMMENT:
+                timestamp, length = _COMMENT.unpack_from(data, offset)
+                offset += _COMMENT.size
+                text = data[offset:offset + length]
+                if len(text) < length:
+                    raise struct.error("truncated comment")
+                offset += length
+                yield LogRecord(tag, timestamp, (), {}, text.decode("utf-8"))
+            else:
+                raise ValueError(f"Unknown record {tag!r} at {offset - 1} in {filename}")
+    except struct.error:
+        # the writer stopped in the middle of the last record.
+        logger.warning("Measurement log %s ends with a truncated record", filename)
+
+
+class MeasurementLog(NamedTuple):
+    """A binary log loaded into numpy arrays."""
+    measurements: NDArray[Any]  # MEASUREMENT_DTYPE, one row per measurement
+    metrics: Dict[str, NDArray[np.float64]]  # per row, nan where the metric is missing
+    comments: List[Tuple[float, str]]
+
+
+def load_measurements(filename: str) -> MeasurementLog:
+    """Measurements as a structured array and the metrics as columns of the same rows."""
+    rows: List[Tuple[float, ...]] = []
+    metric_rows: List[Dict[str, Any]] = []
+    comments: List[Tuple[float, str]] = []
+    for record in read_records(filename):
+        if record.tag == TAG_COMMENT:
+            comments.append((record.timestamp, record.comment))
+        else:
+            rows.append((record.timestamp,) + record.values)
+            metric_rows.append(record.metrics)
+    measurements = np.array(rows, dtype=MEASUREMENT_DTYPE)
+    names = sorted({name for metrics in metric_rows for name in metrics})
+    columns = {name: np.full(len(rows), np.nan) for name in names}
+    for row, metrics in enumerate(metric_rows):
+        for name, value in metrics.items():
+            columns[name][row] = value
+    return MeasurementLog(measurements, columns, comments)
+
+
+def to_csv(filename: str, csv_filename: str) -> int:
+    """Write the log as the csv of MeasurementsLogger, returns the measurements written."""
+    count = 0
+    with open(csv_filename, "w", encoding="utf-8") as f:
+        f.write(CSV_HEADER)
+        for record in read_records(filename):
+            if record.tag == TAG_COMMENT:
+                f.write(f"# {record.comment}\n")
+                continue
+            left, right, front, steering, yaw = record.values
+            json_escaped = json.dumps(record.metrics, separators=(',', ':')).replace('"', '""')
+            f.write(f"{left:.2f},{right:.2f},{front:.2f},{steering:.2f},{yaw:.2f},"
+                    f"{record.timestamp:.2f},\"{json_escaped}\"\n")
+            count += 1
+    return count
+
+
+def main() -> None:
+    """Convert a binary log to csv."""
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2:
+        print("usage: python -m hardware.measurementlog measurements.bin [measurements.csv]")
+        sys.exit(1)
+    filename = sys.argv[1]
+    csv_filename = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(filename)[0] + ".csv"
+    count = to_csv(filename, csv_filename)
+    print(f"{count} measurements written to {csv_filename}")
+
+
+if __name__ == "__main__":
+    main()
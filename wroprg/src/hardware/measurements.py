@@ -3,10 +3,12 @@ import time
 import logging
 import os
 import json
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple, Union
 import threading
 from base.shutdown_handling import ShutdownInterface
+from hardware.measurementlog import BinaryMeasurementsLogger
 from hardware.robotstate import RobotState
+from utils.snapshot import SnapshotPublisher
 
 logger = logging.getLogger(__name__)
 
@@ -126,16 +128,32 @@ class MeasurementsLogger:
             self._file = None
 
 class MeasurementFileLog(ShutdownInterface):
-    """Class to read and store measurements from hardware sensors in a separate thread."""
+    """Stores the states the control loop read, and shows them on the screen, from a
+    separate thread. The hardware is not read again for the log."""
 
     ENABLE_MEASURE_LOG = False
+    # "csv": MeasurementsLogger, flushed per line. "binary": BinaryMeasurementsLogger,
+    # buffered by a background writer, convert with python -m hardware.measurementlog.
+    LOG_FORMAT: str = "csv"
+    # seconds between measurements, the latest pushed state is logged. The binary log
+    # keeps up with the control rate (0.02).
+    LOG_INTERVAL_S: float = 1.0
+    SCREEN_INTERVAL_S: float = 1.0
 
     def __init__(self, hardware_interface: "HardwareInterface"):
 
         self._reading_thread: threading.Thread | None = None
         self._stop_event = threading.Event()
         self._hardware_interface = hardware_interface
-        self._mlogger = MeasurementsLogger()
+        self._mlogger: Union[MeasurementsLogger, BinaryMeasurementsLogger] = \
+            BinaryMeasurementsLogger() if self.LOG_FORMAT == "binary" else MeasurementsLogger()
+        # state of the control loop and the steering angle, None until the first push.
+        self._states: SnapshotPublisher[Optional[Tuple[RobotState, float]]] = \
+                                                                SnapshotPublisher(None)
+
+    def push_state(self, state: RobotState, steering_angle: float) -> None:
+        """State read by the control loop, logged by the reading thread."""
+        self._states.publish((state, steering_angle))
 
     def add_measurement(self, measurement: Measurement) -> None:
         """Add a new measurement to the list."""
@@ -147,34 +165,36 @@ class MeasurementFileLog(ShutdownInterface):
         self._mlogger.write_comment(comment)
 
     def _read_hardware_loop(self) -> None:
-        """Thread target: read hardware every 0.5 seconds."""
-        start_time = time.time()
+        """Thread target: log the latest pushed state every LOG_INTERVAL_S seconds."""
+        start_time = time.monotonic()
+        next_screen = 0.0
+        sequence = 0
         while not self._stop_event.is_set():
-            if self._hardware_interface is not None:
-                metrics: Dict[str, Any] = {}
-                state: RobotState = self._hardware_interface.read_state()
-                steering_angle = self._hardware_interface.get_steering_angle()
-                yaw = self._hardware_interface.get_yaw()
-                # Create a new measurement with the current timestamp
-                timestamp = time.time()
-                counter = int((timestamp - start_time)*1000)
+            snapshot = self._states.newer_than(sequence)
+            if snapshot is not None and self._hardware_interface is not None:
+                sequence = snapshot.sequence
+                state, steering_angle = snapshot.value
+                # milliseconds since the start, at the time the state was pushed.
+                counter = int((snapshot.timestamp - start_time)*1000)
 
+                metrics: Dict[str, Any] = {}
                 (_,_,_, metrics) = self._hardware_interface.camera_measurements.get_distance()
 
                 measurement = Measurement(state.left, state.right, state.front,
                             steering_angle,
-                            yaw, counter, extra_metrics=metrics)
+                            state.yaw, counter, extra_metrics=metrics)
 
 
                 if  self.ENABLE_MEASURE_LOG:
                     self.add_measurement(measurement)
 
-                self._hardware_interface.log_message(front=state.front, left=state.left,
-                                                     right=state.right, current_yaw=yaw,
-                                                     current_steering=steering_angle)
-
+                if snapshot.timestamp >= next_screen:
+                    next_screen = snapshot.timestamp + self.SCREEN_INTERVAL_S
+                    self._hardware_interface.log_message(front=state.front, left=state.left,
+                                                         right=state.right, current_yaw=state.yaw,
+                                                         current_steering=steering_angle)
 
-            time.sleep(1)
+            self._stop_event.wait(self.LOG_INTERVAL_S)
 
     def start_reading(self) -> None:
         """Start the background thread for reading hardware."""
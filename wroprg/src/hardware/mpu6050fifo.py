@@ -0,0 +1,166 @@
+"""MPU6050 gyro z-rate queued in the sensor FIFO and drained in bulk reads."""
+import logging
+import time
+from typing import Any, List, NamedTuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ADDRESS = 0x68
+
+# registers
+SMPLRT_DIV = 0x19
+CONFIG = 0x1A
+GYRO_CONFIG = 0x1B
+FIFO_EN = 0x23
+INT_STATUS = 0x3A
+USER_CTRL = 0x6A
+PWR_MGMT_1 = 0x6B
+FIFO_COUNT_H = 0x72
+FIFO_R_W = 0x74
+
+# register bits
+FIFO_EN_ZG = 0x10
+USER_CTRL_FIFO_EN = 0x40
+USER_CTRL_FIFO_RESET = 0x04
+INT_STATUS_FIFO_OFLOW = 0x10
+PWR_MGMT_1_CLOCK_PLL_XGYRO = 0x01
+
+FIFO_SIZE = 1024
+# gyro z only, big endian int16.
+BYTES_PER_SAMPLE = 2
+# gyro output rate with the digital low pass filter on.
+GYRO_OUTPUT_RATE_HZ = 1000.0
+# LSB per deg/s of the full scale ranges 250, 500, 1000, 2000 deg/s.
+GYRO_SCALES = (131.0, 65.5, 32.8, 16.4)
+
+
+class GyroSample(NamedTuple):
+    """One FIFO sample."""
+    timestamp: float  # time.monotonic() of the sample period
+    rate_z: float  # deg/s, counter clockwise positive with the chip facing up
+
+
+class MPU6050Fifo:
+    """MPU6050 gyro z sampled by the chip at rate_hz into its FIFO.
+
+    read_samples() returns every sample queued since the last call, however late it is
+    called, so no sample is lost and the integration step is the exact sample period.
+    The timestamps follow the sample clock of the chip, steered slowly toward
+    time.monotonic() so they do not drift with its oscillator.
+
+    i2c_device: an adafruit_bus_device I2CDevice, or anything with the same context
+    manager, write() and write_then_readinto().
+    """
+
+    # bytes per bus transfer, linux I2C handles more but keep the bus free for others.
+    READ_CHUNK = 512
+    # part of the timestamp error to the monotonic clock removed at each read.
+    CLOCK_GAIN = 0.05
+    # larger errors re-anchor the sample clock (long stall, bus error).
+    MAX_CLOCK_ERROR_S = 0.05
+
+    def __init__(self, i2c_device: Any, rate_hz: float = 200.0, gyro_range: int = 0,
+                 dlpf: int = 3) -> None:
+        """gyro_range: FS_SEL 0..3 (250 .. 2000 deg/s), dlpf: DLPF_CFG 1..6 (3 is 44 Hz)."""
+        self.i2c_device = i2c_device
+        divider = min(255, max(0, round(GYRO_OUTPUT_RATE_HZ / rate_hz) - 1))
+        self.rate_hz = GYRO_OUTPUT_RATE_HZ / (1 + divider)
+        self.period = 1.0 / self.rate_hz
+        self._divider = divider
+        self._gyro_range = gyro_range
+        self._gyro_scale = GYRO_SCALES[gyro_range]
+        self._dlpf = dlpf
+        # deg/s subtracted from every sample, see estimate_bias()
+        self.bias = 0.0
+        self.overflows = 0
+        # time of the next sample in the FIFO, set by reset_fifo()
+        self._next_timestamp = 0.0
+        self.configure()
+
+    @classmethod
+    def from_i2c(cls, i2c: Any, address: int = ADDRESS, **kwargs: Any) -> "MPU6050Fifo":
+        """Open the sensor on an I2C bus or TCA channel."""
+        # only available on the robot.
+        from adafruit_bus_device.i2c_device import I2CDevice  # pylint: disable=import-outside-toplevel
+        return cls(I2CDevice(i2c, address), **kwargs)
+
+    def _write_register(self, reg: int, value: int) -> None:
+        with self.i2c_device as i2c:
+            i2c.write(bytes([reg, value]))
+
+    def _read_register(self, reg: int, length: int = 1) -> bytearray:
+        buf = bytearray(length)
+        with self.i2c_device as i2c:
+            i2c.write_then_readinto(bytes([reg]), buf)
+        return buf
+
+    def configure(self) -> None:
+        """Wake the sensor, set the sample rate and range and start the FIFO."""
+        self._write_register(PWR_MGMT_1, PWR_MGMT_1_CLOCK_PLL_XGYRO)
+        self._write_register(CONFIG, self._dlpf)
+        self._write_register(SMPLRT_DIV, self._divider)
+        self._write_register(GYRO_CONFIG, self._gyro_range << 3)
+        self._write_register(FIFO_EN, FIFO_EN_ZG)
+        self.reset_fifo()
+        logger.info("MPU6050 FIFO at %.1f Hz, range %d", self.rate_hz, self._gyro_range)
+
+    def reset_fifo(self) -> None:
+        """Drop the queued samples and restart the sample clock."""
+        self._write_register(USER_CTRL, USER_CTRL_FIFO_RESET)
+        self._write_register(USER_CTRL, USER_CTRL_FIFO_EN)
+        self._next_timestamp = time.monotonic() + self.period
+
+    def fifo_count(self) -> int:
+        """Bytes queued in the FIFO."""
+        high, low = self._read_register(FIFO_COUNT_H, 2)
+        return (high << 8) | low
+
+    def read_samples(self) -> List[GyroSample]:
+        """All complete samples queued since the last call, oldest first.
+
+        An overflowed FIFO has lost samples, it is reset and nothing is returned.
+        """
+        status = self._read_register(INT_STATUS)[0]
+        count = self.fifo_count()
+        now = time.monotonic()
+        if status & INT_STATUS_FIFO_OFLOW or count >= FIFO_SIZE:
+            self.overflows += 1
+            logger.warning("MPU6050 FIFO overflow #%d, %d bytes dropped", self.overflows, count)
+            self.reset_fifo()
+            return []
+        samples = count // BYTES_PER_SAMPLE
+        if samples == 0:
+            return []
+        data = bytearray()
+        remaining = samples * BYTES_PER_SAMPLE
+        while remaining > 0:
+            chunk = min(remaining, self.READ_CHUNK)
+            data += self._read_register(FIFO_R_W, chunk)
+            remaining -= chunk
+        rates = np.frombuffer(bytes(data), dtype=">i2") / self._gyro_scale - self.bias
+
+        timestamps = self._next_timestamp + np.arange(samples) * self.period
+        # the newest sample was taken in the last period before the count was read.
+        error = (now - self.period / 2.0) - timestamps[-1]
+        if abs(error) > self.MAX_CLOCK_ERROR_S:
+            logger.debug("MPU6050 sample clock off by %.1f ms, re-anchored", error * 1000.0)
+            timestamps += error
+            error = 0.0
+        self._next_timestamp = float(timestamps[-1]) + self.period + self.CLOCK_GAIN * error
+        return [GyroSample(float(t), float(r)) for t, r in zip(timestamps, rates)]
+
+    def estimate_bias(self, duration_s: float = 1.0) -> float:
+        """Mean rate of the robot standing still for duration_s, subtracted from now on."""
+        self.bias = 0.0
+        self.reset_fifo()
+        rates: List[float] = []
+        end = time.monotonic() + duration_s
+        while time.monotonic() < end:
+            time.sleep(0.05)
+            rates.extend(sample.rate_z for sample in self.read_samples())
+        if rates:
+            self.bias = float(np.mean(rates))
+        logger.info("MPU6050 gyro z bias %.3f deg/s over %d samples", self.bias, len(rates))
+        return self.bias
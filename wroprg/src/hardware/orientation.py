@@ -2,75 +2,139 @@
 import math
 import time
 import logging
+from typing import Optional, Tuple
 from board import SCL, SDA
 import busio
 import adafruit_bno055
 import adafruit_tca9548a
 # Using BNO055 for full orientation (fusion on-chip)
 from base.shutdown_handling import ShutdownInterface
-from utils.threadingfunctions import ConstantUpdateThread
+from hardware.mpu6050fifo import MPU6050Fifo
+from hardware.yawsampler import ContinuousHeading, GyroYawPredictor, YawSampler, \
+    quaternion_heading_deg
+from utils.snapshot import SnapshotPublisher
 logger = logging.getLogger(__name__)
 
 class OrientationEstimator(ShutdownInterface):
     """
-    Estimates orientation using BNO055
+    Estimates orientation using BNO055, optionally with the MPU6050 FIFO gyro (IMU_BACKEND)
     """
 
+    # BNO055 fusion output rate, reading faster only returns the same value again.
+    SAMPLE_RATE_HZ: float = 100.0
+    # "quaternion": heading from the fused quaternion (1/16384 resolution, no euler
+    # singularities), "euler": the euler heading (1/16 degree).
+    HEADING_SOURCE: str = "quaternion"
+    # Integrate the gyro z-rate between the fused headings, for a yaw without the fusion
+    # lag and a predicted yaw at the time a command takes effect.
+    GYRO_PREDICTION: bool = True
+    GYRO_RATE_HZ: float = 200.0
+    # The gyro z (BNO055 and MPU6050 facing up) is counter clockwise positive, the yaw
+    # is positive to the right.
+    GYRO_Z_SIGN: float = -1.0
+    # "bno055": fused heading and gyro of the BNO055, "mpu6050": the MPU6050 FIFO gyro
+    # integrated alone, "bno055+mpu6050": BNO055 fused heading corrects the MPU6050 gyro.
+    IMU_BACKEND: str = "bno055"
+    # MPU6050 FIFO sample rate, drained every sampler tick.
+    MPU_RATE_HZ: float = 200.0
+
     def __init__(self, device_channel):
 
         # Sensors on I2C: use BNO055 for fused orientation
         # device_channel is expected to be a TCA channel (i2c proxy) or an I2C object
         # keep reference to channel so we can re-create the driver if needed
         self._device_channel = device_channel
-        try:
-            self.bno = adafruit_bno055.BNO055_I2C(self._device_channel)
-        except Exception:
-            logger.exception('Failed to initialize BNO055')
-            self.bno = None
-
-        # State kept in DEGREES
-        self.yaw = 0.0
-        # Yaw zero-reference (degrees). Reported yaw = yaw - this offset.
-        self._yaw_zero_offset_deg = 0.0
-        # If True, the first valid reading will set the yaw zero offset.
-        self._zero_on_first_valid = True
-
-        # start update thread around 100Hz (10 ms interval)
-        self._thread = ConstantUpdateThread(self.update, interval_ms=2)
+        self.bno = None
+        if self.IMU_BACKEND != "mpu6050":
+            try:
+                self.bno = adafruit_bno055.BNO055_I2C(self._device_channel)
+            except Exception:
+                logger.exception('Failed to initialize BNO055')
+        self._mpu: Optional[MPU6050Fifo] = None
+        if self.IMU_BACKEND != "bno055":
+            try:
+                self._mpu = MPU6050Fifo.from_i2c(self._device_channel,
+                                                 rate_hz=self.MPU_RATE_HZ)
+            except Exception:
+                logger.exception('Failed to initialize MPU6050')
+
+        # State kept in DEGREES: last sanitized reading in [-180, 180) and its unwrapped
+        # yaw, published together by the sampler thread.
+        self._reading: SnapshotPublisher[Tuple[float, float]] = SnapshotPublisher((0.0, 0.0))
+        # Multi-turn heading and the virtual yaw zero, set by the first valid reading.
+        self._heading = ContinuousHeading()
+
+        # gyro rate integrated between the fused headings, None reads the fusion only.
+        self._predictor: Optional[GyroYawPredictor] = GyroYawPredictor() \
+                        if self.GYRO_PREDICTION or self.IMU_BACKEND != "bno055" else None
+        # the MPU6050 queues its samples, one drain per fusion output is enough.
+        rate_hz = self.GYRO_RATE_HZ \
+                    if self._predictor is not None and self.IMU_BACKEND == "bno055" \
+                    else self.SAMPLE_RATE_HZ
+        # the fused heading is read every _fused_every gyro samples.
+        self._fused_every = max(1, round(rate_hz / self.SAMPLE_RATE_HZ))
+        self._gyro_ticks = 0
+
+        # timestamped samples, see get_yaw(at=...)
+        self._sampler = YawSampler(self._read_sample, rate_hz)
 
         # BNO sanitizer for spike rejection / smoothing
         # Simplified: sanitizer no longer attempts device reinitialization.
-        self._bno_sanitizer = self._BNOSanitizer()
+        self._bno_sanitizer = self._BNOSanitizer(1.0 / self.SAMPLE_RATE_HZ)
         # Update-rate measurement
         self._updates_since_rate = 0
         self._rate_log_interval = 1000
         self._rate_last_time = time.monotonic()
 
 
+    @property
+    def yaw(self) -> float:
+        """Last sanitized device yaw in [-180, 180), not relative to the yaw zero."""
+        return self._reading.value[0]
+
     def reset_yaw(self)-> float:
-        """Reset Yaw"""
-        # Use the current fused reading as the zero reference. If no reading
-        # is available, mark to zero on first valid update.
-        try:
-            euler = None
-            if self.bno is not None:
-                euler = self.bno.euler
-        except Exception:
-            euler = None
+        """Reset Yaw, returns the turn in degrees since the previous reset.
+
+        The zero is virtual: it moves to the latest sample, there is no device access.
+        Before the first valid reading the zero is set by that reading.
+        """
+        return self._heading.reset_yaw()
 
-        if euler is None or euler[0] is None:
-            self._zero_on_first_valid = True
-            return 0.0
+    def _unwrapped_at(self, at: Optional[float]) -> Optional[float]:
+        if at is None:
+            latest = self._sampler.ring.latest()
+            return self._heading.unwrapped if latest is None else latest[1]
+        sampled = self._sampler.ring.yaw_at(at)
+        return self._heading.unwrapped if sampled is None else sampled
+
+    def get_yaw(self, at: Optional[float] = None) -> float:
+        """Returns the current yaw, or the yaw at the time.monotonic() time at.
+
+        The yaw at a time is interpolated between the samples around it, so it can be
+        aligned with the time of other sensor reads.
+        """
+        # relative to the yaw zero, normalized to [-180, 180)
+        return self._heading.yaw(self._unwrapped_at(at))
 
-        # store current heading as offset (degrees)
-        self._yaw_zero_offset_deg = (euler[0] or 0.0)
-        return self._yaw_zero_offset_deg
+    def get_heading(self, at: Optional[float] = None) -> float:
+        """Continuous heading in degrees since the start, 720 after two laps to the right."""
+        return self._heading.heading(self._unwrapped_at(at))
 
-    def get_yaw(self) -> float:
-        """Returns the current yaw"""
-        # Apply zero-offset and normalize to [-180, 180)
-        raw = (self.yaw - getattr(self, '_yaw_zero_offset_deg', 0.0) + 180.0) % 360.0 - 180.0
-        return raw
+    def get_predicted_yaw(self, at: float) -> float:
+        """Yaw predicted at the time.monotonic() time at, usually a little ahead.
+
+        The gyro rate carries the yaw past the newest sample, so a check of the yaw
+        allows for the time a steering or motor command takes to act.
+        """
+        if self._predictor is not None:
+            predicted = self._predictor.predict(at)
+            if predicted is not None:
+                return self._heading.yaw(predicted)
+        return self.get_yaw(at)
+
+    def get_yaw_zero_heading(self) -> float:
+        """Heading of the yaw zero, get_heading() - get_yaw() without the wrap."""
+        return self._heading.yaw_zero_heading
 
     def get_anomaly_count(self) -> int:
         """Return the current anomaly counter from the BNO sanitizer."""
@@ -98,44 +162,86 @@ class OrientationEstimator(ShutdownInterface):
 
     def shutdown(self):
         """Shutdown readings"""
-        self._thread.stop()
+        self._sampler.stop()
 
     def start_readings(self):
         """Start Reading"""
         # Defer yaw zeroing to the first valid fused update if no valid
         # reading currently available. reset_yaw will set the flag.
         self.reset_yaw()
-        self._thread.start()
+        if self._mpu is not None:
+            # the robot stands still at the start.
+            self._mpu.estimate_bias()
+        self._sampler.start()
 
     def update(self):
-
-        # Read BNO Euler angles (heading, roll, pitch) and apply sanitization
-        euler = None
+        """Read and store one sample."""
+        self._sampler.sample()
+
+    def _read_sample(self) -> Optional[float]:
+        """Unwrapped yaw of one sampler tick, the gyro predicted yaw when enabled."""
+        if self._predictor is None:
+            return self._read_yaw()
+        if self.IMU_BACKEND == "bno055":
+            rate = self._read_gyro_rate()
+            if rate is not None:
+                self._predictor.add_rate(time.monotonic(), rate)
+        elif self._mpu is not None:
+            samples = self._mpu.read_samples()
+            if self.IMU_BACKEND == "mpu6050" and samples and self._predictor.yaw is None:
+                # no fused heading, the integration starts at 0.
+                self._predictor.add_fused(samples[0].timestamp, 0.0)
+            for sample in samples:
+                self._predictor.add_rate(sample.timestamp, self.GYRO_Z_SIGN * sample.rate_z)
+            if self.IMU_BACKEND == "mpu6050":
+                return self._integrated_yaw()
+        self._gyro_ticks += 1
+        if self._gyro_ticks >= self._fused_every or self._predictor.yaw is None:
+            self._gyro_ticks = 0
+            fused = self._read_yaw()
+            if fused is not None:
+                self._predictor.add_fused(time.monotonic(), fused)
+        return self._predictor.yaw
+
+    def _integrated_yaw(self) -> Optional[float]:
+        """Unwrapped yaw of the gyro integration alone, it starts at 0."""
+        if self._predictor is None or self._predictor.yaw is None:
+            return None
+        yaw = self._wrap_angle_deg(self._predictor.yaw)
+        self._reading.publish((yaw, self._heading.update(yaw)))
+        return self._predictor.yaw
+
+    def _read_gyro_rate(self) -> Optional[float]:
+        """Gyro z-rate in degrees per second positive to the right, None when the read
+        fails."""
         try:
-            if self.bno is not None:
-                # adafruit_bno055.BNO055_I2C.euler returns (heading, roll, pitch)
-                euler = self.bno.euler
+            if self.bno is None:
+                return None
+            # adafruit_bno055.BNO055_I2C.gyro returns (x, y, z) in rad/s
+            gyro = self.bno.gyro
+            if gyro is None or gyro[2] is None:
+                return None
+            return self.GYRO_Z_SIGN * math.degrees(gyro[2])
         except Exception as e:
-            logger.debug("BNO read failed: %s", e)
+            logger.debug("BNO gyro read failed: %s", e)
+            return None
 
-        # If euler data not available, keep previous values
-        if euler is None or euler[0] is None:
-            # no new measurement, keep fused state
-            return
+    def _read_yaw(self) -> Optional[float]:
+        """Sanitized yaw of the BNO, None when there is no new measurement."""
 
-        # euler is (heading, roll, pitch) in degrees on Adafruit driver
-        heading, _, _ = euler
+        heading = self._read_heading()
+        # If no data available, keep previous values
+        if heading is None:
+            # no new measurement, keep fused state
+            return None
 
         # sanitize and smooth using BNOSanitizer
         yaw = self._bno_sanitizer.sanitize(heading)
 
         # Ensure yaw wraps consistently
-        self.yaw = self._wrap_angle_deg(yaw)
-
-        # Apply one-time yaw-zeroing if requested
-        if getattr(self, '_zero_on_first_valid', False):
-            self._yaw_zero_offset_deg = self.yaw
-            self._zero_on_first_valid = False
+        yaw = self._wrap_angle_deg(yaw)
+        unwrapped = self._heading.update(yaw)
+        self._reading.publish((yaw, unwrapped))
         # Track update count and measure rate
         self._updates_since_rate += 1
         if self._updates_since_rate >= self._rate_log_interval:
@@ -150,6 +256,25 @@ class OrientationEstimator(ShutdownInterface):
             # reset counters
             self._updates_since_rate = 0
             self._rate_last_time = now
+        return unwrapped
+
+    def _read_heading(self) -> Optional[float]:
+        """Raw BNO heading in degrees, None when the read fails."""
+        try:
+            if self.bno is None:
+                return None
+            if self.HEADING_SOURCE == "quaternion":
+                # adafruit_bno055.BNO055_I2C.quaternion returns (w, x, y, z)
+                quaternion = self.bno.quaternion
+                if quaternion is None or None in quaternion or not any(quaternion):
+                    return None
+                return quaternion_heading_deg(*quaternion)
+            # adafruit_bno055.BNO055_I2C.euler returns (heading, roll, pitch)
+            euler = self.bno.euler
+            return None if euler is None else euler[0]
+        except Exception as e:
+            logger.debug("BNO read failed: %s", e)
+            return None
 
     @staticmethod
     def _wrap_angle_deg(angle: float) -> float:
@@ -161,13 +286,14 @@ class OrientationEstimator(ShutdownInterface):
 
     # --- BNO spike filter / sanitizer ---
     class _BNOSanitizer:
-        def __init__(self):
+        def __init__(self, sample_period_s: float = 0.002):
             self.last_valid = None
             self.smoothed = None
             self.anomaly_count = 0
             self.ANGLE_ABS_LIMIT = 1000.0
             self.MAX_STEP_DEG = 60.0
-            self.EMA_ALPHA = 0.15
+            # 0.15 per 2 ms sample, the same smoothing in time at other sample rates.
+            self.EMA_ALPHA = 1.0 - (1.0 - 0.15) ** (sample_period_s / 0.002)
             self.ANOMALY_RESET_COUNT = 10
 
         def sanitize(self, raw_angle_deg):
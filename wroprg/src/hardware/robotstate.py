@@ -12,3 +12,4 @@ class RobotState(NamedTuple):
     camera_left:float = 0
     camera_right:float = 0
     yaw: float = 0
+    camera_age: float = -1  # ms since the camera frame was captured, -1 if none
@@ -0,0 +1,278 @@
+"""Camera capture and measurements in a separate process, results through shared memory."""
+import logging
+import multiprocessing
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from base.shutdown_handling import ShutdownInterface
+from hardware.camerameasurements import CameraReading, frame_periods_ms
+from round2.pillardetector import GREEN, RED, Pillar, PillarDetector, PillarReading
+
+logger = logging.getLogger(__name__)
+
+
+class VisionResult(NamedTuple):
+    """Measurement of one frame, as published by the vision process."""
+    seq: int = 0
+    frame_timestamp: float = 0
+    result_timestamp: float = 0
+    front: float = -1
+    left: float = -1
+    right: float = -1
+    front_p: float = 0
+    left_p: float = 0
+    right_p: float = 0
+    process_ms: float = 0
+    queue_depth: int = 0
+    paused: bool = False
+    pillars: PillarReading = PillarReading()
+    fps: float = 0
+
+    @property
+    def reading(self) -> CameraReading:
+        """Distances with their timestamps."""
+        return CameraReading(self.front, self.left, self.right, self.frame_timestamp,
+                             self.result_timestamp, self.queue_depth)
+
+
+class SharedResult:
+    """Fixed layout result block, written by one process and read by another.
+
+    A sequence counter guards the payload: it is odd while the writer is busy, so a
+    reader retries until it reads the same even counter before and after the payload.
+    """
+
+    _SEQ = struct.Struct("<q")
+    # timestamps, distances, percentages, process ms, queue depth, paused, frame rate.
+    _PAYLOAD = struct.Struct("<2d3d3ddi?d")
+    # pillar frame timestamp and count, then a fixed number of pillar slots.
+    _PILLARS = struct.Struct("<di")
+    _PILLAR = struct.Struct("<b2d6i")
+    _COLOURS = (RED, GREEN)
+    MAX_PILLARS = PillarDetector.MAX_PILLARS
+    SIZE = _SEQ.size + _PAYLOAD.size + _PILLARS.size + MAX_PILLARS * _PILLAR.size
+    MAX_READ_RETRIES = 100
+
+    def __init__(self, name: Optional[str] = None) -> None:
+        self.owner = name is None
+        if self.owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=self.SIZE)
+            self._shm.buf[:self.SIZE] = bytes(self.SIZE)
+        else:
+            # the spawned process shares the resource tracker, the creator unlinks.
+            self._shm = shared_memory.SharedMemory(name=name)
+        self.name = self._shm.name
+        self._seq = 0
+
+    def write(self, reading: CameraReading, front_p: float, left_p: float, right_p: float,
+              process_ms: float, paused: bool,
+              pillars: PillarReading = PillarReading(), fps: float = 0) -> None:
+        """Publish a new result, fps is the frame rate the frame was processed at."""
+        buf = self._shm.buf
+        self._seq += 1
+        self._SEQ.pack_into(buf, 0, 2 * self._seq - 1)
+        self._PAYLOAD.pack_into(buf, self._SEQ.size, reading.frame_timestamp,
+                                reading.result_timestamp, reading.front, reading.left,
+                                reading.right, front_p, left_p, right_p, process_ms,
+                                reading.queue_depth, paused, fps)
+        offset = self._SEQ.size + self._PAYLOAD.size
+        shared = pillars.pillars[: self.MAX_PILLARS]
+        self._PILLARS.pack_into(buf, offset, pillars.frame_timestamp, len(shared))
+        offset += self._PILLARS.size
+        for pillar in shared:
+            self._PILLAR.pack_into(buf, offset, self._COLOURS.index(pillar.colour),
+                                   *pillar[1:])
+            offset += self._PILLAR.size
+        self._SEQ.pack_into(buf, 0, 2 * self._seq)
+
+    def _read_pillars(self, buf: Any) -> PillarReading:
+        offset = self._SEQ.size + self._PAYLOAD.size
+        frame_timestamp, count = self._PILLARS.unpack_from(buf, offset)
+        offset += self._PILLARS.size
+        pillars = []
+        for _ in range(min(count, self.MAX_PILLARS)):
+            colour, *values = self._PILLAR.unpack_from(buf, offset)
+            pillars.append(Pillar(self._COLOURS[colour], *values))
+            offset += self._PILLAR.size
+        return PillarReading(tuple(pillars), frame_timestamp)
+
+    def read(self) -> Optional[VisionResult]:
+        """Latest consistent result, None if nothing was published yet."""
+        buf = self._shm.buf
+        for _ in range(self.MAX_READ_RETRIES):
+            (before,) = self._SEQ.unpack_from(buf, 0)
+            if before % 2 == 1:
+                continue
+            *payload, fps = self._PAYLOAD.unpack_from(buf, self._SEQ.size)
+            pillars = self._read_pillars(buf)
+            (after,) = self._SEQ.unpack_from(buf, 0)
+            if before == after:
+                if before == 0:
+                    return None
+                return VisionResult(before // 2, *payload, pillars, fps)
+        logger.warning("Could not read a consistent vision result")
+        return None
+
+    def close(self) -> None:
+        """Release the block, the owner also removes it."""
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+
+def pi_camera(use_lores: bool) -> Any:
+    """Camera factory used on the robot, imported in the vision process only."""
+    from hardware.camera import MyCamera  # pylint: disable=import-outside-toplevel
+    return MyCamera(use_lores=use_lores)
+
+
+def _vision_main(camera_factory: Callable[[bool], Any], use_lores: bool, result_name: str,
+                 stop_event: Any, pause_event: Any, ready_event: Any, nice: int,
+                 overruns: Any, ego_motion: Any) -> None:
+    """Entry point of the vision process."""
+    # pylint: disable=import-outside-toplevel
+    from hardware.camerameasurements import CameraDistanceMeasurements
+
+    if nice:
+        # the control loop should win when a core is shared.
+        os.nice(nice)
+
+    result = SharedResult(name=result_name)
+    camera = camera_factory(use_lores)
+    measurements = CameraDistanceMeasurements(camera, overruns,  # type: ignore[arg-type]
+                                              ego_motion)
+    try:
+        camera.start()
+        measurements.start_outputs()
+        ready_event.set()
+        while not stop_event.is_set():
+            start_time = time.perf_counter()
+            if pause_event.is_set():
+                measurements.pause_readings()
+            else:
+                measurements.resume_readings()
+            fps = measurements.process_camera()
+            metrics = measurements.metrics
+            process_ms = (time.perf_counter() - start_time) * 1000.0
+            result.write(measurements.get_reading(),
+                         metrics.get("c.frontp", 0.0), metrics.get("c.leftp", 0.0),
+                         metrics.get("c.rightp", 0.0), process_ms,
+                         metrics.get("paused", False), measurements.get_pillars(), fps)
+            time.sleep(max(0.0, 1.0 / fps - (time.perf_counter() - start_time)))
+    finally:
+        # writes the queued debug images.
+        measurements.shutdown()
+        camera.close()
+        result.close()
+
+
+class VisionWorker(ShutdownInterface):
+    """Runs the camera measurements in a separate process.
+
+    Has the same interface as CameraDistanceMeasurements, so the NumPy and OpenCV
+    work of each frame does not compete for the GIL with the control threads.
+    """
+
+    # spawn: the main process already runs threads when the worker is started.
+    START_METHOD = "spawn"
+    START_TIMEOUT = 10.0
+    STOP_TIMEOUT = 2.0
+    NICE = 5
+
+    def __init__(self, use_lores: bool,
+                 camera_factory: Callable[[bool], Any] = pi_camera,
+                 overruns: Any = None, ego_motion: Any = None) -> None:
+        super().__init__()
+        context = multiprocessing.get_context(self.START_METHOD)
+        self._result = SharedResult()
+        self._stop_event = context.Event()
+        self._pause_event = context.Event()
+        self._ready_event = context.Event()
+        self._process = context.Process(
+            target=_vision_main, name="vision", daemon=True,
+            args=(camera_factory, use_lores, self._result.name, self._stop_event,
+                  self._pause_event, self._ready_event, self.NICE, overruns, ego_motion))
+        self._closed = False
+
+    def start(self) -> None:
+        """Start the vision process and wait for the camera."""
+        self._process.start()
+        if not self._ready_event.wait(self.START_TIMEOUT):
+            logger.error("Vision process did not start in %.1f s", self.START_TIMEOUT)
+        else:
+            logger.info("Vision process started, pid %s", self._process.pid)
+
+    def pause_readings(self) -> None:
+        """Pause camera processing."""
+        logger.info("Pausing camera readings")
+        self._pause_event.set()
+
+    def resume_readings(self) -> None:
+        """Resume camera processing."""
+        logger.info("Resume camera readings")
+        self._pause_event.clear()
+
+    def is_paused(self) -> bool:
+        return self._pause_event.is_set()
+
+    def read_result(self) -> Optional[VisionResult]:
+        """Latest result published by the vision process."""
+        return self._result.read()
+
+    def get_reading(self) -> CameraReading:
+        """Latest camera reading with its frame timestamp."""
+        result = self._result.read()
+        if result is None:
+            return CameraReading()
+        return result.reading
+
+    def get_pillars(self) -> PillarReading:
+        """Pillars of the latest detection, with the timestamp of their frame."""
+        result = self._result.read()
+        if result is None:
+            return PillarReading()
+        return result.pillars
+
+    def get_distance(self, max_age_ms: Optional[float] = None,
+                     max_age_frames: Optional[float] = None) \
+                                        -> Tuple[float, float, float, Dict[str, Any]]:
+        """Latest camera distances, same as CameraDistanceMeasurements.get_distance."""
+        result = self._result.read()
+        if result is None:
+            return (-1, -1, -1, {})
+        reading = result.reading
+        metrics: Dict[str, Any] = {
+            'paused': result.paused,
+            'c.frontp': result.front_p,
+            'c.leftp': result.left_p,
+            'c.rightp': result.right_p,
+            'c.frontd': result.front,
+            'c.leftd': result.left,
+            'c.rightd': result.right,
+            'c.seq': result.seq,
+            'c.process_ms': result.process_ms,
+            'c.latency_ms': reading.latency_ms,
+            'c.queue': result.queue_depth,
+            'c.age_ms': reading.age_ms(),
+            'c.fps': result.fps,
+        }
+        if max_age_frames is not None:
+            max_age_ms = frame_periods_ms(max_age_frames, result.fps)
+        return reading.distances(max_age_ms) + (metrics,)
+
+    def shutdown(self) -> None:
+        """Stop the vision process and release the shared memory."""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop_event.set()
+        if self._process.is_alive():
+            self._process.join(self.STOP_TIMEOUT)
+            if self._process.is_alive():
+                logger.warning("Vision process did not stop, terminating it")
+                self._process.terminate()
+                self._process.join(self.STOP_TIMEOUT)
+        self._result.close()
@@ -0,0 +1,270 @@
+"""Yaw sampled at the output rate of the IMU, kept in a ring of timestamped samples,
+and the continuous multi-turn heading built from it."""
+import logging
+import math
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from base.shutdown_handling import ShutdownInterface
+
+logger = logging.getLogger(__name__)
+
+
+def wrap_angle_deg(angle: float) -> float:
+    """Wrap angle to [-180, 180)."""
+    return (angle + 180.0) % 360.0 - 180.0
+
+
+def quaternion_heading_deg(w: float, x: float, y: float, z: float) -> float:
+    """Heading in [-180, 180) of a unit quaternion, positive to the right (clockwise)
+    like the BNO055 euler heading."""
+    # the rotation around z is counter clockwise positive.
+    return wrap_angle_deg(-math.degrees(math.atan2(2.0 * (w * z + x * y),
+                                                   1.0 - 2.0 * (y * y + z * z))))
+
+
+class ContinuousHeading:
+    """Unwraps yaw readings into a heading that keeps counting past +-180.
+
+    The heading is 0 at the first reading and 720 after two laps to the right. The yaw
+    is relative to a virtual zero, reset_yaw() moves the zero to the current heading
+    without touching the device.
+    """
+
+    def __init__(self) -> None:
+        self.unwrapped: Optional[float] = None
+        self._last = 0.0
+        self._origin = 0.0
+        self._yaw_zero = 0.0
+        self._zero_pending = True
+
+    def update(self, yaw: float) -> float:
+        """Add a reading in degrees, returns the unwrapped yaw."""
+        if self.unwrapped is None:
+            self.unwrapped = self._origin = yaw
+        else:
+            self.unwrapped += wrap_angle_deg(yaw - self._last)
+        self._last = yaw
+        if self._zero_pending:
+            self._yaw_zero = self.unwrapped
+            self._zero_pending = False
+        return self.unwrapped
+
+    def heading(self, unwrapped: Optional[float] = None) -> float:
+        """Heading since the first reading, of the current or the given unwrapped yaw."""
+        if unwrapped is None:
+            unwrapped = self.unwrapped
+        return 0.0 if unwrapped is None else unwrapped - self._origin
+
+    def yaw(self, unwrapped: Optional[float] = None) -> float:
+        """Yaw in [-180, 180) relative to the virtual zero."""
+        if unwrapped is None:
+            unwrapped = self.unwrapped
+        return 0.0 if unwrapped is None else wrap_angle_deg(unwrapped - self._yaw_zero)
+
+    @property
+    def yaw_zero_heading(self) -> float:
+        """Heading of the virtual zero, the yaw is measured from it."""
+        return self._yaw_zero - self._origin
+
+    def reset_yaw(self) -> float:
+        """Move the zero to the current heading, returns the turn since the last zero.
+
+        Before the first reading the zero is set by the first reading.
+        """
+        if self.unwrapped is None:
+            self._zero_pending = True
+            return 0.0
+        turned = self.unwrapped - self._yaw_zero
+        self._yaw_zero = self.unwrapped
+        return turned
+
+
+class YawRing:
+    """Last yaw samples with their time.monotonic() timestamps.
+
+    Yaw is stored unwrapped (continuous across +-180), so samples interpolate linearly.
+    One thread appends, any thread reads.
+    """
+
+    CAPACITY = 256  # 2.5 s at 100 Hz
+    # A query past the newest sample is extrapolated with the last rate, up to this far.
+    MAX_EXTRAPOLATION_S = 0.02
+
+    def __init__(self, capacity: int = CAPACITY) -> None:
+        self._timestamps = np.zeros(capacity)
+        self._yaw = np.zeros(capacity)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self._count, len(self._yaw))
+
+    def append(self, timestamp: float, yaw: float) -> None:
+        """Add a sample, yaw in degrees wrapped or not."""
+        with self._lock:
+            if self._count:
+                last = self._yaw[(self._count - 1) % len(self._yaw)]
+                yaw = last + wrap_angle_deg(yaw - last)
+            index = self._count % len(self._yaw)
+            self._timestamps[index] = timestamp
+            self._yaw[index] = yaw
+            self._count += 1
+
+    def latest(self) -> Optional[Tuple[float, float]]:
+        """Timestamp and unwrapped yaw of the newest sample."""
+        with self._lock:
+            if not self._count:
+                return None
+            index = (self._count - 1) % len(self._yaw)
+            return float(self._timestamps[index]), float(self._yaw[index])
+
+    def yaw_at(self, timestamp: float) -> Optional[float]:
+        """Unwrapped yaw at the time, interpolated between the samples around it.
+
+        Before the oldest sample the oldest yaw is returned, after the newest the yaw
+        is extrapolated with the rate of the last two samples (MAX_EXTRAPOLATION_S).
+        """
+        with self._lock:
+            count = min(self._count, len(self._yaw))
+            if count == 0:
+                return None
+            size = len(self._yaw)
+            newest = (self._count - 1) % size
+            t1 = self._timestamps[newest]
+            y1 = self._yaw[newest]
+            if count == 1:
+                return float(y1)
+            previous = (newest - 1) % size
+            if timestamp >= t1:
+                t0 = self._timestamps[previous]
+                rate = (y1 - self._yaw[previous]) / (t1 - t0) if t1 > t0 else 0.0
+                return float(y1 + rate * min(timestamp - t1, self.MAX_EXTRAPOLATION_S))
+            # queries are mostly for the last few samples, walk back from the newest.
+            index = newest
+            for _ in range(count - 1):
+                previous = (index - 1) % size
+                t0 = self._timestamps[previous]
+                if t0 <= timestamp:
+                    t1 = self._timestamps[index]
+                    y0 = self._yaw[previous]
+                    fraction = (timestamp - t0) / (t1 - t0) if t1 > t0 else 1.0
+                    return float(y0 + fraction * (self._yaw[index] - y0))
+                index = previous
+            return float(self._yaw[index])
+
+
+class YawSampler(threading.Thread, ShutdownInterface):
+    """Reads the yaw at a fixed rate into a YawRing.
+
+    The reads follow a deadline schedule at rate_hz, so the thread does not drift and
+    does not read faster than the sensor produces new values. Each sample is stamped
+    with the middle of its read.
+    """
+
+    def __init__(self, read_func: Callable[[], Optional[float]], rate_hz: float,
+                 ring: Optional[YawRing] = None) -> None:
+        """read_func: returns the yaw in degrees, None when no reading is available."""
+        super().__init__(name="yawsampler", daemon=True)
+        self.read_func = read_func
+        self.period = 1.0 / rate_hz
+        self.ring = ring if ring is not None else YawRing()
+        self._stop_event = threading.Event()
+        self.reads = 0
+        self.failures = 0
+        self.late = 0
+
+    def sample(self) -> bool:
+        """Read once and store the sample, returns False when there was no reading."""
+        start = time.monotonic()
+        try:
+            yaw = self.read_func()
+        except Exception as e:  # pylint: disable=broad-except
+            logger.debug("Yaw read failed: %s", e)
+            yaw = None
+        self.reads += 1
+        if yaw is None or math.isnan(yaw):
+            self.failures += 1
+            return False
+        self.ring.append((start + time.monotonic()) / 2.0, yaw)
+        return True
+
+    def run(self) -> None:
+        next_tick = time.monotonic()
+        while not self._stop_event.is_set():
+            self.sample()
+            next_tick += self.period
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # fell behind (bus contention), restart the schedule instead of bursting.
+                self.late += 1
+                next_tick = time.monotonic()
+                delay = 0.0
+            self._stop_event.wait(delay)
+
+    def stop(self) -> None:
+        """Stop the thread."""
+        self._stop_event.set()
+
+    def is_running(self) -> bool:
+        """Check if the thread is currently running."""
+        return self.is_alive() and not self._stop_event.is_set()
+
+    def shutdown(self) -> None:
+        self.stop()
+
+
+class GyroYawPredictor:
+    """Yaw from the gyro z-rate integrated between fused heading updates.
+
+    A complementary filter: the integrated gyro follows fast turns without the lag of
+    the fusion, each fused heading pulls the estimate toward it by CORRECTION_GAIN and
+    removes the gyro drift. The fused heading is compared after moving it forward by
+    its FUSION_LAG_S at the current rate. Headings are unwrapped degrees, rates degrees
+    per second positive to the right, timestamps time.monotonic().
+    """
+
+    CORRECTION_GAIN = 0.1  # of the fused error removed at each fused update
+    FUSION_LAG_S = 0.02  # fused heading delay behind the gyro
+    MAX_DT = 0.1  # longer gaps are not integrated
+    MAX_PREDICTION_S = 0.2
+
+    def __init__(self, correction_gain: float = CORRECTION_GAIN,
+                 fusion_lag_s: float = FUSION_LAG_S) -> None:
+        self.correction_gain = correction_gain
+        self.fusion_lag_s = fusion_lag_s
+        self.yaw: Optional[float] = None
+        self.rate = 0.0
+        self._timestamp = 0.0
+
+    def _integrate(self, timestamp: float, rate: float) -> None:
+        dt = timestamp - self._timestamp
+        if self.yaw is not None and 0.0 < dt <= self.MAX_DT:
+            # trapezoid of the previous and the new rate.
+            self.yaw += 0.5 * (self.rate + rate) * dt
+        self._timestamp = max(self._timestamp, timestamp)
+
+    def add_rate(self, timestamp: float, rate: float) -> None:
+        """Integrate a gyro z-rate sample in degrees per second."""
+        self._integrate(timestamp, rate)
+        self.rate = rate
+
+    def add_fused(self, timestamp: float, heading: float) -> float:
+        """Correct toward a fused heading, returns the estimate."""
+        if self.yaw is None:
+            self.yaw = heading + self.rate * self.fusion_lag_s
+            self._timestamp = timestamp
+            return self.yaw
+        self._integrate(timestamp, self.rate)
+        self.yaw += self.correction_gain * (heading + self.rate * self.fusion_lag_s - self.yaw)
+        return self.yaw
+
+    def predict(self, at: float) -> Optional[float]:
+        """Yaw at the time at, extrapolated from the last sample at the current rate."""
+        if self.yaw is None:
+            return None
+        lead = min(max(0.0, at - self._timestamp), self.MAX_PREDICTION_S)
+        return self.yaw + self.rate * lead
@@ -0,0 +1,131 @@
+"""Persisted cache of learned mat layouts, used to warm start practice runs."""
+import json
+import logging
+import os
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from round1.widthestimator import LearnedWidth
+from utils.mat import MATDIRECTION, MATLOCATION
+
+logger = logging.getLogger(__name__)
+
+
+class LayoutFingerprint(NamedTuple):
+    """Fingerprint of a mat layout from the readings at the start position."""
+    front: float = 0
+    left: float = 0
+    right: float = 0
+
+    @property
+    def width(self) -> float:
+        """Wall to wall width at the start position."""
+        return self.left + self.right
+
+    def distance(self, other: "LayoutFingerprint") -> float:
+        """Largest difference in cm between two fingerprints."""
+        return max(abs(self.front - other.front), abs(self.width - other.width),
+                   abs(self.left - other.left))
+
+
+def _is_numbers(value: Any, length: int) -> bool:
+    return isinstance(value, list) and len(value) == length and \
+        all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)
+
+
+def _is_location_map(value: Any, length: int) -> bool:
+    return isinstance(value, dict) and \
+        all(name in MATLOCATION.__members__ and _is_numbers(numbers, length)
+            for name, numbers in value.items())
+
+
+def _is_valid_entry(entry: Any) -> bool:
+    """True if the entry has a fingerprint and the layout fields warm_start() reads."""
+    if not isinstance(entry, dict) or not _is_numbers(entry.get("fingerprint"), 3):
+        return False
+    layout = entry.get("layout")
+    return isinstance(layout, dict) and \
+        layout.get("direction") in MATDIRECTION.__members__ and \
+        _is_numbers(layout.get("initial_start", [0, 0, 0]), 3) and \
+        _is_location_map(layout.get("distances"), 3) and \
+        _is_location_map(layout.get("widths"), len(LearnedWidth._fields))
+
+
+class LayoutCache:
+    """Stores the learned layout of each fingerprint in a json file.
+
+    The cache only holds what was learned in round 1, the caller is expected to
+    validate the layout online and invalidate the entry on a mismatch.
+    """
+
+    CACHE_FILE = "layout_cache.json"
+    VERSION = 1
+    MAX_ENTRIES = 8
+    MATCH_TOLERANCE = 6.0  # cm
+
+    def __init__(self, filename: Optional[str] = None) -> None:
+        self.filename = filename or self.CACHE_FILE
+        self._entries: List[Dict[str, Any]] = self._load()
+
+    def _load(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.filename):
+            return []
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Cannot read layout cache %s: %s", self.filename, e)
+            return []
+        if not isinstance(data, dict) or data.get("version") != self.VERSION:
+            logger.warning("Layout cache version mismatch, ignoring %s", self.filename)
+            return []
+        entries = data.get("entries")
+        if not isinstance(entries, list) or not all(_is_valid_entry(e) for e in entries):
+            logger.warning("Invalid layout cache, ignoring %s", self.filename)
+            return []
+        return entries
+
+    def _save(self) -> None:
+        tmpname = self.filename + ".tmp"
+        try:
+            with open(tmpname, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "entries": self._entries}, f, indent=1)
+            os.replace(tmpname, self.filename)
+        except OSError as e:
+            logger.error("Cannot write layout cache %s: %s", self.filename, e)
+
+    def _find(self, fingerprint: LayoutFingerprint) -> Optional[Dict[str, Any]]:
+        best = None
+        best_distance = self.MATCH_TOLERANCE
+        for entry in self._entries:
+            distance = fingerprint.distance(LayoutFingerprint(*entry["fingerprint"]))
+            if distance <= best_distance:
+                best = entry
+                best_distance = distance
+        return best
+
+    def lookup(self, fingerprint: LayoutFingerprint) -> Optional[Dict[str, Any]]:
+        """Get the cached layout matching the fingerprint, None on a miss."""
+        entry = self._find(fingerprint)
+        if entry is None:
+            logger.info("Layout cache miss for %s", fingerprint)
+            return None
+        logger.info("Layout cache hit for %s, cached %s", fingerprint, entry["fingerprint"])
+        return entry["layout"]
+
+    def store(self, fingerprint: LayoutFingerprint, layout: Dict[str, Any]) -> None:
+        """Store the layout for the fingerprint, replacing a matching entry."""
+        entry = self._find(fingerprint)
+        if entry is not None:
+            self._entries.remove(entry)
+        self._entries.append({"fingerprint": list(fingerprint), "layout": layout})
+        self._entries = self._entries[-self.MAX_ENTRIES:]
+        self._save()
+        logger.info("Stored layout for %s", fingerprint)
+
+    def invalidate(self, fingerprint: LayoutFingerprint) -> None:
+        """Remove the entry matching the fingerprint."""
+        entry = self._find(fingerprint)
+        if entry is not None:
+            self._entries.remove(entry)
+            self._save()
+            logger.info("Invalidated layout for %s", fingerprint)
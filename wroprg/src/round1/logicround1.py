@@ -12,6 +12,9 @@ from round1.botposition import BotPositioner
 from round1.movement_controller import MovementController
 from round1.movement_controller import MAX_STEERING_ANGLE
 from utils.threadingfunctions import ConditionCheckerThread
+from utils.snapshot import SnapshotPublisher
+from utils.hotlog import HotLog
+from utils.flightrecorder import flight_recorder
 from utils import constants
 from utils.mat import MATDIRECTION,MATGENERICLOCATION
 from utils.mat import locationtostr,directiontostr
@@ -23,6 +26,7 @@ class Walker:
     """This class implements the Challenge 1 Walker for the WRO2025 Robot."""
     # Constants for the walker
     DEFAULT_SPEED=50
+    CONFIDENT_SIDE_SPEED=60 # used when the width of the side is learned with high confidence
     WALK_TO_CORNER_SPEED = 15
     MIN_SPEED= 20
     CORRECTION_SPEED=10
@@ -43,6 +47,12 @@ class Walker:
     CORNER_LEFT_DIST_THRESHOLD = 40.0
     CORNER_FRONT_DIST_THRESHOLD = 70.0
     CORNER_EXTRA_TURN_ANGLE = 4.0
+    # steering and motor latency, the corner exit checks the yaw predicted this far ahead.
+    CORNER_EXIT_LEAD_S = 0.06
+    # the State line is logged when a distance or the yaw moved this much, at most
+    # STATE_LOG_PER_SECOND times a second.
+    STATE_LOG_MIN_CHANGE = 1.0
+    STATE_LOG_PER_SECOND = 10.0
 
     output_inf: HardwareInterface
 
@@ -50,7 +60,9 @@ class Walker:
         self.output_inf = output_inf
         self._line_color: str|None = None
         #setting decimals for float datatype.
-        self._current_distance = (0.1, 0.1)
+        # (left, right) reported by the mat intelligence callback, (0, 0) until the report.
+        self._reported_distance: SnapshotPublisher[Tuple[float, float]] = \
+                                                            SnapshotPublisher((0.1, 0.1))
 
         self._nooflaps = nooflaps
         self.intelligence: MatIntelligence = MatIntelligence(roundcount=nooflaps,
@@ -63,25 +75,41 @@ class Walker:
         self._positioner = BotPositioner(self.intelligence)
 
         self.movementcontroller = MovementController(output_inf,min_speed = self.MIN_SPEED)
+        # odometer reading already passed to the ego motion of the pillar tracker.
+        self._fed_odometer = 0.0
 
         # Global yaw tracks intended orientation, not affected by gyro resets.
         # This is the intended angle of the robot, 0 is straight, +90 is right, -90 is left.
         self._global_yaw = 0.0
-        self._cummulative_yaw = 0.0
+        # Yaw of the side being walked, the walls run along it. The bot starts parallel
+        # to the walls of side 1 with the gyro at 0.
+        self._side_heading = 0.0
 
+        self._state_log = HotLog(logger, per_second=self.STATE_LOG_PER_SECOND,
+                                 min_change=self.STATE_LOG_MIN_CHANGE, name="Walker state")
+        self._recorder = flight_recorder()
 
     def read_state(self, location_type: MATGENERICLOCATION,camera:bool) -> RobotState:
         """Read the current state of the robot, optionally using camera data."""
-        state: RobotState = self.output_inf.read_state()
-        self.intelligence.add_readings(state.front, state.left, state.right)
+        state: RobotState = self.output_inf.read_state(tick=True)
+        heading = self._side_heading if location_type == MATGENERICLOCATION.SIDE else None
+        self.intelligence.add_readings(state.front, state.left, state.right, state.yaw,
+                                       heading)
+        # read_state feeds the yaw, the tracker also moves the pillars by the distance driven.
+        odometer = self.movementcontroller.get_odometer()
+        self.output_inf.ego_motion.add_travel(odometer - self._fed_odometer)
+        self._fed_odometer = odometer
 
         
         use_camera = False
 
         if camera is False:
-            logger.info("State (Cam:%s): F:%.2f, L:%.2f, R:%.2f, Y:%.2f, CF:%.2f, CL:%.2f, CR:%.2f",
+            self._state_log.log(
+                   "State (Cam:%s): F:%.2f, L:%.2f, R:%.2f, Y:%.2f, CF:%.2f, CL:%.2f, CR:%.2f",
                    use_camera,state.front, state.left, state.right, state.yaw,
-                   state.camera_front,state.camera_left,state.camera_right)
+                   state.camera_front,state.camera_left,state.camera_right,
+                   value=(state.front, state.left, state.right, state.yaw))
+            self._recorder.record_state(state, self.movementcontroller.get_distance())
             return state
 
         front, left, right = state.front, state.left, state.right
@@ -118,11 +146,14 @@ class Walker:
 
         new_state = RobotState(front=front, left=left, right=right, yaw=state.yaw,
                                camera_front=state.camera_front, camera_left=state.camera_left,
-                                 camera_right=state.camera_right)
+                                 camera_right=state.camera_right, camera_age=state.camera_age)
 
-        logger.info("State (Cam:%s): F:%.2f, L:%.2f, R:%.2f, Y:%.2f, CF:%.2f, CL:%.2f, CR:%.2f",
+        self._state_log.log(
+                   "State (Cam:%s): F:%.2f, L:%.2f, R:%.2f, Y:%.2f, CF:%.2f, CL:%.2f, CR:%.2f",
                    use_camera,new_state.front, new_state.left, new_state.right, new_state.yaw,
-                   state.camera_front,state.camera_left,state.camera_right)
+                   state.camera_front,state.camera_left,state.camera_right,
+                   value=(new_state.front, new_state.left, new_state.right, new_state.yaw))
+        self._recorder.record_state(new_state, self.movementcontroller.get_distance())
 
         return new_state
 
@@ -228,6 +259,7 @@ class Walker:
 
         if gyroreset:
             def_yaw = current_state.yaw
+        self._side_heading = def_yaw
 
         (is_correction, yaw_delta, left_def, right_def) = self._positioner.side_bot_centering(
             current_state.front,
@@ -237,11 +269,11 @@ class Walker:
 
         current_yaw = def_yaw + yaw_delta
 
-        self._current_distance = (0, 0)
+        self._reported_distance.publish((0, 0))
 
         def report_distances_side(left: float, right: float):
             logger.info("side Report. Left: %.2f, Right: %.2f", left, right)
-            self._current_distance = (left, right)
+            self._reported_distance.publish((left, right))
 
         prev_distance = current_state.left + current_state.right
         last_stop: float = 0.0
@@ -272,11 +304,11 @@ class Walker:
             # Define the condition for stopping the walk
             # Either you have found the new minimum point or
             # previous distances are less than current distances by a good margin.
-            if self._current_distance != (0, 0):
-                delta = (self._current_distance[0] + self._current_distance[1]) - \
-                        prev_distance
+            reported = self._reported_distance.value
+            if reported != (0, 0):
+                delta = (reported[0] + reported[1]) - prev_distance
                 if delta > 2: # we should stop if great than 2 cm.
-                    logger.info("Condition met with current distance: %s", self._current_distance)
+                    logger.info("Condition met with current distance: %s", reported)
                     return False
                 return False
             # if state.left == self._left_max or state.right == self._right_max:
@@ -289,6 +321,8 @@ class Walker:
 
         self.intelligence.register_callback(report_distances_side)
 
+        side_speed = self.side_speed(self.DEFAULT_SPEED)
+
         counter = 1
 
         # this outer loop is to ensuer that we walkback and retry till we have 
@@ -308,7 +342,7 @@ class Walker:
                     def_left=left_def,
                     def_right=right_def,
                     gyro_default=current_yaw,
-                    speed=self.DEFAULT_SPEED,
+                    speed=side_speed,
                     weak_gyro=False,
                     min_left=20,
                     min_right=20,
@@ -343,28 +377,35 @@ class Walker:
 
         return current_yaw
 
+    def side_speed(self, default_speed: float) -> float:
+        """Speed for the current side, faster if its width is learned with high confidence."""
+        if self.intelligence.is_width_confident():
+            logger.info("Side width is known, using speed: %.2f", self.CONFIDENT_SIDE_SPEED)
+            return max(default_speed, self.CONFIDENT_SIDE_SPEED)
+        return default_speed
+
     def update_side_path(self, current_state: RobotState, learned_left: float, \
                         learned_right: float,yaw_delta: float, def_yaw: float, \
                         prev_distance: float) -> Tuple[bool, float, float, float, float]:
         """Helper to recalculate path definitions during a side walk."""
         new_yaw = def_yaw + yaw_delta
 
-        if self._current_distance != (0, 0):
-            delta = (learned_left + learned_right) - (self._current_distance[0] \
-                                                + self._current_distance[1])
+        (reported_left, reported_right) = self._reported_distance.value
+        if (reported_left, reported_right) != (0, 0):
+            delta = (learned_left + learned_right) - (reported_left + reported_right)
 
             if delta > 4:  # delta should be greater than 4cm to consider
                 _, new_yaw_delta, new_left, new_right = self._positioner.side_bot_centering(
                     current_state.front,
-                    learned_left=self._current_distance[0], learned_right=self._current_distance[1],
+                    learned_left=reported_left, learned_right=reported_right,
                     actual_left=current_state.left, actual_right=current_state.right,
                     prev_yaw=yaw_delta, lenient=True
                 )
-                self._current_distance = (0, 0)
+                self._reported_distance.publish((0, 0))
                 return True, def_yaw + new_yaw_delta, new_left, new_right, \
                                         current_state.left + current_state.right
             else:
-                self._current_distance = (0, 0) # Reset even if not used
+                self._reported_distance.publish((0, 0)) # Reset even if not used
 
         elif prev_distance - (current_state.left + current_state.right) > 10:
             _, new_yaw_delta, new_left, new_right = self._positioner.side_bot_centering(
@@ -433,13 +474,13 @@ class Walker:
         prev_yaw = state.yaw
         if gyroreset:
             prev_yaw = self.output_inf.reset_gyro()
-            self._cummulative_yaw += prev_yaw
-        
 
-        #this should be 90 degrees, it takes care in global context        
-        corner_yaw_angle = self._global_yaw - self._cummulative_yaw
-        logger.info("After gyro reset prev yaw %.2f, global yaw: %.2f, cummulative yaw: %.2f, corner angle: %.2f",
-                    prev_yaw,self._global_yaw,self._cummulative_yaw,corner_yaw_angle)
+        #this should be 90 degrees, it takes care in global context.
+        # the yaw is relative to its zero, a heading that keeps counting past +-180.
+        zero_heading = self.output_inf.get_yaw_zero_heading()
+        corner_yaw_angle = self._global_yaw - zero_heading
+        logger.info("After gyro reset prev yaw %.2f, global yaw: %.2f, zero heading: %.2f, corner angle: %.2f",
+                    prev_yaw,self._global_yaw,zero_heading,corner_yaw_angle)
 
         if self._direction == MATDIRECTION.ANTICLOCKWISE_DIRECTION:
             # lets assume this is AntiClockwise and side1 is complete,
@@ -479,6 +520,10 @@ class Walker:
 
         return
 
+    def _exit_yaw(self) -> float:
+        """Yaw predicted when a command sent now takes effect, so turns do not overshoot."""
+        return self.output_inf.get_predicted_yaw(time.monotonic() + self.CORNER_EXIT_LEAD_S)
+
     def _gyro_corner_walk(self, def_turn_angle: float, min_left: float, min_right: float,
                           fixed_turn_angle:float,
                             ) -> float:
@@ -488,7 +533,7 @@ class Walker:
 
         def report_distances_corner(left: float, right: float):
             logger.info("corner Report. Left: %.2f, Right: %.2f", left, right)
-            self._current_distance = (left, right)
+            self._reported_distance.publish((left, right))
             #TODO: we should stop for now lets wait.
             self.movementcontroller.stop_walking()
 
@@ -518,28 +563,29 @@ class Walker:
 
         turn_max_delta = abs(2*def_turn_angle/3)
 
-        self._current_distance = (0, 0)
+        self._reported_distance.publish((0, 0))
         logger.info("Starting corner walk... F:%.2f, current distance %s", state.front,
-                                                self._current_distance)
+                                                self._reported_distance.value)
         self.movementcontroller.reset_distance()
         self.movementcontroller.start_walking(self.MIN_SPEED)
 
-        while state.front > def_front and self._current_distance == (0,0) \
-                        and abs(delta_angle_deg(state.yaw, def_turn_angle)) > 1 \
+        while state.front > def_front and self._reported_distance.value == (0,0) \
+                        and abs(delta_angle_deg(self._exit_yaw(), def_turn_angle)) > 1 \
                                 and self.movementcontroller.get_distance() < 100.0:
 
             state = self.read_state_corner()
             turn_angle = gyrohelper.walk_func(current_angle=state.yaw,
                                               left_distance=state.left, right_distance=state.right)
 
-            if not turned and abs(delta_angle_deg(state.yaw,def_turn_angle)) < turn_max_delta:
+            if not turned and \
+                    abs(delta_angle_deg(self._exit_yaw(),def_turn_angle)) < turn_max_delta:
                 logger.info("Turned achieve lets check distance=====")
                 turned = True
                 self.intelligence.reset_current_distance()
                 self.intelligence.register_callback(report_distances_corner)
                 self.movementcontroller.start_walking(self.WALK_TO_CORNER_SPEED)
 
-            if state.front > def_front and self._current_distance == (0,0):
+            if state.front > def_front and self._reported_distance.value == (0,0):
 
                 self.movementcontroller.turn_steering_with_logging(turn_angle,delta_angle=15,
                                                  max_turn_angle=MAX_STEERING_ANGLE,
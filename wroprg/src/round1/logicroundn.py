@@ -7,9 +7,11 @@ from round1.logicround1 import Walker
 from round1.walker_helpers import WalkParameters
 from round1.utilityfunctions import delta_angle_deg
 from round1.movement_controller import MAX_STEERING_ANGLE
+from round1.layoutcache import LayoutCache
 from utils import constants
 import time
 from utils.mat import MATDIRECTION, MATGENERICLOCATION ,MATLOCATION
+from utils.mat import decide_direction, directiontostr
 
 logger = logging.getLogger(__name__)
 class WalkerN(Walker):
@@ -18,6 +20,7 @@ class WalkerN(Walker):
     DEFAULT_GYRO_SPEED=40
     DEFAULT_FIRST_WALK_SPEED=25
     CORNER_GYRO_SPEED = 30
+    USE_LAYOUT_CACHE = True
 
 
     output_inf: HardwareInterface
@@ -27,13 +30,82 @@ class WalkerN(Walker):
         self.output_inf = output_inf
         self._line_color: str|None = None
         #setting decimals for float datatype.
-        self._current_distance = (0.1, 0.1)
+        self._reported_distance.publish((0.1, 0.1))
 
         self._nooflaps = nooflaps
 
         self._walking:bool = False
         self._global_yaw = 0.0
-        self._cummulative_yaw = 0.0
+
+        self._layout_cache: LayoutCache|None = LayoutCache() if self.USE_LAYOUT_CACHE else None
+
+    def _warm_start(self) -> bool:
+        """Warm start from the layout cache, returns True if the layout is known."""
+        if self._layout_cache is None:
+            return False
+
+        # readings at the start position, these are used for the fingerprint.
+        for _ in range(self.intelligence.FINGERPRINT_READINGS):
+            self.read_state_side()
+        fingerprint = self.intelligence.get_layout_fingerprint()
+        if fingerprint is None:
+            return False
+
+        layout = self._layout_cache.lookup(fingerprint)
+        if layout is None:
+            return False
+
+        self.intelligence.warm_start(layout)
+        self._direction = self.intelligence.get_direction()
+        logger.warning("Cached: %s", directiontostr(self._direction))
+        return True
+
+    def _store_layout(self) -> None:
+        """Store the layout learned in round 1 in the layout cache."""
+        if self._layout_cache is None:
+            return
+        fingerprint = self.intelligence.get_layout_fingerprint()
+        if fingerprint is not None:
+            self._layout_cache.store(fingerprint, self.intelligence.export_layout())
+
+    def _warm_start_walk(self):
+        """Walk all the laps at round n speeds using the cached layout.
+
+        The first side is validated against the cache, on a mismatch we fall back
+        to the round 1 discovery from the current location.
+        """
+        self.output_inf.camera_off()
+
+        state = self.read_state_side()
+        current_yaw_angle = self.handle_side_walk_n(gyroreset=False,
+                            speed=self.DEFAULT_FIRST_WALK_SPEED,
+                            def_yaw=state.yaw)
+
+        if not self.intelligence.is_layout_valid():
+            fingerprint = self.intelligence.get_layout_fingerprint()
+            if self._layout_cache is not None and fingerprint is not None:
+                self._layout_cache.invalidate(fingerprint)
+            # the cached direction may be what did not match, decide it again.
+            self.walk_to_corner(current_yaw_angle)
+            state = self.read_state_side()
+            self.intelligence.abandon_warm_start(
+                decide_direction(None, None, state.left, state.right))
+            self._direction = self.intelligence.get_direction()
+            logger.warning("Direction after layout mismatch: %s",
+                           directiontostr(self._direction))
+            self._round1_walk(current_yaw_angle)
+            self._store_layout()
+        else:
+            self._gyro_walk_corners(current_yaw_angle)
+
+        self._remaining_laps_walk()
+
+    def _remaining_laps_walk(self):
+        """Walk the laps after the first one, the same for a cold and a warm start."""
+        for lap in range(2, self._nooflaps + 1):
+            logger.info("Starting walk for location: %s , lap: %d",
+                        self.intelligence.get_location(), lap)
+            self.full_gyro_walk()
 
     def _full_round1_walk(self):
 
@@ -55,7 +127,10 @@ class WalkerN(Walker):
                                                         else -self.CORNER_YAW_ANGLE
         logger.info("Corner yaw angle: %.2f", corner_yaw_angle)
 
-        current_yaw_angle = 0
+        self._round1_walk(0)
+
+    def _round1_walk(self, current_yaw_angle: float):
+        """Walk the rest of round 1 starting at a corner, learning the distances."""
 
         #handle first corner without gyroreset.
         try:
@@ -84,14 +159,20 @@ class WalkerN(Walker):
         """Start the walk based on the current direction which is unknown and number of laps."""
         logger.info("Starting to walk...")
 
-        self._full_round1_walk()
+        if self._warm_start():
+            self._warm_start_walk()
+            self.movementcontroller.stop_walking()
+            return
 
-        while self.intelligence.get_round_number()<= self._nooflaps:
-            logger.info("Starting walk for location: %s , round: %d",
-                         self.intelligence.get_location(), self.intelligence.get_round_number())
-            self.full_gyro_walk()
+        self._full_round1_walk()
+        if self._direction == MATDIRECTION.UNKNOWN_DIRECTION:
+            # _full_round1_walk already signalled the error.
             self.movementcontroller.stop_walking()
             return
+        self._store_layout()
+
+        self._remaining_laps_walk()
+        self.movementcontroller.stop_walking()
 
     def full_gyro_walk(self):
         """Walk the full path using gyro."""
@@ -109,8 +190,11 @@ class WalkerN(Walker):
                             speed=self.DEFAULT_FIRST_WALK_SPEED,
                             def_yaw=current_yaw_angle)
 
+        self._gyro_walk_corners(current_yaw_angle)
 
-        for i in range(3): # Loop 3 times for the first 3 corners and sides
+    def _gyro_walk_corners(self, current_yaw_angle: float):
+        """Walk the 4 corners and the 3 sides after side 1 using gyro."""
+        for _ in range(3): # Loop 3 times for the first 3 corners and sides
             #lets walk the corner at 90 degrees corner1
             try:
                 self.output_inf.camera_pause()
@@ -147,15 +231,16 @@ class WalkerN(Walker):
 
         self._global_yaw += 90 if self._direction == MATDIRECTION.CLOCKWISE_DIRECTION else -90
 
+        prev_yaw = state.yaw
         if gyroreset:
             prev_yaw = self.output_inf.reset_gyro()
-            self._cummulative_yaw += prev_yaw
-        
 
-        #this should be 90 degrees, it takes care in global context        
-        corner_yaw_angle = self._global_yaw - self._cummulative_yaw
-        logger.info("After gyro reset prev yaw %.2f, global yaw: %.2f, cummulative yaw: %.2f, corner angle: %.2f",
-                    prev_yaw,self._global_yaw,self._cummulative_yaw,corner_yaw_angle)
+        #this should be 90 degrees, it takes care in global context.
+        # the yaw is relative to its zero, a heading that keeps counting past +-180.
+        zero_heading = self.output_inf.get_yaw_zero_heading()
+        corner_yaw_angle = self._global_yaw - zero_heading
+        logger.info("After gyro reset prev yaw %.2f, global yaw: %.2f, zero heading: %.2f, corner angle: %.2f",
+                    prev_yaw,self._global_yaw,zero_heading,corner_yaw_angle)
 
         if self._direction == MATDIRECTION.ANTICLOCKWISE_DIRECTION:
             # lets assume this is AntiClockwise and side1 is complete,
@@ -204,7 +289,7 @@ class WalkerN(Walker):
 
         def report_distances_corner(left: float, right: float):
             logger.info("corner Report. Left: %.2f, Right: %.2f", left, right)
-            self._current_distance = (left, right)
+            self._reported_distance.publish((left, right))
             #TODO: we should stop for now lets wait.
             self.movementcontroller.stop_walking()
 
@@ -234,28 +319,29 @@ class WalkerN(Walker):
 
         turn_max_delta = abs(2*def_turn_angle/3)
 
-        self._current_distance = (0, 0)
+        self._reported_distance.publish((0, 0))
         logger.info("Starting corner walk... F:%.2f, current distance %s", state.front,
-                                                self._current_distance)
+                                                self._reported_distance.value)
         self.movementcontroller.reset_distance()
         self.movementcontroller.start_walking(self.MIN_SPEED)
 
-        while state.front > def_front and self._current_distance == (0,0) \
-                        and abs(delta_angle_deg(state.yaw, def_turn_angle)) > 1 \
+        while state.front > def_front and self._reported_distance.value == (0,0) \
+                        and abs(delta_angle_deg(self._exit_yaw(), def_turn_angle)) > 1 \
                                 and self.movementcontroller.get_distance() < 100.0:
 
             state = self.read_state_corner()
             turn_angle = gyrohelper.walk_func(current_angle=state.yaw,
                                               left_distance=state.left, right_distance=state.right)
 
-            if not turned and abs(delta_angle_deg(state.yaw,def_turn_angle)) < turn_max_delta:
+            if not turned and \
+                    abs(delta_angle_deg(self._exit_yaw(),def_turn_angle)) < turn_max_delta:
                 logger.info("Turned achieve lets check distance=====")
                 turned = True
                 self.intelligence.reset_current_distance()
                 self.intelligence.register_callback(report_distances_corner)
                 self.movementcontroller.start_walking(self.WALK_TO_CORNER_SPEED)
 
-            if state.front > def_front and self._current_distance == (0,0):
+            if state.front > def_front and self._reported_distance.value == (0,0):
 
                 self.movementcontroller.turn_steering_with_logging(turn_angle,delta_angle=15,
                                                  max_turn_angle=MAX_STEERING_ANGLE,
@@ -280,7 +366,8 @@ class WalkerN(Walker):
 
         return def_turn_angle
 
-    def handle_side_walk_n(self,gyroreset:bool = True,def_yaw:float = 0)->float:
+    def handle_side_walk_n(self,gyroreset:bool = True,def_yaw:float = 0,
+                           speed:float|None = None)->float:
 
         """Handle side walk n
         returns the final yaw to be used.
@@ -320,6 +407,7 @@ class WalkerN(Walker):
 
         if gyroreset:
             def_yaw = current_state.yaw
+        self._side_heading = def_yaw
 
         (is_correction, yaw_delta, left_def, right_def) = self._positioner.side_bot_centering(
             current_state.front,
@@ -329,11 +417,11 @@ class WalkerN(Walker):
 
         current_yaw = def_yaw + yaw_delta
 
-        self._current_distance = (0, 0)
+        self._reported_distance.publish((0, 0))
 
         def report_distances_side(left: float, right: float):
             logger.info("side Report. Left: %.2f, Right: %.2f", left, right)
-            self._current_distance = (left, right)
+            self._reported_distance.publish((left, right))
 
         prev_distance = current_state.left + current_state.right
         last_stop: float = 0.0
@@ -364,11 +452,11 @@ class WalkerN(Walker):
             # Define the condition for stopping the walk
             # Either you have found the new minimum point or
             # previous distances are less than current distances by a good margin.
-            if self._current_distance != (0, 0):
-                delta = (self._current_distance[0] + self._current_distance[1]) - \
-                        prev_distance
+            reported = self._reported_distance.value
+            if reported != (0, 0):
+                delta = (reported[0] + reported[1]) - prev_distance
                 if delta > 2: # we should stop if great than 2 cm.
-                    logger.info("Condition met with current distance: %s", self._current_distance)
+                    logger.info("Condition met with current distance: %s", reported)
                     return False
                 return False
             # if state.left == self._left_max or state.right == self._right_max:
@@ -381,6 +469,8 @@ class WalkerN(Walker):
 
         self.intelligence.register_callback(report_distances_side)
 
+        side_speed = self.side_speed(self.DEFAULT_SPEED if speed is None else speed)
+
         counter = 1
 
         # this outer loop is to ensuer that we walkback and retry till we have 
@@ -400,7 +490,7 @@ class WalkerN(Walker):
                     def_left=left_def,
                     def_right=right_def,
                     gyro_default=current_yaw,
-                    speed=self.DEFAULT_SPEED,
+                    speed=side_speed,
                     weak_gyro=False,
                     min_left=20,
                     min_right=20,
@@ -1,16 +1,32 @@
 """This class implemenents the mathematical intelligence for the Mat used. """
 import logging
 from collections import Counter
+from statistics import median
 import queue
-from typing import Callable, Optional, Tuple
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
 import threading
 from base.shutdown_handling import ShutdownInterface
 from utils.mat import MATDIRECTION, MATLOCATION, MATGENERICLOCATION
 from utils.mat import location_to_genericlocation
 from hardware.hardware_interface import HardwareInterface
 from hardware.robotstate import RobotState
+from round1.widthestimator import LearnedWidth, WidthEstimator
+from round1.layoutcache import LayoutFingerprint
+from utils.snapshot import SnapshotPublisher
 
 logger = logging.getLogger(__name__)
+
+
+class _WidthReset(NamedTuple):
+    """Queued after the readings, so the reading thread resets the estimator in order."""
+    location: MATLOCATION
+    min_distances: Tuple[float, float]
+
+
+# front, left, right, yaw and the side heading.
+_Reading = Tuple[float, float, float, float, Optional[float]]
+
+
 class MatIntelligence(ShutdownInterface):
     """Class to implement the mathematical intelligence for the Mat used."""
 
@@ -23,12 +39,16 @@ class MatIntelligence(ShutdownInterface):
     MAX_DISTANCE_READING = 200.0 # Maximum distance reading in cm
     WALLFRONTDISTANCE=15.0 # while corner walking , maximum distance from the wall in front
     WALLSIDEDISTANCE=20.0 # while corner walking , maximum distance from the wall on the side
+    CONFIDENT_WIDTH_UNCERTAINTY = 2.0 # cm, learned width is trusted below this uncertainty
+    CONFIDENT_WIDTH_SAMPLES = 20 # minimum readings before a learned width is trusted
+    FINGERPRINT_READINGS = 10 # readings at the start position used for the layout fingerprint
+    WARM_START_WIDTH_TOLERANCE = 6.0 # cm, allowed width error while validating a cached layout
 
     def __init__(self,roundcount:int = 1, hardware_interface: Optional[HardwareInterface]=None
                                                     ) -> None:
         """Initialize the MatIntelligence class."""
     # Use a thread-safe queue for producer/consumer communication
-        self._queue: "queue.Queue[tuple[float,float,float] | None]" = queue.Queue()
+        self._queue: "queue.Queue[_Reading | _WidthReset | None]" = queue.Queue()
         self._direction = MATDIRECTION.UNKNOWN_DIRECTION
         self._location = MATLOCATION.SIDE_1
         self._roundno = 1
@@ -40,6 +60,11 @@ class MatIntelligence(ShutdownInterface):
 
         # Reading for the start location, for starting position
         self._mem_initial_start = (0.0,0.0,0.0)
+        # First readings at the start position, used for the layout fingerprint.
+        self._fingerprint_readings: list[tuple[float,float,float]] = []
+        # Set while a cached layout is being validated against the readings.
+        self._validating_layout = False
+        self._layout_valid = True
 
         self._locationssequence = [
             MATLOCATION.SIDE_1,
@@ -96,7 +121,12 @@ class MatIntelligence(ShutdownInterface):
         }
 
         self._learned_distances:dict[MATLOCATION,Tuple[float,float,float]] = {}
-        self._current_min_distances = self.DEFAULT_DISTANCE  # (left, right)
+        # Robust width estimators for each location, filled during round 1.
+        self._width_estimators: dict[MATLOCATION, WidthEstimator] = {}
+        self._learned_widths: dict[MATLOCATION, LearnedWidth] = {}
+        # (left, right), updated by the reading thread and read by the walker.
+        self._min_distances: SnapshotPublisher[Tuple[float, float]] = \
+                                                    SnapshotPublisher(self.DEFAULT_DISTANCE)
 
         self._callback: Callable[[float,float],None] | None = None
 
@@ -107,12 +137,16 @@ class MatIntelligence(ShutdownInterface):
         logger.info("MatIntelligence initialized")
 
     def add_readings(self, front_distance: float, left_distance: float,
-                            right_distance: float) -> None:
-        """Add readings to the deque."""
-        if self._roundno == 1:
+                            right_distance: float, yaw: float = 0.0,
+                            heading: Optional[float] = None) -> None:
+        """Add readings to the deque.
+
+        heading: yaw of the side the walker walks along, None if not on a side.
+        """
+        if self._roundno == 1 or self._validating_layout:
             # Put the reading into the queue for the background thread to process
             # Use put() which is thread-safe and may block if a maxsize is set later
-            self._queue.put((front_distance, left_distance, right_distance))
+            self._queue.put((front_distance, left_distance, right_distance, yaw, heading))
 
     def _start_reading_thread(self):
         """Start the background thread to process readings from the deque."""
@@ -144,9 +178,11 @@ class MatIntelligence(ShutdownInterface):
                 if item is None:
                     # sentinel: request shutdown
                     return
-                front_distance, left_distance, right_distance = item
                 try:
-                    self._process_each_readings(front_distance, left_distance, right_distance)
+                    if isinstance(item, _WidthReset):
+                        self._reset_width(item)
+                    else:
+                        self._process_each_readings(*item)
                 except Exception:
                     logger.exception("Error processing reading")
             finally:
@@ -160,6 +196,9 @@ class MatIntelligence(ShutdownInterface):
         """Print the current state of MatIntelligence."""
         logger.info("MatIntelligence State:")
         logger.info("%s",self._learned_distances)
+        for location, width in self._learned_widths.items():
+            logger.info("Width %s: %.2f +- %.2f (%d samples, %d rejected)", location,
+                        width.width, width.uncertainty, width.samples, width.rejected)
 
 
     def get_round_number(self) -> int:
@@ -192,13 +231,17 @@ class MatIntelligence(ShutdownInterface):
         #change in location to corner 1
         self._location = MATLOCATION.CORNER_1
 
-        if self._current_min_distances is not None:
-            self._learned_distances[MATLOCATION.SIDE_1] = (100,self._current_min_distances[0],
-                                                          self._current_min_distances[1])
+        record = self._width_record(MATLOCATION.SIDE_1)
+        (min_left, min_right) = self._min_distances.value
+        if record is not None:
+            self._learned_widths[MATLOCATION.SIDE_1] = record
+            self._learned_distances[MATLOCATION.SIDE_1] = (100, record.half_width,
+                                                           record.half_width)
+        else:
+            self._learned_distances[MATLOCATION.SIDE_1] = (100, min_left, min_right)
 
-        logger.info("Report side 1, current min distances: %.2f,%.2f",
-                    self._current_min_distances[0], self._current_min_distances[1])
-        self._current_min_distances = self.DEFAULT_DISTANCE
+        logger.info("Report side 1, current min distances: %.2f,%.2f", min_left, min_right)
+        self._min_distances.publish(self.DEFAULT_DISTANCE)
 
     def _wait_for_readings(self, timeout: float = 2.0) -> None:
         """Wait for readings to be processed."""
@@ -220,9 +263,48 @@ class MatIntelligence(ShutdownInterface):
     def reset_current_distance(self,left:float = 0, right:float = 0):
         """Reset the current distance readings."""
         if left <=0 or right <= 0:
-            self._current_min_distances = self.DEFAULT_DISTANCE
+            min_distances = self.DEFAULT_DISTANCE
         else:
-            self._current_min_distances = (left, right)
+            min_distances = (left, right)
+        self._min_distances.publish(min_distances)
+        # readings taken so far at this location are not for the width we want to learn.
+        # The estimator belongs to the reading thread, which also publishes again so a
+        # reading queued before the reset does not undo it.
+        self._queue.put(_WidthReset(self._location, min_distances))
+
+    def _reset_width(self, reset: _WidthReset) -> None:
+        self._min_distances.publish(reset.min_distances)
+        estimator = self._width_estimators.get(reset.location)
+        if estimator is not None:
+            estimator.reset()
+
+    def get_learned_width(self, location: MATLOCATION|None = None) -> Optional[LearnedWidth]:
+        """Get the learned width record of a location, None if not learned."""
+        if location is None:
+            location = self._location
+        return self._learned_widths.get(location)
+
+    def is_width_confident(self, location: MATLOCATION|None = None) -> bool:
+        """Check if the learned width of a location is known with high confidence."""
+        width = self.get_learned_width(location)
+        if width is None:
+            return False
+        return width.is_confident(self.CONFIDENT_WIDTH_UNCERTAINTY,
+                                  self.CONFIDENT_WIDTH_SAMPLES)
+
+    def _width_estimator(self, location: MATLOCATION) -> WidthEstimator:
+        estimator = self._width_estimators.get(location)
+        if estimator is None:
+            estimator = WidthEstimator(min_width=self.ROBOT_WIDTH,
+                                       max_width=self.MAX_WALL2WALL_DISTANCE)
+            self._width_estimators[location] = estimator
+        return estimator
+
+    def _width_record(self, location: MATLOCATION) -> Optional[LearnedWidth]:
+        estimator = self._width_estimators.get(location)
+        if estimator is None:
+            return None
+        return estimator.record()
 
     def get_initial_readings(self):
         """Get the initial readings stored in memory."""
@@ -254,20 +336,33 @@ class MatIntelligence(ShutdownInterface):
 
     def _mid_distance(self,state:Optional[RobotState]=None) -> float|None:
         """Get the mid distance for the current location."""
-        if self._current_min_distances is not None:
-            mid= (self._current_min_distances[0] + self._current_min_distances[1]) / 2
-            if state is not None:
-                mid2 = (state.left + state.right) / 2
-                if mid2 < mid and mid2 > 0:
-                    mid = mid2
-            return mid
-        return None
+        (min_left, min_right) = self._min_distances.value
+        mid= (min_left + min_right) / 2
+        if state is not None:
+            mid2 = (state.left + state.right) / 2
+            if mid2 < mid and mid2 > 0:
+                mid = mid2
+        return mid
+
+    def _set_learned_width(self, location: MATLOCATION, width: LearnedWidth) -> None:
+        """Keep the width record with the lowest uncertainty for the location."""
+        current = self._learned_widths.get(location)
+        if current is not None and current.samples >= self.CONFIDENT_WIDTH_SAMPLES \
+                and current.uncertainty < width.uncertainty:
+            logger.info("Not learning width for location: %s, current %.2f+-%.2f better",
+                        location, current.width, current.uncertainty)
+            return
+        self._learned_widths[location] = width
+        front = self.get_learned_distances(location)[0]
+        self._learned_distances[location] = (front, width.half_width, width.half_width)
+        logger.info("Learned width for location %s: %.2f +- %.2f (%d samples)", location,
+                    width.width, width.uncertainty, width.samples)
 
     def _set_learned_distance(self,location:MATLOCATION,mid:float)->None:
         current_dist = self.get_learned_distances(location)
         if current_dist is None:
             logger.info("Learning distances for location: %s", location)
-            logger.info("Current min distances: %s", self._current_min_distances)
+            logger.info("Current min distances: %s", self._min_distances.value)
 
             self._learned_distances[location] = (100,mid,mid)
         else:
@@ -275,7 +370,7 @@ class MatIntelligence(ShutdownInterface):
             if  mid_dist> mid or mid_dist < 20:
                 self._learned_distances[location] = (current_dist[0],mid,mid)
                 logger.info("Learning distances for location overwrite: %s", location)
-                logger.info("Current min distances overwrite: %s", self._current_min_distances)
+                logger.info("Current min distances overwrite: %s", self._min_distances.value)
             else:
                 logger.info("Not learning distances for location: %s", location)
 
@@ -283,29 +378,46 @@ class MatIntelligence(ShutdownInterface):
     def location_complete(self,state:Optional[RobotState] = None) -> MATLOCATION:
         """Change the current location of the Mat Walker."""
         logger.info("Location complete: %s, current dis:%s",self._location,
-                            self._current_min_distances)
+                            self._min_distances.value)
         if self._roundno == 1:
             self._wait_for_readings()
         next_location = self.next_location(self._location)
 
+        if self._validating_layout:
+            self._validate_layout()
+
+        record = self._width_record(self._location) if self._roundno == 1 else None
+
         if location_to_genericlocation(self._location) == MATGENERICLOCATION.SIDE:
             # We are at a side, so we can learn the distances.
-            mid = self._mid_distance(state)
-            logger.info("location complete: side mid:%s", mid)
-            if mid is not None:
-                if mid >50:
-                    mid = 48
-                elif mid < 40 and mid > 29:
-                    mid = 28
-                self._set_learned_distance(self._location, mid)
+            if record is not None and record.samples >= self.CONFIDENT_WIDTH_SAMPLES:
+                logger.info("location complete: side width:%s", record)
+                self._set_learned_width(self._location, record)
+            else:
+                # too few readings for statistics, use the conservative clamp.
+                mid = self._mid_distance(state)
+                logger.info("location complete: side mid:%s", mid)
+                if mid is not None:
+                    if mid >50:
+                        mid = 48
+                    elif mid < 40 and mid > 29:
+                        mid = 28
+                    self._set_learned_distance(self._location, mid)
         else:
             #We are at a corner , so we learned the distance for the next side.
-            mid = self._mid_distance()
-            logger.info("location complete: corner mid:%s", mid)
-            if mid is not None:
-                self._set_learned_distance(next_location, mid)
+            if record is not None and record.samples >= self.CONFIDENT_WIDTH_SAMPLES:
+                logger.info("location complete: corner width:%s", record)
+                self._set_learned_width(next_location, record)
+            else:
+                mid = self._mid_distance()
+                logger.info("location complete: corner mid:%s", mid)
+                if mid is not None:
+                    self._set_learned_distance(next_location, mid)
 
         if self._location == MATLOCATION.CORNER_4:
+            if self._validating_layout:
+                logger.info("Cached layout validated for a full lap.")
+                self._validating_layout = False
             self.reprocess_map()
             self.print_mat_intelligence()
             self._roundno += 1
@@ -314,14 +426,14 @@ class MatIntelligence(ShutdownInterface):
         self._location = next_location
 
         (_,left,right) = self.get_learned_distances()
-        self._current_min_distances = (left,right)
+        self._min_distances.publish((left,right))
 
 
         if self._roundno == 1:
             mid = self._mid_distance()
             if mid is not None and mid < 25:
                 logger.info("resetting current min for round 1 to default")
-                self._current_min_distances = self.DEFAULT_DISTANCE
+                self._min_distances.publish(self.DEFAULT_DISTANCE)
 
         if self._hardware_interface is not None:
             logger.info("NEW LOCATION===%s", self._location)
@@ -329,8 +441,7 @@ class MatIntelligence(ShutdownInterface):
         else:
             logger.error("Hardware interface is not set, cannot add comment.")
 
-        logger.info("Current readings... Left: %.2f, Right: %.2f",
-                    self._current_min_distances[0], self._current_min_distances[1])
+        logger.info("Current readings... Left: %.2f, Right: %.2f", *self._min_distances.value)
         return self._location
 
     def set_roundno(self, roundno:int) -> None:
@@ -348,6 +459,13 @@ class MatIntelligence(ShutdownInterface):
             elif generic_loc == MATGENERICLOCATION.CORNER:
                 self._reprocess_corner_distance(location)
 
+    def _total_width(self, location: MATLOCATION,
+                     learned_distance: tuple[float, float, float]) -> float:
+        """Width of a side, from the learned width record when it is trusted."""
+        if self.is_width_confident(location):
+            return self._learned_widths[location].width
+        return learned_distance[1] + learned_distance[2]
+
     def _reprocess_side_distance(self, location: MATLOCATION):
         """Reprocess the learned distance for a single side location."""
         learned_distance = self.get_learned_distances(location)
@@ -363,7 +481,7 @@ class MatIntelligence(ShutdownInterface):
             return
 
         logger.info("Next side %s has distance %s", next_side, next_side_distance)
-        total_width = next_side_distance[1] + next_side_distance[2]
+        total_width = self._total_width(next_side, next_side_distance)
 
         new_learned_distance = learned_distance
         if 50 < total_width < 130:  # Long side ahead
@@ -390,7 +508,7 @@ class MatIntelligence(ShutdownInterface):
             return
 
         logger.info("Next side %s has distance %s", next_side, next_side_distance)
-        total_width = next_side_distance[1] + next_side_distance[2]
+        total_width = self._total_width(next_side, next_side_distance)
 
         new_learned_distance = learned_distance
         if 50 < total_width < 130:  # Approaching a long side
@@ -442,7 +560,8 @@ class MatIntelligence(ShutdownInterface):
         logger.info("MatIntelligence shutdown complete.")
 
     def _process_each_readings(self, front_distance:float, left_distance: float,
-                                    right_distance: float) -> None:
+                                    right_distance: float, yaw: float = 0.0,
+                                    heading: Optional[float] = None) -> None:
         """Process each reading from the deque."""
         # logger.info("Processing reading: front=%.2f, left=%.2f, right=%.2f", front_distance,
         #                                                 left_distance, right_distance)
@@ -452,6 +571,9 @@ class MatIntelligence(ShutdownInterface):
 
         self._readings_counter += 1
 
+        if len(self._fingerprint_readings) < self.FINGERPRINT_READINGS:
+            self._fingerprint_readings.append((front_distance, left_distance, right_distance))
+
         if self._readings_counter == 1:
             # This is the first reading, set the starting distances
             total= left_distance + right_distance
@@ -462,12 +584,13 @@ class MatIntelligence(ShutdownInterface):
                         self._mem_initial_start[0], self._mem_initial_start[1],
                           self._mem_initial_start[2])
 
-        # Update the current minimum distances
-        total_distance = left_distance + right_distance
-        current_total_distance = total_distance
-
-        if self._current_min_distances is not None:
-            current_total_distance= self._current_min_distances[0] + self._current_min_distances[1]
+        # Update the current distances from the robust estimate of this location,
+        # a single bad echo does not move the windowed median.
+        total_distance = self._width_estimator(self._location).add(left_distance,
+                                                                   right_distance, yaw, heading)
+        if total_distance is None:
+            return
+        current_total_distance = sum(self._min_distances.value)
 
         if total_distance < current_total_distance:
             logger.info("Current distance: %.2f, New distance: %.2f",
@@ -475,9 +598,9 @@ class MatIntelligence(ShutdownInterface):
             left_distance = total_distance / 2
             right_distance = total_distance / 2
 
-            self._current_min_distances = (left_distance,right_distance)
+            self._min_distances.publish((left_distance,right_distance))
 
-            logger.info("Updated current minimum distances: %s", self._current_min_distances)
+            logger.info("Updated current minimum distances: %s", self._min_distances.value)
             if total_distance < self.MAX_WALL2WALL_DISTANCE:
                 # If the total distance is less than the minimum wall-to-wall distance,
                 # time to send the distances to the walker helper.
@@ -488,6 +611,92 @@ class MatIntelligence(ShutdownInterface):
                         self._callback(left_distance,right_distance)
 
 
+    def get_layout_fingerprint(self) -> Optional[LayoutFingerprint]:
+        """Fingerprint of the layout from the first readings at the start position."""
+        self._wait_for_readings()
+        if len(self._fingerprint_readings) < self.FINGERPRINT_READINGS:
+            return None
+        fronts, lefts, rights = zip(*self._fingerprint_readings)
+        return LayoutFingerprint(front=median(fronts), left=median(lefts), right=median(rights))
+
+    def export_layout(self) -> Dict[str, Any]:
+        """Export the learned direction and distances, to be stored in the layout cache."""
+        return {
+            "direction": self._direction.name,
+            "initial_start": list(self._mem_initial_start),
+            "distances": {location.name: list(distance)
+                          for location, distance in self._learned_distances.items()},
+            "widths": {location.name: list(width)
+                       for location, width in self._learned_widths.items()},
+        }
+
+    def warm_start(self, layout: Dict[str, Any]) -> None:
+        """Use a cached layout instead of learning in round 1.
+
+        The readings are still processed during the first lap to validate the layout,
+        see is_layout_valid().
+        """
+        self._wait_for_readings()
+        self._direction = MATDIRECTION[layout["direction"]]
+        self._learned_distances = {MATLOCATION[name]: tuple(distance) # type: ignore[misc]
+                                   for name, distance in layout["distances"].items()}
+        self._learned_widths = {MATLOCATION[name]: LearnedWidth(*width)
+                                for name, width in layout["widths"].items()}
+        self._location = MATLOCATION.SIDE_1
+        self._roundno = 2
+        (_, left, right) = self.get_learned_distances()
+        self._min_distances.publish((left, right))
+        self._validating_layout = True
+        self._layout_valid = True
+        self._width_estimators = {}
+        logger.info("Warm start with direction %s", self._direction)
+        self.print_mat_intelligence()
+
+    def is_layout_valid(self) -> bool:
+        """False if the readings did not match the warm started layout."""
+        return self._layout_valid
+
+    def abandon_warm_start(self,
+                           direction: MATDIRECTION = MATDIRECTION.UNKNOWN_DIRECTION) -> None:
+        """Go back to learning in round 1 from the current location.
+
+        direction: decided again from the readings, the cached one is kept if unknown.
+        """
+        logger.warning("Abandoning cached layout at location %s", self._location)
+        self._validating_layout = False
+        if direction != MATDIRECTION.UNKNOWN_DIRECTION:
+            self._direction = direction
+        # keep only what was measured in this run.
+        self._learned_widths = {location: width for location, width
+                                in self._learned_widths.items()
+                                if location in self._width_estimators}
+        self._learned_distances = {location: distance for location, distance
+                                   in self._learned_distances.items()
+                                   if location in self._learned_widths}
+        self._roundno = 1
+        self._min_distances.publish(self.DEFAULT_DISTANCE)
+
+    def _validate_layout(self) -> None:
+        """Compare the width measured at the current side with the cached one."""
+        if location_to_genericlocation(self._location) != MATGENERICLOCATION.SIDE:
+            return
+        cached = self._learned_widths.get(self._location)
+        measured = self._width_record(self._location)
+        if cached is None or measured is None or \
+                measured.samples < self.CONFIDENT_WIDTH_SAMPLES:
+            return
+        error = abs(cached.width - measured.width)
+        logger.info("Validating layout at %s: cached %.2f, measured %.2f", self._location,
+                    cached.width, measured.width)
+        if error > self.WARM_START_WIDTH_TOLERANCE + measured.uncertainty:
+            logger.warning("Cached layout mismatch at %s, error %.2f", self._location, error)
+            self._layout_valid = False
+            # keep what we measured, this side is already walked.
+            self._learned_widths[self._location] = measured
+            self._learned_distances[self._location] = (
+                self.get_learned_distances(self._location)[0],
+                measured.half_width, measured.half_width)
+
     def register_callback(self, callback: Callable[[float,float],None]) -> None:
         """Register the callback instance."""
         if not callable(callback):
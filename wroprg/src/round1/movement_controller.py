@@ -7,6 +7,8 @@ import threading
 
 from hardware.hardware_interface import HardwareInterface
 from round1.utilityfunctions import clamp_angle
+from utils.hotlog import HotLog
+from utils.flightrecorder import flight_recorder
 
 
 logger = logging.getLogger(__name__)
@@ -28,6 +30,12 @@ class MovementController:
     # 1 revolution = 0.05rps
     # error due to acceleration and deceleration is ignored.
 
+    # the turn lines are logged when the steering moved this many degrees, at most
+    # TURN_LOG_PER_SECOND times a second; a repeated turn only every TURN_SAME_LOG_EVERY.
+    TURN_LOG_MIN_CHANGE = 0.5
+    TURN_LOG_PER_SECOND = 10.0
+    TURN_SAME_LOG_EVERY = 50
+
     def __init__(
         self,
         output_inf: HardwareInterface,min_speed: float) -> None:
@@ -36,12 +44,19 @@ class MovementController:
 
         self._walking: bool = False
         self._prev_turn_angle: float = -99.0
+        self._turn_log = HotLog(logger, per_second=self.TURN_LOG_PER_SECOND,
+                                min_change=self.TURN_LOG_MIN_CHANGE, name="Turning")
+        self._turn_same_log = HotLog(logger, every_n=self.TURN_SAME_LOG_EVERY,
+                                     name="Turn angle same")
+        self._recorder = flight_recorder()
 
         self.min_speed = min_speed
 
         self.current_speed = 0
         self.start_time = 0.0
         self.distance = 0.0
+        # signed cm driven since the start, never reset, for the ego motion of the camera.
+        self.odometer = 0.0
 
         # Thread-safe queue for turn requests with a buffer of 1
         self._turn_queue = queue.Queue(maxsize=1)
@@ -89,6 +104,12 @@ class MovementController:
             self._add_speed()
         return self.distance
 
+    def get_odometer(self) -> float:
+        """Returns the signed distance driven since the start, not reset by reset_distance."""
+        if self._walking:
+            self._add_speed()
+        return self.odometer
+
     # Motion primitives
     def start_walking(self, speed: float) -> None:
         """Start driving forward at a given speed. Handles speed changes."""
@@ -148,7 +169,9 @@ class MovementController:
         if self.current_speed != 0 and self.start_time > 0:
             now = time.monotonic()
             elapsed_time = now - self.start_time
-            self.distance += elapsed_time * self.current_speed * DIST_PER_SPEED_PER_SEC
+            travelled = elapsed_time * self.current_speed * DIST_PER_SPEED_PER_SEC
+            self.distance += travelled
+            self.odometer += travelled
             self.start_time = now
 
     def turn_steering_with_logging(
@@ -183,27 +206,30 @@ class MovementController:
 
         # Clamp to provided or controller max steering angle
         turn_angle = clamp_angle(turn_angle, max_turn_angle or MAX_ANGLE)
+        self._recorder.record_steering(current_steering_angle, turn_angle)
 
         if turn_angle == self._prev_turn_angle:
-            logger.info("Turn angle same as previous; skipping turn")
+            self._turn_same_log.log("Turn angle same as previous; skipping turn")
             self._prev_turn_angle = 0.0
             return
         else:
             self._prev_turn_angle = turn_angle
 
         if delta >= 0:
-            logger.info(
+            self._turn_log.log(
                 "Turning right from %.2f to %.2f: %.2f",
                 current_steering_angle,
                 turn_angle,
                 delta,
+                value=turn_angle,
             )
         else:
-            logger.info(
+            self._turn_log.log(
                 "Turning left from %.2f to %.2f: %.2f",
                 current_steering_angle,
                 turn_angle,
                 delta,
+                value=turn_angle,
             )
 
         # Slow down for large corrections if requested
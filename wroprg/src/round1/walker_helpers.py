@@ -5,12 +5,16 @@ import time
 from abc import ABC
 from round1.utilityfunctions import clamp_angle
 from utils import constants
+from utils.hotlog import HotLog
+from utils.flightrecorder import flight_recorder
 
 logger = logging.getLogger(__name__)
 MAX_ANGLE = 30.0
 MIN_GYRO_DELTA = 0.05 # Minimum gyro delta angle in degrees
 DELTA_DISTANCE_CM = 0.5
 MIN_DISTANCE_TURN = 5
+# shared by the helpers of all walks, one call site in the walk loops.
+_walk_log = HotLog(logger, per_second=5.0, min_change=0.5, name="Walker errors")
 class PIDController:
     """Simple PID controller."""
 
@@ -108,8 +112,10 @@ class EquiWalkerHelper(ABC):
             f"Fuse: {fused_error:.2f} Tu:{turn:.2f}",
             ""
         ]
-        logger.info("Walker: Error D :%.2f G :%.2f Fuse: %.2f Tu:%.2f",
-                    distance_error, gyro_error, fused_error, turn)
+        _walk_log.log("Walker: Error D :%.2f G :%.2f Fuse: %.2f Tu:%.2f",
+                      distance_error, gyro_error, fused_error, turn,
+                      value=(distance_error, gyro_error, fused_error, turn))
+        flight_recorder().record_errors(distance_error, gyro_error, fused_error, turn)
         self._messages = message
 
 
@@ -0,0 +1,132 @@
+"""Streaming estimators used to learn the wall to wall width of each mat location."""
+import math
+import logging
+from collections import deque
+from statistics import median
+from typing import Deque, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LearnedWidth(NamedTuple):
+    """Learned width (left + right) of a location, with its uncertainty."""
+    width: float = 0
+    median: float = 0
+    trimmed_mean: float = 0
+    ci_low: float = 0
+    ci_high: float = 0
+    samples: int = 0
+    rejected: int = 0
+
+    @property
+    def half_width(self) -> float:
+        """Distance to each wall when the bot is centered."""
+        return self.width / 2
+
+    @property
+    def uncertainty(self) -> float:
+        """Half size of the confidence interval in cm."""
+        return (self.ci_high - self.ci_low) / 2
+
+    def is_confident(self, max_uncertainty: float, min_samples: int) -> bool:
+        """Check if the width is known well enough to be trusted."""
+        return self.samples >= min_samples and self.uncertainty <= max_uncertainty
+
+
+class WidthEstimator:
+    """Robust width estimator for a single location.
+
+    Each reading is checked against the heading of the side the walls run along: a
+    reading taken while the bot is angled to the walls reads wide, so it is either
+    corrected by the cosine of the angle or rejected when the angle is too high.
+    Without the side heading the median heading of the recent readings is used.
+    A windowed median is kept for the live estimate and all accepted lap samples
+    are kept for the trimmed mean and the confidence interval.
+    """
+
+    WINDOW_SIZE = 25
+    MAX_SAMPLES = 2000
+    TRIM_FRACTION = 0.2
+    MAX_YAW_DEVIATION = 12.0  # degrees from the side heading
+    MIN_YAW_SAMPLES = 5
+    Z_SCORE = 1.96  # 95% confidence interval
+
+    def __init__(self, min_width: float = 0, max_width: float = math.inf) -> None:
+        self.min_width = min_width
+        self.max_width = max_width
+        self._window: Deque[float] = deque(maxlen=self.WINDOW_SIZE)
+        self._yaw_window: Deque[float] = deque(maxlen=self.WINDOW_SIZE)
+        self._samples: List[float] = []
+        self._yaw_ref: Optional[float] = None
+        self._rejected = 0
+
+    def reset(self) -> None:
+        """Forget all the readings."""
+        self._window.clear()
+        self._yaw_window.clear()
+        self._samples = []
+        self._yaw_ref = None
+        self._rejected = 0
+
+    def _median_deviation(self, yaw: float) -> float:
+        if self._yaw_ref is None:
+            self._yaw_ref = yaw
+        # unwrap relative to the first heading, so the median works around +-180
+        rel_yaw = (yaw - self._yaw_ref + 180.0) % 360.0 - 180.0
+        self._yaw_window.append(rel_yaw)
+        if len(self._yaw_window) < self.MIN_YAW_SAMPLES:
+            return 0.0
+        return rel_yaw - median(self._yaw_window)
+
+    def add(self, left: float, right: float, yaw: float = 0.0,
+            heading: Optional[float] = None) -> Optional[float]:
+        """Add a reading, returns the windowed median width or None if rejected.
+
+        heading: yaw of the side the bot walks along, None if not known.
+        """
+        total = left + right
+        if left <= 0 or right <= 0 or total < self.min_width or total >= self.max_width:
+            self._rejected += 1
+            return None
+
+        if heading is not None:
+            deviation = (yaw - heading + 180.0) % 360.0 - 180.0
+        else:
+            deviation = self._median_deviation(yaw)
+        if abs(deviation) > self.MAX_YAW_DEVIATION:
+            self._rejected += 1
+            return None
+
+        corrected = total * math.cos(math.radians(deviation))
+        self._window.append(corrected)
+        if len(self._samples) < self.MAX_SAMPLES:
+            self._samples.append(corrected)
+        return median(self._window)
+
+    def windowed_median(self) -> Optional[float]:
+        """Median of the most recent readings."""
+        if not self._window:
+            return None
+        return median(self._window)
+
+    def record(self) -> Optional[LearnedWidth]:
+        """Summary of all the accepted readings."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        count = len(ordered)
+        trim = int(count * self.TRIM_FRACTION)
+        trimmed = ordered[trim:count - trim] if count - 2 * trim > 0 else ordered
+        trimmed_mean = sum(trimmed) / len(trimmed)
+
+        if len(trimmed) > 1:
+            variance = sum((x - trimmed_mean) ** 2 for x in trimmed) / (len(trimmed) - 1)
+            half_ci = self.Z_SCORE * math.sqrt(variance / len(trimmed))
+        else:
+            # a single reading says nothing about the noise
+            half_ci = math.inf
+
+        return LearnedWidth(width=trimmed_mean, median=median(ordered),
+                            trimmed_mean=trimmed_mean,
+                            ci_low=trimmed_mean - half_ci, ci_high=trimmed_mean + half_ci,
+                            samples=count, rejected=self._rejected)
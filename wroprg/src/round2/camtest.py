@@ -3,11 +3,17 @@ import cv2
 import numpy as np
 import os
 
+from hardware.calibration import CameraCalibration
+from hardware.camerameasurements import CameraDistanceMeasurements
+from round2.pillardetector import PillarDetector
+
 FRAME_WIDTH_PX = 640
 
 # Known actual parameters
-KNOWN_OBJECT_HEIGHT = 10.0  # cm (100 mm)
-KNOWN_FOCAL_LENGTH = 970.0  # pixels (from calibration)
+KNOWN_OBJECT_HEIGHT = PillarDetector.PILLAR_HEIGHT  # cm (100 mm)
+# pixels, from the calibration file (round2/testfocal.py) or the default
+detector = PillarDetector(calibration=CameraCalibration.load(CameraDistanceMeasurements.CALIBRATION_FILE))
+KNOWN_FOCAL_LENGTH = detector.focal_length(FRAME_WIDTH_PX)
 
 os.makedirs("outputs", exist_ok=True)
 
@@ -0,0 +1,237 @@
+"""Red and green pillar detection with one HSV conversion per frame."""
+import logging
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+
+from hardware.calibration import CameraCalibration
+
+logger = logging.getLogger(__name__)
+
+RED = "red"
+GREEN = "green"
+
+# x0, y0, x1, y1 in pixels of the detection image
+Roi = Tuple[int, int, int, int]
+
+
+class Pillar(NamedTuple):
+    """A pillar seen in one frame.
+
+    The bounding box is in pixels of the detection image (the frame scaled to
+    PillarDetector.DETECT_WIDTH, or the chroma resolution of the lores planes).
+    """
+    colour: str
+    bearing: float  # degrees, positive to the left of the heading
+    # cm, -1 when the pillar is cut by the top or bottom of the image or by a search roi
+    distance: float
+    x: int
+    y: int
+    width: int
+    height: int
+    area: int  # pixels of the pillar colour, 0 when predicted by the tracker
+    track_id: int = -1
+
+
+class PillarReading(NamedTuple):
+    """Pillars of one frame with its capture time on the camera clock."""
+    pillars: Tuple[Pillar, ...] = ()
+    frame_timestamp: float = 0
+
+    def nearest(self, colour: Optional[str] = None) -> Optional[Pillar]:
+        """Pillar with the smallest distance, of the given colour when set.
+
+        The pillars are not assumed to be in order. When only cut pillars (no distance)
+        are seen, the biggest of them.
+        """
+        pillars = [pillar for pillar in self.pillars
+                   if colour is None or pillar.colour == colour]
+        measured = [pillar for pillar in pillars if pillar.distance > 0]
+        if measured:
+            return min(measured, key=lambda pillar: pillar.distance)
+        return max(pillars, key=lambda pillar: pillar.area, default=None)
+
+
+class PillarDetector:
+    """Finds red and green pillars in BGR frames or lores YUV planes.
+
+    The frame is converted to HSV once, both colours are thresholded on the same HSV
+    image and each blob is measured with connected components. Distance comes from
+    the pixel height of the pillar, bearing from its center column, both looked up in
+    tables of the camera calibration built once per detection size.
+    """
+
+    # OpenCV hue is 0..180, red wraps around 0.
+    GREEN_RANGES = (((40, 40, 40), (80, 255, 255)),)
+    RED_RANGES = (((0, 100, 60), (8, 255, 255)), ((170, 100, 60), (180, 255, 255)))
+
+    PILLAR_HEIGHT = 10.0  # cm
+    # used without a calibration file, see hardware/calibration.py.
+    FOCAL_LENGTH = 970.0  # pixels, calibrated at FOCAL_WIDTH pixels wide
+    FOCAL_WIDTH = 640
+    DETECT_WIDTH = 320  # larger frames are scaled down to this width
+    MIN_AREA_FRAC = 0.0002  # of the detection image
+    MIN_ASPECT = 0.8  # height / width, an upright pillar is twice as high as wide
+    MAX_PILLARS = 6
+
+    def __init__(self, orientation_deg: int = 180,
+                 calibration: Optional[CameraCalibration] = None) -> None:
+        # 180: the camera is upside down, image columns grow to the left of the robot.
+        self._side = 1.0 if orientation_deg == 180 else -1.0
+        if calibration is None or calibration.focal_at(calibration.image_size[0]) is None:
+            calibration = CameraCalibration((self.FOCAL_WIDTH, self.FOCAL_WIDTH * 3 // 4),
+                                            focal_length=self.FOCAL_LENGTH)
+        self.calibration = calibration
+        self._ranges = tuple(
+            (colour, [(np.array(low, dtype=np.uint8), np.array(high, dtype=np.uint8))
+                      for low, high in ranges])
+            for colour, ranges in ((RED, self.RED_RANGES), (GREEN, self.GREEN_RANGES)))
+        self.shape: Tuple[int, int] = (0, 0)
+        self._small: NDArray[np.uint8] = np.empty((0, 0, 3), dtype=np.uint8)
+        self._yuv: NDArray[np.uint8] = np.empty((0, 0, 3), dtype=np.uint8)
+        self._bgr: NDArray[np.uint8] = np.empty((0, 0, 3), dtype=np.uint8)
+        self._hsv: NDArray[np.uint8] = np.empty((0, 0, 3), dtype=np.uint8)
+        self._mask: NDArray[np.uint8] = np.empty((0, 0), dtype=np.uint8)
+        self._tmp: NDArray[np.uint8] = np.empty((0, 0), dtype=np.uint8)
+        self._labels: NDArray[np.int32] = np.empty((0, 0), dtype=np.int32)
+        # bearing of each half column and distance of each pillar height in pixels.
+        self._bearings: NDArray[np.float64] = np.empty(0)
+        self._distances: NDArray[np.float64] = np.empty(0)
+
+    def _ensure_scratch(self, shape: Tuple[int, int]) -> None:
+        """Size the buffers on the first frame, or when the detection size changes."""
+        if self.shape == shape:
+            return
+        self.shape = shape
+        self._small = np.empty(shape + (3,), dtype=np.uint8)
+        self._yuv = np.empty(shape + (3,), dtype=np.uint8)
+        self._bgr = np.empty(shape + (3,), dtype=np.uint8)
+        self._hsv = np.empty(shape + (3,), dtype=np.uint8)
+        self._mask = np.empty(shape, dtype=np.uint8)
+        self._tmp = np.empty(shape, dtype=np.uint8)
+        self._labels = np.empty(shape, dtype=np.int32)
+        self._bearings = self.calibration.column_bearings(shape, self._side)
+        self._distances = self.calibration.height_distances(shape, self.PILLAR_HEIGHT)
+        logger.info("Pillar detector buffers sized for %s", shape)
+
+    def detection_shape(self, frame_shape: Tuple[int, ...]) -> Tuple[int, int]:
+        """Rows and columns of the detection image of a BGR frame."""
+        rows, cols = frame_shape[:2]
+        if cols <= self.DETECT_WIDTH:
+            return rows, cols
+        return max(1, round(rows * self.DETECT_WIDTH / cols)), self.DETECT_WIDTH
+
+    def focal_length(self, cols: int) -> float:
+        """Focal length in pixels of a detection image cols wide."""
+        return float(self.calibration.focal_at(cols))  # type: ignore[arg-type]
+
+    def column_of(self, bearing: float, cols: int) -> float:
+        """Detection image column of a bearing, inverse of the pillar bearing.
+
+        Outside of the image the column is extrapolated from the edge of the table.
+        """
+        if self.shape[1] == cols:
+            rows = self.shape[0]
+        else:
+            width, height = self.calibration.image_size
+            rows = round(cols * height / width)
+        bearings = self.calibration.column_bearings((rows, cols), self._side)
+        columns = np.arange(len(bearings)) / 2.0
+        if bearings[0] > bearings[-1]:
+            bearings = bearings[::-1]
+            columns = columns[::-1]
+        if bearings[0] <= bearing <= bearings[-1]:
+            return float(np.interp(bearing, bearings, columns))
+        end, inner = (0, 1) if bearing < bearings[0] else (-1, -2)
+        slope = (columns[end] - columns[inner]) / (bearings[end] - bearings[inner])
+        return float(columns[end] + (bearing - bearings[end]) * slope)
+
+    def detect(self, frame: NDArray[np.uint8],
+               rois: Optional[Sequence[Roi]] = None) -> Tuple[Pillar, ...]:
+        """Pillars of a BGR frame, biggest first, only inside the rois when given."""
+        shape = self.detection_shape(frame.shape)
+        self._ensure_scratch(shape)
+        if shape != frame.shape[:2]:
+            # linear is ~15x cheaper than area here, pillars span many source pixels.
+            cv2.resize(frame, (shape[1], shape[0]), dst=self._small,
+                       interpolation=cv2.INTER_LINEAR)
+            frame = self._small
+        return self._detect_bgr(frame, rois)
+
+    def detect_yuv(self, y_plane: NDArray[np.uint8], u_plane: NDArray[np.uint8],
+                   v_plane: NDArray[np.uint8],
+                   rois: Optional[Sequence[Roi]] = None) -> Tuple[Pillar, ...]:
+        """Pillars of the lores planes, detected at the chroma resolution."""
+        rows, cols = u_plane.shape
+        self._ensure_scratch((rows, cols))
+        yuv = self._yuv
+        yuv[:, :, 0] = y_plane[: 2 * rows : 2, : 2 * cols : 2]
+        yuv[:, :, 1] = u_plane
+        yuv[:, :, 2] = v_plane
+        cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR, dst=self._bgr)
+        return self._detect_bgr(self._bgr, rois)
+
+    def _detect_bgr(self, bgr: NDArray[np.uint8],
+                    rois: Optional[Sequence[Roi]]) -> Tuple[Pillar, ...]:
+        rows, cols = bgr.shape[:2]
+        if rois is None:
+            rois = ((0, 0, cols, rows),)
+        pillars: Dict[Tuple[Any, ...], Pillar] = {}
+        for x0, y0, x1, y1 in rois:
+            # views of the scratch buffers, the conversion only touches the roi.
+            region = (slice(max(0, y0), min(rows, y1)), slice(max(0, x0), min(cols, x1)))
+            hsv = self._hsv[region]
+            if hsv.size == 0:
+                continue
+            cv2.cvtColor(bgr[region], cv2.COLOR_BGR2HSV, dst=hsv)
+            mask = self._mask[region]
+            tmp = self._tmp[region]
+            for colour, ranges in self._ranges:
+                low, high = ranges[0]
+                cv2.inRange(hsv, low, high, dst=mask)
+                for low, high in ranges[1:]:
+                    cv2.inRange(hsv, low, high, dst=tmp)
+                    cv2.bitwise_or(mask, tmp, dst=mask)
+                for pillar in self._blobs(mask, colour, region, (rows, cols)):
+                    # overlapping rois find the same pillar twice.
+                    pillars[(pillar.colour, pillar.x, pillar.y, pillar.width,
+                             pillar.height)] = pillar
+        ordered = sorted(pillars.values(), key=lambda pillar: pillar.area, reverse=True)
+        return tuple(ordered[: self.MAX_PILLARS])
+
+    def _blobs(self, mask: NDArray[np.uint8], colour: str, region: Tuple[slice, slice],
+               shape: Tuple[int, int]) -> List[Pillar]:
+        """Pillars of the connected components of a colour mask of a region.
+
+        A box touching the top or bottom of the image, or any edge of the region inside
+        the image, may be cut: its height is not the pillar height, it has no distance.
+        """
+        whole = mask.shape == shape
+        # not GridStats: the distance needs the exact pixel height of each blob, one
+        # labelling pass gives every box and area where grid cells would split pillars.
+        # a region is not contiguous, OpenCV allocates its own small label image then.
+        labels = self._labels if whole else None
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, labels, 8, cv2.CV_32S)
+        rows, cols = shape
+        min_area = max(4, int(self.MIN_AREA_FRAC * rows * cols))
+        offset_x = region[1].start
+        offset_y = region[0].start
+        # a left or right edge of the image does not cut the height of a pillar.
+        cut_left = offset_x if offset_x > 0 else -1
+        cut_right = region[1].stop if region[1].stop < cols else -1
+        pillars = []
+        # label 0 is the background.
+        for x, y, width, height, area in stats[1:count].tolist():
+            if area < min_area or height < self.MIN_ASPECT * width:
+                continue
+            x += offset_x
+            y += offset_y
+            # the center column x + width / 2 is a half column of the table.
+            bearing = float(self._bearings[2 * x + width])
+            cut = y == offset_y or y + height == region[0].stop or \
+                x == cut_left or x + width == cut_right
+            distance = -1.0 if cut else float(self._distances[height])
+            pillars.append(Pillar(colour, bearing, distance, x, y, width, height, area))
+        return pillars
@@ -0,0 +1,239 @@
+"""Pillar tracks across frames, the detection searches only around the predicted pillars."""
+import logging
+import math
+import multiprocessing
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from round2.pillardetector import Pillar, PillarDetector, Roi
+
+logger = logging.getLogger(__name__)
+
+
+class EgoMotion:
+    """Yaw and travelled distance of the robot, shared with the vision process.
+
+    The control loop writes them, the tracker reads them once per frame. The
+    travelled distance is nan as long as no odometry feeds it.
+    """
+
+    def __init__(self) -> None:
+        self._values: Any = multiprocessing.get_context("spawn").RawArray("d", 2)
+        self._values[1] = math.nan
+
+    def set_yaw(self, yaw: float) -> None:
+        """Current yaw in degrees, positive to the right."""
+        self._values[0] = yaw
+
+    def add_travel(self, distance: float) -> None:
+        """Distance driven forward in cm since the last call."""
+        travelled = self._values[1]
+        self._values[1] = distance if math.isnan(travelled) else travelled + distance
+
+    def read(self) -> Tuple[float, float]:
+        """Yaw in degrees and total travelled cm (nan without odometry)."""
+        return self._values[0], self._values[1]
+
+
+class PillarTrack:
+    """A pillar followed across frames, position in cm relative to the robot."""
+
+    def __init__(self, track_id: int, pillar: Pillar, x: float, y: float) -> None:
+        self.track_id = track_id
+        self.colour = pillar.colour
+        self.x = x  # forward
+        self.y = y  # left
+        # apparent velocity in cm/s, used when there is no odometry.
+        self.vx = 0.0
+        self.vy = 0.0
+        self.pillar = pillar
+        self.hits = 1
+        self.misses = 0
+
+    @property
+    def bearing(self) -> float:
+        """Degrees, positive to the left."""
+        return math.degrees(math.atan2(self.y, self.x))
+
+    @property
+    def distance(self) -> float:
+        """Cm from the camera."""
+        return math.hypot(self.x, self.y)
+
+
+class PillarTracker:
+    """Keeps pillar tracks and picks where the detector has to look.
+
+    Tracks are moved each frame with the yaw change and the odometry, or with their
+    own constant velocity when there is no odometry, then matched to the pillars
+    found around their predicted boxes. The whole frame is searched every
+    FULL_SCAN_EVERY frames, when there is no track and when a track was lost.
+    """
+
+    FULL_SCAN_EVERY = 10
+    ROI_MARGIN = 0.75  # of the predicted box size, on each side
+    MATCH_GATE = 1.0  # center distance, in predicted box sizes
+    MAX_MISSES = 3  # frames a track is kept without a match
+    POSITION_GAIN = 0.6  # alpha beta filter gains
+    VELOCITY_GAIN = 0.2
+    MAX_DT = 0.5  # s, a longer gap resets the velocities
+
+    def __init__(self, detector: PillarDetector) -> None:
+        self.detector = detector
+        self.tracks: List[PillarTrack] = []
+        self.full_scans = 0
+        self.roi_scans = 0
+        self._next_id = 1
+        self._frames_since_scan = 0
+        self._full_scan_due = True
+        self._last_time: Optional[float] = None
+        self._last_yaw: Optional[float] = None
+        self._last_travel = math.nan
+        self._odometry = False
+
+    def update(self, detect: Callable[[Optional[Sequence[Roi]]], Tuple[Pillar, ...]],
+               frame_timestamp: float, yaw: Optional[float] = None,
+               travelled: float = math.nan) -> Tuple[Pillar, ...]:
+        """Track the pillars of a new frame.
+
+        detect: runs the detector on the frame, with the rois to search or None.
+        yaw: degrees, positive to the right. travelled: total cm, nan without odometry.
+        Returns the nearest detector.MAX_PILLARS tracked pillars, nearest first, those
+        not seen in this frame are predicted.
+        """
+        dt = 0.0 if self._last_time is None else frame_timestamp - self._last_time
+        self._last_time = frame_timestamp
+        self._predict(dt, yaw, travelled)
+
+        rois = None if self._full_scan_due else self._rois()
+        if rois is None:
+            self.full_scans += 1
+            self._frames_since_scan = 0
+        else:
+            self.roi_scans += 1
+            self._frames_since_scan += 1
+        pillars = detect(rois)
+        lost = self._match(pillars, dt, full_scan=rois is None)
+        self._full_scan_due = lost or not self.tracks or \
+                                    self._frames_since_scan + 1 >= self.FULL_SCAN_EVERY
+        nearest = sorted(self.tracks, key=lambda track: track.distance)
+        return tuple(self._output(track) for track in nearest[: self.detector.MAX_PILLARS])
+
+    def _predict(self, dt: float, yaw: Optional[float], travelled: float) -> None:
+        """Move the tracks with the motion of the robot since the last frame."""
+        turn = 0.0
+        if yaw is not None:
+            if self._last_yaw is not None:
+                turn = math.radians((yaw - self._last_yaw + 180.0) % 360.0 - 180.0)
+            self._last_yaw = yaw
+        forward = math.nan
+        if not math.isnan(travelled):
+            forward = 0.0 if math.isnan(self._last_travel) else travelled - self._last_travel
+            self._last_travel = travelled
+        if dt > self.MAX_DT:
+            for track in self.tracks:
+                track.vx = track.vy = 0.0
+
+        cos_t = math.cos(turn)
+        sin_t = math.sin(turn)
+        for track in self.tracks:
+            if math.isnan(forward):
+                track.x += track.vx * dt
+                track.y += track.vy * dt
+            else:
+                track.x -= forward
+            # turning right moves the pillars to the left.
+            track.x, track.y = (cos_t * track.x - sin_t * track.y,
+                                sin_t * track.x + cos_t * track.y)
+        self._odometry = not math.isnan(forward)
+
+        # pillars leaving the view are not lost, they need no full scan.
+        cols = self.detector.shape[1]
+        self.tracks = [track for track in self.tracks if track.x > 0 and
+                       0 <= self.detector.column_of(track.bearing, cols) < cols]
+
+    def _predicted_box(self, track: PillarTrack) -> Tuple[float, float, float, float]:
+        """Center column, center row, width and height of the track in the next frame."""
+        pillar = track.pillar
+        cols = self.detector.shape[1]
+        center_x = self.detector.column_of(track.bearing, cols)
+        scale = 1.0
+        if pillar.distance > 0 and track.x > 0:
+            scale = pillar.distance / track.distance
+        return (center_x, pillar.y + pillar.height / 2.0, pillar.width * scale,
+                pillar.height * scale)
+
+    def _rois(self) -> List[Roi]:
+        rois = []
+        for track in self.tracks:
+            center_x, center_y, width, height = self._predicted_box(track)
+            half_w = width * (0.5 + self.ROI_MARGIN)
+            half_h = height * (0.5 + self.ROI_MARGIN)
+            rois.append((int(center_x - half_w), int(center_y - half_h),
+                         int(math.ceil(center_x + half_w)), int(math.ceil(center_y + half_h))))
+        return rois
+
+    def _match(self, pillars: Tuple[Pillar, ...], dt: float, full_scan: bool) -> bool:
+        """Update the tracks with the pillars found, returns True when a track was lost."""
+        unmatched = list(pillars)
+        lost = False
+        for track in sorted(self.tracks, key=lambda track: track.distance):
+            center_x, center_y, width, height = self._predicted_box(track)
+            gate = self.MATCH_GATE * max(width, height, 1.0)
+            best = None
+            best_distance = gate
+            for pillar in unmatched:
+                if pillar.colour != track.colour:
+                    continue
+                distance = math.hypot(pillar.x + pillar.width / 2.0 - center_x,
+                                      pillar.y + pillar.height / 2.0 - center_y)
+                if distance < best_distance:
+                    best, best_distance = pillar, distance
+            if best is None:
+                track.misses += 1
+                lost = True
+                continue
+            unmatched.remove(best)
+            self._correct(track, best, dt)
+
+        alive = [track for track in self.tracks if track.misses <= self.MAX_MISSES]
+        if len(alive) != len(self.tracks):
+            logger.info("Dropped %d pillar tracks", len(self.tracks) - len(alive))
+        self.tracks = alive
+        if full_scan:
+            for pillar in unmatched:
+                if pillar.distance > 0:
+                    self._start_track(pillar)
+        return lost
+
+    def _start_track(self, pillar: Pillar) -> None:
+        bearing = math.radians(pillar.bearing)
+        self.tracks.append(PillarTrack(self._next_id, pillar,
+                                       pillar.distance * math.cos(bearing),
+                                       pillar.distance * math.sin(bearing)))
+        self._next_id += 1
+
+    def _correct(self, track: PillarTrack, pillar: Pillar, dt: float) -> None:
+        """Alpha beta update of the track with its pillar of this frame."""
+        track.pillar = pillar
+        track.hits += 1
+        track.misses = 0
+        # a cut pillar has no distance, keep the predicted one with the new bearing.
+        distance = pillar.distance if pillar.distance > 0 else track.distance
+        bearing = math.radians(pillar.bearing)
+        error_x = distance * math.cos(bearing) - track.x
+        error_y = distance * math.sin(bearing) - track.y
+        track.x += self.POSITION_GAIN * error_x
+        track.y += self.POSITION_GAIN * error_y
+        if not self._odometry and 0 < dt <= self.MAX_DT:
+            track.vx += self.VELOCITY_GAIN * error_x / dt
+            track.vy += self.VELOCITY_GAIN * error_y / dt
+
+    def _output(self, track: PillarTrack) -> Pillar:
+        """Pillar of the track, with the filtered bearing and distance."""
+        pillar = track.pillar
+        if track.misses:
+            center_x, center_y, width, height = self._predicted_box(track)
+            pillar = pillar._replace(x=int(center_x - width / 2), y=int(center_y - height / 2),
+                                     width=int(width), height=int(height), area=0)
+        return pillar._replace(bearing=track.bearing, distance=track.distance,
+                               track_id=track.track_id)
@@ -2,6 +2,7 @@ from picamera2 import Picamera2
 import cv2
 import numpy as np
 import os
+from utils.gridstats import GridStats
 
 FRAME_WIDTH_PX = 640
 
@@ -18,6 +19,7 @@ picam2.start()
 
 num_rows = 10
 num_cols = 10
+grid = GridStats()
 
 for frame_count in range(10):
     frame = picam2.capture_array()
@@ -48,26 +50,13 @@ for frame_count in range(10):
 
         H, W = frame.shape[:2]
 
-        # Initialize grid counts for green pixels
-        grid_counts = np.zeros((num_rows, num_cols), dtype=int)
+        # Green pixel counts per grid cell from one integral image of the mask
+        grid_counts = grid.update(mask, 255).grid(num_rows, num_cols)
 
         # Calculate sizes of each grid cell
         cell_height = H // num_rows
         cell_width = W // num_cols
 
-        # Calculate green pixel counts per quadrant in full frame mask
-        for i in range(num_rows):
-            for j in range(num_cols):
-                y_start = i * cell_height
-                y_end = (i + 1) * cell_height if i < num_rows - 1 else H
-                x_start = j * cell_width
-                x_end = (j + 1) * cell_width if j < num_cols - 1 else W
-
-                # Extract mask slice
-                quadrant_mask = mask[y_start:y_end, x_start:x_end]
-                green_count = cv2.countNonZero(quadrant_mask)
-                grid_counts[i, j] = green_count
-
         # Find the quadrant with maximum green pixels
         max_idx = np.unravel_index(np.argmax(grid_counts), grid_counts.shape)
         max_row, max_col = max_idx
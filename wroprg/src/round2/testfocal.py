@@ -2,12 +2,22 @@ from picamera2 import Picamera2
 import cv2
 import numpy as np
 import os
+import sys
+
+from hardware.calibration import CameraCalibration, focal_from_heights
+from hardware.camera import MyCamera
+from hardware.camerameasurements import CameraDistanceMeasurements
 
 FRAME_WIDTH_PX = 640
 
-# Prompt user to input actual object height and distance (in cm)
-KNOWN_OBJECT_HEIGHT = float(input("Enter the actual height of the object (cm): "))
-KNOWN_DISTANCE = float(input("Enter the distance from camera to object (cm): "))
+# Actual object height and distance (in cm), from the command line or prompted
+if len(sys.argv) > 2:
+    KNOWN_OBJECT_HEIGHT = float(sys.argv[1])
+    KNOWN_DISTANCE = float(sys.argv[2])
+else:
+    KNOWN_OBJECT_HEIGHT = float(input("Enter the actual height of the object (cm): "))
+    KNOWN_DISTANCE = float(input("Enter the distance from camera to object (cm): "))
+heights = []
 
 os.makedirs("outputs", exist_ok=True)
 
@@ -39,6 +49,7 @@ for frame_count in range(10):
 
         # Calculate focal length: f = (pixel height * distance) / actual height
         focal_length = (h * KNOWN_DISTANCE) / KNOWN_OBJECT_HEIGHT
+        heights.append(h)
         print(f"Frame {frame_count}: Calculated focal length = {focal_length:.2f} pixels")
 
         # Crop block region from y to bottom, full width
@@ -61,3 +72,12 @@ for frame_count in range(10):
         cv2.imwrite(f"outputs/block_{frame_count:05d}.jpg", frame)
 
 picam2.stop()
+
+if heights:
+    # Median over the frames, stored at the main stream width for the camera measurements
+    focal_length = focal_from_heights(heights, KNOWN_OBJECT_HEIGHT, KNOWN_DISTANCE)
+    filename = CameraDistanceMeasurements.CALIBRATION_FILE
+    calibration = CameraCalibration.load(filename) or CameraCalibration(MyCamera.MAIN_SIZE)
+    calibration.focal_length = focal_length * calibration.image_size[0] / FRAME_WIDTH_PX
+    calibration.save(filename)
+    print(f"Focal length {focal_length:.2f} pixels at {FRAME_WIDTH_PX} wide, saved to {filename}")
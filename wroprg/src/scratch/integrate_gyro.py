@@ -2,7 +2,7 @@
 import time
 from board import SCL, SDA
 import busio
-from scratch.mpu6050 import MPU6050
+from hardware.mpu6050fifo import MPU6050Fifo
 import adafruit_tca9548a
 DEVICE_I2C_CHANNEL = 6
 
@@ -12,15 +12,15 @@ tca = adafruit_tca9548a.TCA9548A(i2c)
 
 device_channel = tca[DEVICE_I2C_CHANNEL]
 
-mpu = MPU6050(device_channel)
+# the FIFO keeps every sample, the reads do not need to keep up with the sample rate.
+mpu = MPU6050Fifo.from_i2c(device_channel, rate_hz=200.0)
+mpu.estimate_bias()
 cum = 0.0
-t_prev = time.perf_counter()    
 for _ in range(600):
-    mpu.read()
-    gx, gy, gz = mpu.gyro
-    t = time.perf_counter()
-    dt = t - t_prev
-    t_prev = t
-    cum += gz * dt
-    print(f"dt={dt:.4f}s gz={gz:.2f}°/s cum={cum:.2f}°")
-    time.sleep(0.01)
\ No newline at end of file
+    samples = mpu.read_samples()
+    for sample in samples:
+        cum += sample.rate_z * mpu.period
+    if samples:
+        print(f"n={len(samples)} t={samples[-1].timestamp:.4f}s gz={samples[-1].rate_z:.2f}°/s "
+              f"cum={cum:.2f}° overflows={mpu.overflows}")
+    time.sleep(0.01)
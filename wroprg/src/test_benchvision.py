@@ -0,0 +1,22 @@
+"""Test for the vision benchmark suite."""
+from benchmarks.bench_vision import load_results, run, save_results
+
+
+def test_quick_run_stores_comparable_results(tmp_path):
+    """Every stage should report timings, and the stored results should load back."""
+
+    results = run(rounds=3, quick=True)
+    assert {r.stage for r in results} == {"border", "border_yuv", "distances", "pillars",
+                                          "pillars_yuv", "process_camera"}
+    assert {r.mode for r in results if r.stage == "border"} == {
+        "median", "median_allocating", "histogram", "groundplane"}
+    assert {r.mode for r in results if r.stage == "process_camera"} == {
+        "walls", "pillars", "tracked_pillars"}
+    for r in results:
+        assert r.fps > 0 and 0 < r.p50_ms <= r.p99_ms
+
+    filename = str(tmp_path / "results.json")
+    save_results(filename, results, "abc1234", 3)
+    loaded = load_results(filename)
+    assert loaded["commit"] == "abc1234"
+    assert [r.key for r in loaded["results"]] == [r.key for r in results]
@@ -0,0 +1,79 @@
+"""Test for the camera calibration file and its lookup tables."""
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import pillar_frame, synthetic_ground_model
+from hardware.calibration import CameraCalibration, board_object_points, \
+    calibrate_intrinsics, focal_from_heights
+from round2.pillardetector import PillarDetector
+
+IMAGE_SIZE = (1332, 990)
+CAMERA_MATRIX = np.array([[900.0, 0.0, 666.0], [0.0, 900.0, 495.0], [0.0, 0.0, 1.0]])
+DIST_COEFFS = np.array([-0.2, 0.05, 0.0, 0.0, 0.0])
+
+
+def test_intrinsics_from_board_views_and_focal_from_heights():
+    """Projected chessboard views should give back the camera, pillar heights the focal."""
+
+    object_points = board_object_points()
+    views = []
+    for rx, ry, tz in ((0.3, 0.0, 40.0), (-0.3, 0.2, 45.0), (0.1, -0.4, 35.0),
+                       (0.0, 0.3, 50.0), (0.4, 0.4, 40.0)):
+        image_points, _ = cv2.projectPoints(object_points, np.array([rx, ry, 0.0]),
+                                            np.array([-9.0, -6.0, tz]), CAMERA_MATRIX,
+                                            DIST_COEFFS)
+        views.append(image_points.astype(np.float32))
+    camera_matrix, dist_coeffs, error = calibrate_intrinsics(views, IMAGE_SIZE)
+    assert error < 0.01
+    assert np.allclose(camera_matrix, CAMERA_MATRIX, rtol=0.01)
+    assert abs(dist_coeffs[0] - DIST_COEFFS[0]) < 0.01
+
+    assert focal_from_heights([97.0, 0.0, 100.0, 103.0], 10.0, 50.0) == 500.0
+
+
+def test_calibration_round_trip_and_tables(tmp_path):
+    """A saved calibration should load with the same model and lookup tables."""
+
+    calibration = CameraCalibration(IMAGE_SIZE, CAMERA_MATRIX, DIST_COEFFS,
+                                    ground_plane=synthetic_ground_model())
+    filename = str(tmp_path / "camera_calibration.json")
+    calibration.save(filename)
+    loaded = CameraCalibration.load(filename)
+    assert loaded is not None and loaded.ground_plane is not None
+    assert np.allclose(loaded.camera_matrix, CAMERA_MATRIX)
+    assert np.allclose(loaded.ground_plane.homography, calibration.ground_plane.homography)
+    assert CameraCalibration.load(str(tmp_path / "missing.json")) is None
+
+    shape = (240, 320)
+    bearings = loaded.column_bearings(shape)
+    assert loaded.column_bearings(shape) is bearings
+    assert len(bearings) == 2 * shape[1] + 1 and abs(bearings[shape[1]]) < 1e-9
+    assert np.all(np.diff(bearings) > 0)
+    # barrel distortion: the edge of the image sees further out than the pinhole model.
+    pinhole = np.degrees(np.arctan(shape[1] / 2 / (900.0 * shape[1] / IMAGE_SIZE[0])))
+    assert bearings[-1] > pinhole
+
+    distances = loaded.height_distances(shape, 10.0)
+    assert distances[0] == np.inf and abs(distances[50] - 10.0 * 900.0 * 320 / 1332 / 50) < 1e-9
+    image = np.zeros(shape + (3,), dtype=np.uint8)
+    assert loaded.undistort(image).shape == image.shape
+    assert CameraCalibration(IMAGE_SIZE, focal_length=900.0).undistort(image) is image
+
+
+def test_pillar_detector_uses_the_calibration():
+    """Pillar distances and bearings should follow the calibrated focal length."""
+
+    frame = pillar_frame()
+    default = PillarDetector().detect(frame)[0]
+    focal = 2 * PillarDetector.FOCAL_LENGTH * IMAGE_SIZE[0] / PillarDetector.FOCAL_WIDTH
+    detector = PillarDetector(calibration=CameraCalibration(IMAGE_SIZE, focal_length=focal))
+    pillar = detector.detect(frame)[0]
+    assert abs(pillar.distance - 2 * default.distance) < 1e-6
+    assert abs(pillar.bearing) < abs(default.bearing)
+
+    distorted = PillarDetector(calibration=CameraCalibration(IMAGE_SIZE, CAMERA_MATRIX,
+                                                             DIST_COEFFS))
+    pillar = distorted.detect(frame)[0]
+    cols = distorted.shape[1]
+    assert abs(distorted.column_of(pillar.bearing, cols) - (pillar.x + pillar.width / 2)) < 0.01
+    assert distorted.column_of(80.0, cols) > cols and distorted.column_of(-80.0, cols) < 0
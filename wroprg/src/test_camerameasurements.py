@@ -0,0 +1,137 @@
+"""Test for the camera border measurements, without the camera."""
+import numpy as np
+
+from benchmarks.synthetic import SyntheticCamera
+from hardware.camerameasurements import CameraDistanceMeasurements, CameraReading, \
+    camera_clock, histogram_median, luma_histogram
+
+
+def _measurements(allocation_free: bool, engine: str = "median") -> CameraDistanceMeasurements:
+    measurements = CameraDistanceMeasurements(SyntheticCamera())  # type: ignore[arg-type]
+    measurements.ALLOCATION_FREE = allocation_free
+    measurements.THRESHOLD_ENGINE = engine
+    return measurements
+
+
+def _frame(rng: np.random.Generator, rows: int, cols: int) -> np.ndarray:
+    frame = rng.integers(0, 256, size=(rows, cols, 3), dtype=np.uint8)
+    frame[:, : cols // 3] //= 4
+    return frame
+
+
+def test_scratch_buffers_match_allocating_path():
+    """The scratch buffer path should give exactly the same percentages."""
+
+    rng = np.random.default_rng(7)
+    scratch = _measurements(True)
+    allocating = _measurements(False)
+
+    for section_thresholds in (True, False):
+        scratch.USE_SECTION_THRESHOLDS = section_thresholds
+        allocating.USE_SECTION_THRESHOLDS = section_thresholds
+        for _ in range(3):
+            frame = _frame(rng, 120, 160)
+            assert scratch._measure_border(frame, 0.0) == allocating._measure_border(frame, 0.0)
+
+    # the buffers follow a change of frame size.
+    frame = rng.integers(0, 256, size=(60, 80, 3), dtype=np.uint8)
+    assert scratch._measure_border(frame, 0.0) == allocating._measure_border(frame, 0.0)
+
+
+def test_histogram_median_matches_numpy():
+    """The histogram median should be exact, including the even count average."""
+
+    rng = np.random.default_rng(3)
+    for size in (1, 2, 7, 64, 1001):
+        values = rng.integers(0, 256, size=(1, size), dtype=np.uint8)
+        assert histogram_median(luma_histogram(values)) == float(np.median(values))
+
+    # the two middle values are different.
+    values = np.array([[10, 10, 20, 30]], dtype=np.uint8)
+    assert histogram_median(luma_histogram(values)) == 15.0
+
+
+def test_histogram_engine_matches_median_engine():
+    """The histogram engine should give the same percentages as the np.median engine."""
+
+    rng = np.random.default_rng(11)
+    histogram = _measurements(True, "histogram")
+    median = _measurements(False, "median")
+
+    for section_thresholds in (True, False):
+        histogram.USE_SECTION_THRESHOLDS = section_thresholds
+        median.USE_SECTION_THRESHOLDS = section_thresholds
+        for rows, cols in ((120, 160), (61, 83), (2, 8)):
+            frame = _frame(rng, rows, cols)
+            assert histogram._measure_border(frame, 0.0) == median._measure_border(frame, 0.0)
+
+    # uniform grey wall, every pixel is dark.
+    frame = np.full((40, 80, 3), 30, dtype=np.uint8)
+    assert histogram._measure_border(frame, 0.0)[:3] == (100.0, 100.0, 100.0)
+
+
+def test_empty_sections_are_not_dark():
+    """A ROI narrower than 4 columns has empty left and center sections, 0 % dark."""
+
+    assert histogram_median(np.zeros(256, dtype=np.float32)) == 0.0
+
+    frame = np.full((40, 3, 3), 30, dtype=np.uint8)
+    for allocation_free, engine in ((True, "histogram"), (True, "median"), (False, "median")):
+        measurements = _measurements(allocation_free, engine)
+        for section_thresholds in (True, False):
+            measurements.USE_SECTION_THRESHOLDS = section_thresholds
+            (center, left, right) = measurements._measure_border(frame, 0.0)[:3]
+            assert (center, left) == (0.0, 0.0) and right == 100.0 or \
+                (center, right) == (0.0, 0.0) and left == 100.0
+
+
+def test_camera_reading_staleness():
+    """Readings older than the asked age should not be used."""
+
+    reading = CameraReading(front=10.0, left=-1, right=20.0, frame_timestamp=100.0,
+                            result_timestamp=100.015, queue_depth=0)
+    assert abs(reading.latency_ms - 15.0) < 1e-6
+    assert reading.is_fresh(50.0, now=100.04)
+    assert not reading.is_fresh(50.0, now=100.06)
+    assert CameraReading().age_ms() == -1.0
+    assert CameraReading().distances(max_age_ms=50.0) == (-1.0, -1.0, -1.0)
+
+    measurements = CameraDistanceMeasurements(SyntheticCamera())  # type: ignore[arg-type]
+    measurements.process_camera()
+    (front, left, right, metrics) = measurements.get_distance(max_age_ms=10_000.0)
+    assert (front, left, right) == measurements.get_reading()[:3]
+    assert metrics["c.latency_ms"] >= 0 and metrics["c.age_ms"] >= metrics["c.latency_ms"]
+    # the metrics are of the same frame as the distances.
+    assert (metrics["c.frontd"], metrics["c.leftd"], metrics["c.rightd"]) == (front, left, right)
+
+    stale = measurements.get_reading()._replace(frame_timestamp=camera_clock() - 1.0)
+    measurements._publish(stale)
+    assert measurements.get_distance(max_age_ms=50.0)[:3] == (-1.0, -1.0, -1.0)
+
+    # the age limit in frames follows the frame rate of the frame: 60 ms is less than
+    # two periods at 25 fps, more than two at 50 fps.
+    recent = CameraReading(40.0, 30.0, 20.0, camera_clock() - 0.06, camera_clock(), 0)
+    for fps, fresh in ((25, True), (50, False), (0, False)):
+        measurements.metrics['c.fps'] = fps
+        measurements._publish(recent)
+        assert (measurements.get_distance(max_age_frames=2.0)[0] == 40.0) == fresh
+
+
+def test_outputs_write_images_without_camera_thread(tmp_path):
+    """The vision worker only starts the outputs, the debug images are still written."""
+
+    class Saving(CameraDistanceMeasurements):
+        """Saves every frame to the test folder."""
+        SAVE_CAMERA_IMAGE = True
+        CAMERA_OUTPUT_DIR = str(tmp_path / "output")
+        ADAPTIVE_FPS = False
+
+    measurements = Saving(SyntheticCamera(use_lores=True))  # type: ignore[arg-type]
+    measurements.start_outputs()
+    for _ in range(3):
+        measurements.process_camera()
+    measurements.shutdown()
+    assert not measurements.camera_thread.is_alive()
+    # frames of the same millisecond share a file name.
+    assert measurements._image_sink is not None and measurements._image_sink.written == 3
+    assert list((tmp_path / "output").glob("frame_*.jpg"))
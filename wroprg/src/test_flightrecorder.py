@@ -0,0 +1,39 @@
+"""Test for the flight recorder ring buffer and its dump."""
+import numpy as np
+
+from hardware.robotstate import RobotState
+from utils.flightrecorder import FIELDS, FlightRecorder, load_flight_record
+
+
+def test_ring_keeps_the_last_ticks_and_dumps_them(tmp_path):
+    """The ring wraps to the last capacity ticks, the dump loads in tick order."""
+
+    filename = str(tmp_path / "flightrecord.npz")
+    recorder = FlightRecorder(capacity=4, filename=filename)
+    recorder.record_errors(1.0, 2.0, 3.0, 4.0)  # before the first tick, ignored
+    for tick in range(6):
+        recorder.record_state(RobotState(front=100.0 - tick, left=30.0, right=40.0,
+                                         yaw=float(tick), camera_age=12.0), distance=tick * 5.0)
+        if tick % 2 == 0:
+            recorder.record_errors(0.5, -0.25, 0.1, float(tick))
+            recorder.record_steering(2.0, 3.5)
+
+    assert recorder.snapshot().shape == (4, len(FIELDS))
+    assert recorder.dump("error") == filename
+    # nothing new to write at shutdown.
+    assert recorder.dump() is None
+
+    ticks = load_flight_record(filename)
+    assert list(ticks["yaw"]) == [2.0, 3.0, 4.0, 5.0]
+    assert list(ticks["front"]) == [98.0, 97.0, 96.0, 95.0]
+    assert list(ticks["distance"]) == [10.0, 15.0, 20.0, 25.0]
+    assert ticks["camera_age"][0] == 12.0 and ticks["camera_front"][0] == 0.0
+    assert ticks["turn"][2] == 4.0 and ticks["steering_command"][2] == 3.5
+    # the ticks the helper did not reach stay nan.
+    assert np.isnan(ticks["turn"][1]) and np.isnan(ticks["steering"][3])
+    assert np.all(np.diff(ticks["timestamp"]) >= 0)
+
+    # a later dump rotates the first one.
+    recorder.record_state(RobotState(front=1.0), distance=0.0)
+    recorder.dump()
+    assert len(list(tmp_path.glob("flightrecord*.npz"))) == 2
@@ -0,0 +1,76 @@
+"""Test for the adaptive camera frame rate controller."""
+from typing import Optional
+
+from hardware.fpscontroller import AdaptiveFpsController, ControlLoopMonitor
+
+
+class _FakeHealth:
+    def __init__(self) -> None:
+        self.temperature: Optional[float] = 50.0
+        self.throttled = False
+
+    def read_temperature(self) -> Optional[float]:
+        return self.temperature
+
+    def is_throttling(self) -> bool:
+        return self.throttled
+
+
+def _controller(health: _FakeHealth, monitor: ControlLoopMonitor) -> AdaptiveFpsController:
+    return AdaptiveFpsController(15, 30, 0.5, health, monitor.overruns)  # type: ignore[arg-type]
+
+
+def test_controller_keeps_detection_rates_when_idle():
+    """Without load the detection state picks the min or max frame rate."""
+
+    controller = _controller(_FakeHealth(), ControlLoopMonitor())
+    assert controller.update(False, 2.0, now=0.0) == (15, 0.5, 0)
+    assert controller.update(True, 2.0, now=0.1) == (30, 0.5, 0)
+
+    # slow frames cap the rate to half a core.
+    for i in range(20):
+        setting = controller.update(True, 50.0, now=0.2 + i * 0.1)
+    assert setting.fps == 10
+
+
+def test_controller_backs_off_on_overruns_and_recovers():
+    """Control loop overruns should lower the frame rate and ROI until they stop."""
+
+    monitor = ControlLoopMonitor()
+    controller = _controller(_FakeHealth(), monitor)
+
+    now = 0.0
+    for _ in range(4):
+        # one tick of 80 ms misses the 50 ms deadline.
+        monitor.tick(now)
+        monitor.tick(now + 0.08)
+        setting = controller.update(True, 2.0, now=now + 0.08)
+        now += 1.0
+    assert setting.level == len(AdaptiveFpsController.LEVELS) - 1
+    assert setting.fps < 30 and setting.roi_frac < 0.5
+
+    # idle gaps are not overruns, the level comes back one step at a time.
+    monitor.tick(now + 5.0)
+    setting = controller.update(True, 2.0, now=now + 5.0)
+    assert setting.level == len(AdaptiveFpsController.LEVELS) - 2
+    for step in range(10):
+        setting = controller.update(True, 2.0, now=now + 9.0 + 4.0 * step)
+    assert setting == (30, 0.5, 0)
+
+
+def test_controller_drops_to_lowest_level_when_hot():
+    """A hot or throttled CPU should go to the lowest level at once."""
+
+    health = _FakeHealth()
+    controller = _controller(health, ControlLoopMonitor())
+    health.temperature = 80.0
+    assert controller.update(True, 2.0, now=0.0).level == len(AdaptiveFpsController.LEVELS) - 1
+
+    health.temperature = 72.0
+    controller = _controller(health, ControlLoopMonitor())
+    assert controller.update(True, 2.0, now=0.0).level == 1
+
+    health.temperature = None
+    health.throttled = True
+    controller = _controller(health, ControlLoopMonitor())
+    assert controller.update(True, 2.0, now=0.0).level == len(AdaptiveFpsController.LEVELS) - 1
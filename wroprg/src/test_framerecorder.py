@@ -0,0 +1,89 @@
+"""Test for the frame recorder and its replay camera."""
+import errno
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import SyntheticCamera
+from hardware.camerameasurements import CameraDistanceMeasurements
+from hardware.framerecorder import FrameRecorder, FrameRecording, ReplayCamera
+
+
+class Measurements(CameraDistanceMeasurements):
+    """Percentage distances without the adaptive frame rate."""
+    DISTANCE_MODEL = "percentage"
+    ADAPTIVE_FPS = False
+
+
+def test_recording_round_trip(tmp_path):
+    """Frames should read back as written, up to the capacity."""
+
+    filename = str(tmp_path / "planes.rec")
+    recorder = FrameRecorder(filename, [(4, 6), (2, 3)], capacity=3, metadata={"use_lores": True})
+    for i in range(4):
+        recorder.append(10.0 + i, np.full((4, 6), i, np.uint8), np.full((2, 3), 9 - i, np.uint8))
+    # readable while the recorder still has the file open.
+    assert len(FrameRecording(filename)) == 3
+    recorder.shutdown()
+
+    recording = FrameRecording(filename)
+    assert recording.metadata["use_lores"] is True
+    assert list(recording.timestamps) == [10.0, 11.0, 12.0]
+    y_plane, uv_plane = recording.planes(2)
+    assert (y_plane == 2).all() and (uv_plane == 7).all()
+
+
+@pytest.mark.parametrize("use_lores", [True, False])
+def test_replay_matches_live_measurements(tmp_path, use_lores):
+    """Replayed frames should give the distances measured while recording."""
+
+    Measurements.RECORD_FILE = str(tmp_path / "frames.rec")
+    Measurements.RECORD_FRAMES = True
+    try:
+        live = Measurements(SyntheticCamera(use_lores))  # type: ignore[arg-type]
+        live.start_outputs()
+        live_metrics = []
+        for _ in range(SyntheticCamera.FRAMES):
+            live.process_camera()
+            live_metrics.append(dict(live.metrics))
+        live.shutdown()
+    finally:
+        Measurements.RECORD_FRAMES = False
+
+    camera = ReplayCamera(FrameRecording(Measurements.RECORD_FILE))
+    assert camera.use_lores == use_lores
+    replayed = Measurements(camera)  # type: ignore[arg-type]
+    camera.start()
+    for metrics in live_metrics:
+        replayed.process_camera()
+        for key in ('c.frontp', 'c.leftp', 'c.rightp', 'c.frontd', 'c.leftd', 'c.rightd'):
+            assert replayed.metrics[key] == metrics[key]
+        assert 0 <= replayed.get_reading().age_ms() < 1000
+    with pytest.raises(EOFError):
+        camera.capture_lores() if use_lores else camera.capture()
+
+
+def test_recording_is_sized_by_the_budget_and_survives_a_full_disk(tmp_path, monkeypatch):
+    """The frames fit the byte budget, a failed allocation only disables the recording."""
+
+    class Budget(Measurements):
+        """Room for ten lores frames."""
+        RECORD_FRAMES = True
+        RECORD_FILE = str(tmp_path / "frames.rec")
+        RECORD_BUDGET_BYTES = 10 * (240 * 320 + 2 * 120 * 160)
+
+    measurements = Budget(SyntheticCamera(use_lores=True))  # type: ignore[arg-type]
+    measurements.start_outputs()
+    assert measurements._recorder is not None and measurements._recorder.capacity == 10
+    measurements.shutdown()
+
+    def full_disk(*args):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr("hardware.framerecorder.os.posix_fallocate", full_disk, raising=False)
+    measurements = Budget(SyntheticCamera(use_lores=True))  # type: ignore[arg-type]
+    measurements.start_outputs()
+    assert measurements._recorder is None
+    assert not (tmp_path / "frames.rec").exists()
+    measurements.process_camera()
+    assert measurements.metrics["c.leftp"] > 50.0 or measurements.metrics["c.rightp"] > 50.0
@@ -0,0 +1,45 @@
+"""Test for the grid statistics of masks."""
+import cv2
+import numpy as np
+
+from utils.gridstats import GridStats, band_sums
+
+
+def _loop_grid(mask, rows, cols):
+    """Per cell countNonZero, as round2/pixelangle.py did."""
+    height, width = mask.shape
+    counts = np.zeros((rows, cols), dtype=int)
+    for i in range(rows):
+        for j in range(cols):
+            y_end = (i + 1) * (height // rows) if i < rows - 1 else height
+            x_end = (j + 1) * (width // cols) if j < cols - 1 else width
+            counts[i, j] = cv2.countNonZero(mask[i * (height // rows):y_end,
+                                                 j * (width // cols):x_end])
+    return counts
+
+
+def test_grid_matches_cell_loop():
+    """Grid counts, argmax and rectangles should match counting each cell."""
+
+    rng = np.random.default_rng(3)
+    mask = np.where(rng.random((123, 161)) > 0.7, 255, 0).astype(np.uint8)
+    mask[40:60, 100:130] = 255
+    stats = GridStats().update(mask, 255)
+    for rows, cols in ((10, 10), (3, 7), (1, 1)):
+        assert (stats.grid(rows, cols) == _loop_grid(mask, rows, cols)).all()
+    counts = _loop_grid(mask, 10, 10)
+    assert stats.argmax(10, 10) == np.unravel_index(np.argmax(counts), counts.shape)
+    assert stats.rect_sum(5, 50, 7, 90) == cv2.countNonZero(mask[5:50, 7:90])
+    assert list(stats.sectors((0, 40, 120, 161), (10, 100))) == \
+        [cv2.countNonZero(mask[10:100, a:b]) for a, b in ((0, 40), (40, 120), (120, 161))]
+
+
+def test_band_sums_of_bool_mask():
+    """Band sums should count the set pixels of each vertical band."""
+
+    rng = np.random.default_rng(4)
+    mask = rng.random((50, 97)) > 0.4
+    edges = (0, 24, 72, 97)
+    assert list(band_sums(mask, edges)) == \
+        [np.count_nonzero(mask[:, a:b]) for a, b in zip(edges[:-1], edges[1:])]
+    assert list(GridStats().update(mask).sectors(edges)) == list(band_sums(mask, edges))
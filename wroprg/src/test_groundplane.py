@@ -0,0 +1,50 @@
+"""Test for the ground plane distance model on rendered frames."""
+import numpy as np
+
+from benchmarks.synthetic import SyntheticCamera, project_floor, render_walls, \
+    synthetic_ground_model
+from hardware.camerameasurements import CameraDistanceMeasurements
+from hardware.groundplane import GroundPlaneModel
+
+
+def test_model_maps_calibration_points_and_round_trips(tmp_path):
+    """The fitted homography should map the calibration pixels back to the floor."""
+
+    model = synthetic_ground_model()
+    ground = np.array([[30.0, 0.0], [50.0, 10.0], [20.0, -15.0]])
+    assert np.allclose(model.image_to_ground(project_floor(ground[:, 0], ground[:, 1])), ground,
+                       atol=1e-6)
+
+    filename = str(tmp_path / "ground_plane.json")
+    model.save(filename)
+    loaded = GroundPlaneModel.load(filename)
+    assert loaded is not None
+    assert np.allclose(loaded.homography, model.homography)
+    assert GroundPlaneModel.load(str(tmp_path / "missing.json")) is None
+
+
+def test_ground_distances_on_rendered_walls():
+    """Continuous front and side distances should come from the wall-floor boundary."""
+
+    model = synthetic_ground_model()
+    measurements = CameraDistanceMeasurements(SyntheticCamera())  # type: ignore[arg-type]
+    measurements._ground_model = model
+    shape = (248, 333)
+
+    (_, _, _, front, left, right) = measurements._measure_border(
+        render_walls(model, shape, front=20.0, left=1000.0), 0.0)
+    assert abs(front - 20.0) < 1.0
+    assert abs(measurements.metrics['c.frontangle']) < 3.0
+    assert left == -1 and right == -1
+
+    (_, _, _, front, left, right) = measurements._measure_border(
+        render_walls(model, shape, front=1000.0, left=12.0), 0.0)
+    assert front == -1
+    assert abs(left - 12.0) < 1.0
+    assert abs(measurements.metrics['c.leftangle']) < 3.0
+    assert right == -1
+
+    (_, _, _, front, left, right) = measurements._measure_border(
+        render_walls(model, shape, front=1000.0, left=1000.0, right=15.0), 0.0)
+    assert front == -1 and left == -1
+    assert abs(right - 15.0) < 1.0
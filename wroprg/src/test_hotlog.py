@@ -0,0 +1,53 @@
+"""Test for the hot path logging policies."""
+import logging
+
+from utils.hotlog import HotLog, log_hot_log_summary
+
+
+def test_every_n_and_change_policies(caplog):
+    """Every n-th call is logged, a change policy only logs values that moved."""
+
+    logger = logging.getLogger("test.hotlog")
+    every = HotLog(logger, every_n=3, name="every")
+    with caplog.at_level(logging.INFO, logger="test.hotlog"):
+        logged = [every.log("Turn angle same as previous") for _ in range(7)]
+    assert logged == [True, False, False, True, False, False, True]
+    assert (every.calls, every.logged, every.suppressed) == (7, 3, 4)
+    assert caplog.messages[1] == "Turn angle same as previous (2 suppressed)"
+
+    caplog.clear()
+    change = HotLog(logger, min_change=1.0, name="change")
+    values = [(100.0, 30.0), (100.5, 30.0), (100.9, 29.2), (101.5, 30.0), (101.5, 31.2)]
+    with caplog.at_level(logging.INFO, logger="test.hotlog"):
+        for front, left in values:
+            change.log("F:%.2f L:%.2f", front, left, value=(front, left))
+    assert caplog.messages == ["F:100.00 L:30.00", "F:101.50 L:30.00 (2 suppressed)",
+                               "F:101.50 L:31.20"]
+    # the record points at the caller.
+    assert caplog.records[0].funcName == "test_every_n_and_change_policies"
+
+
+def test_rate_policy_and_summary(caplog, monkeypatch):
+    """At most per_second records a second, the summary lists the suppressed counts."""
+
+    now = [10.0]
+    monkeypatch.setattr("utils.hotlog.time.monotonic", lambda: now[0])
+    logger = logging.getLogger("test.hotlog")
+    rate = HotLog(logger, per_second=2.0, name="rate")
+    logged = []
+    with caplog.at_level(logging.INFO, logger="test.hotlog"):
+        for _ in range(10):
+            logged.append(rate.log("Walker: Error D :%.2f", 1.0))
+            now[0] += 0.125
+    assert logged == [True, False, False, False] * 2 + [True, False]
+
+    caplog.clear()
+    with caplog.at_level(logging.INFO, logger="test.hotlog"):
+        log_hot_log_summary(logger)
+    assert "Hot log rate: 10 calls, 3 logged, 7 suppressed" in caplog.messages
+
+    # nothing is counted as logged below the level of the logger.
+    debug = HotLog(logger, level=logging.DEBUG)
+    with caplog.at_level(logging.INFO, logger="test.hotlog"):
+        assert not debug.log("hidden")
+    assert debug.logged == 0 and debug.suppressed == 0
@@ -0,0 +1,48 @@
+"""Test for the background debug image writer."""
+import threading
+
+import cv2
+import numpy as np
+
+from hardware.imagesink import ImageSink
+
+
+def test_writes_images_in_background(tmp_path):
+    """Queued images should be converted and written by the sink thread."""
+
+    sink = ImageSink(lambda image: cv2.rotate(image, cv2.ROTATE_180))
+    sink.start()
+    image = np.zeros((8, 10, 3), dtype=np.uint8)
+    image[0, 0] = 255
+    for i in range(3):
+        assert sink.submit(str(tmp_path / f"frame_{i}.png"), image)
+    sink.shutdown()
+    assert sink.written == 3 and sink.dropped == 0
+    written = cv2.imread(str(tmp_path / "frame_2.png"))
+    assert (written[-1, -1] == 255).all()
+
+
+def test_drops_oldest_and_decimates(tmp_path):
+    """A stalled writer should keep only the newest images, decimation skips the rest."""
+
+    release = threading.Event()
+    started = threading.Event()
+
+    def stall(image):
+        started.set()
+        release.wait(5.0)
+        return image
+
+    sink = ImageSink(stall, queue_size=2, decimation=2)
+    sink.start()
+    image = np.zeros((4, 4), dtype=np.uint8)
+    assert sink.submit(str(tmp_path / "frame_0.png"), image)
+    assert started.wait(5.0)
+    queued = [sink.submit(str(tmp_path / f"frame_{i}.png"), image) for i in range(1, 11)]
+    assert queued == [False, True] * 5
+    assert sink.decimated == 5 and sink.dropped == 3 and sink.pending() == 2
+    release.set()
+    sink.shutdown()
+    assert sink.written == 3
+    assert sorted(path.name for path in tmp_path.iterdir()) == \
+        ["frame_0.png", "frame_10.png", "frame_8.png"]
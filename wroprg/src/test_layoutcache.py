@@ -0,0 +1,71 @@
+"""Test for the layout cache used to warm start the walker."""
+import json
+
+from round1.layoutcache import LayoutCache, LayoutFingerprint
+
+
+def test_layout_cache_store_and_lookup(tmp_path):
+    """Stored layouts should be found with a close fingerprint and persisted."""
+
+    filename = str(tmp_path / "layout_cache.json")
+    cache = LayoutCache(filename)
+    fingerprint = LayoutFingerprint(front=150.0, left=30.0, right=40.0)
+    layout = {"direction": "CLOCKWISE_DIRECTION", "distances": {}, "widths": {}}
+
+    assert cache.lookup(fingerprint) is None
+    cache.store(fingerprint, layout)
+
+    # readings are never the same between runs.
+    reloaded = LayoutCache(filename)
+    assert reloaded.lookup(LayoutFingerprint(front=152.0, left=31.0, right=38.5)) == layout
+
+    # a different start position is a different layout.
+    assert reloaded.lookup(LayoutFingerprint(front=150.0, left=45.0, right=25.0)) is None
+
+    reloaded.invalidate(fingerprint)
+    assert LayoutCache(filename).lookup(fingerprint) is None
+
+
+def test_layout_cache_ignores_bad_file(tmp_path):
+    """A corrupted cache file should be ignored."""
+
+    filename = tmp_path / "layout_cache.json"
+    filename.write_text("{not json", encoding="utf-8")
+
+    cache = LayoutCache(str(filename))
+    assert cache.lookup(LayoutFingerprint(front=150.0, left=30.0, right=40.0)) is None
+
+
+def test_layout_cache_ignores_invalid_entries(tmp_path):
+    """A cache with the wrong schema should be treated as no cache."""
+
+    filename = tmp_path / "layout_cache.json"
+    fingerprint = LayoutFingerprint(front=150.0, left=30.0, right=40.0)
+    layout = {"direction": "CLOCKWISE_DIRECTION", "initial_start": [150.0, 30.0, 40.0],
+              "distances": {"SIDE_1": [100, 35.0, 35.0]},
+              "widths": {"SIDE_1": [70.0, 70.0, 70.0, 69.0, 71.0, 40, 2]}}
+    invalid_layouts = [
+        {"direction": "SIDEWAYS", "distances": {}, "widths": {}},
+        {"direction": "CLOCKWISE_DIRECTION", "distances": {"SIDE_9": [1, 2, 3]},
+         "widths": {}},
+        {"direction": "CLOCKWISE_DIRECTION", "distances": {"SIDE_1": [1, "2", 3]},
+         "widths": {}},
+        {"direction": "CLOCKWISE_DIRECTION", "distances": {}, "widths": {"SIDE_1": [70.0]}},
+        {"direction": "CLOCKWISE_DIRECTION", "distances": {}},
+    ]
+    for invalid in invalid_layouts:
+        entries = [{"fingerprint": list(fingerprint), "layout": layout},
+                   {"fingerprint": [150.0, 60.0, 10.0], "layout": invalid}]
+        filename.write_text(json.dumps({"version": LayoutCache.VERSION, "entries": entries}),
+                            encoding="utf-8")
+        assert LayoutCache(str(filename)).lookup(fingerprint) is None, invalid
+
+    for data in ([1, 2], {"version": LayoutCache.VERSION, "entries": {}},
+                 {"version": LayoutCache.VERSION, "entries": [{"layout": layout}]}):
+        filename.write_text(json.dumps(data), encoding="utf-8")
+        assert LayoutCache(str(filename)).lookup(fingerprint) is None
+
+    # the same layout alone is valid.
+    filename.write_text(json.dumps({"version": LayoutCache.VERSION, "entries": [
+        {"fingerprint": list(fingerprint), "layout": layout}]}), encoding="utf-8")
+    assert LayoutCache(str(filename)).lookup(fingerprint) == layout
@@ -0,0 +1,67 @@
+"""Test for the queued logging pipeline and its rate limit."""
+import logging
+
+from base.logger_setup import LoggerSetup, RateLimitFilter
+
+
+def test_rate_limit_counts_suppressed_records():
+    """A call site over its rate should be dropped, the next passed record counts them."""
+
+    limit = RateLimitFilter(rate=1.0, burst=2)
+    records = [logging.LogRecord("walker", logging.INFO, "logic.py", 87, "State", None, None)
+               for _ in range(5)]
+    assert [limit.filter(record) for record in records] == [True, True, False, False, False]
+    other = logging.LogRecord("walker", logging.INFO, "logic.py", 90, "Other", None, None)
+    assert limit.filter(other) and limit.suppressed == 3
+    # a second of tokens later the call site passes again, with the count.
+    key = ("logic.py", 87)
+    tokens, last, dropped = limit._buckets[key]
+    limit._buckets[key] = (tokens, last - 1.0, dropped)
+    assert limit.filter(records[0]) and records[0].__dict__["suppressed"] == 3
+
+
+def test_rate_limit_never_drops_errors():
+    """A burst of errors should all pass, the rate limit only applies below ERROR."""
+
+    limit = RateLimitFilter(rate=1.0, burst=2)
+    errors = [logging.LogRecord("walker", level, "logic.py", 87, "Stuck", None, None)
+              for level in [logging.ERROR] * 20 + [logging.CRITICAL] * 5]
+    assert all(limit.filter(record) for record in errors) and limit.suppressed == 0
+    # the errors did not use the tokens of the call site.
+    info = [logging.LogRecord("walker", logging.INFO, "logic.py", 87, "State", None, None)
+            for _ in range(3)]
+    assert [limit.filter(record) for record in info] == [True, True, False]
+
+
+def test_queued_pipeline_writes_everything_on_shutdown(tmp_path):
+    """Records are formatted by the listener, mutable arguments when they are logged."""
+
+    class QueuedSetup(LoggerSetup):
+        """Logs to the test folder."""
+        LOG_FILE = str(tmp_path / "application.log")
+        CONSOLE_RATE_LIMIT = 0
+
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    setup = QueuedSetup()
+    try:
+        setup.setup()
+        logger = logging.getLogger("test.walker")
+        distances = [10.0, 20.0]
+        for i in range(100):
+            logger.info("State F:%.2f", float(i))
+        logger.info("Distances %s", distances)
+        distances.append(30.0)
+        logger.debug("not written")
+        setup.shutdown()
+    finally:
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        for handler in handlers:
+            root.addHandler(handler)
+        root.setLevel(level)
+
+    with open(QueuedSetup.LOG_FILE, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 102 and lines[1].endswith("INFO - State F:0.00")
+    assert lines[-1].endswith("Distances [10.0, 20.0]")
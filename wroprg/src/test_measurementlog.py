@@ -0,0 +1,112 @@
+"""Test for the binary measurement log and its csv converter."""
+import time
+
+from hardware.measurementlog import BinaryMeasurementsLogger, load_measurements, to_csv
+from hardware.measurements import Measurement, MeasurementFileLog, MeasurementsLogger
+from hardware.robotstate import RobotState
+
+
+def _write(mlogger, measurements) -> None:
+    mlogger.writeheader()
+    mlogger.write_comment("New Location : MATLOCATION.SIDE_1")
+    for measurement in measurements:
+        mlogger.write_measurement(measurement)
+    mlogger.write_comment("done")
+    mlogger.close_file()
+
+
+def test_binary_log_converts_to_the_csv_and_loads_into_numpy(tmp_path):
+    """The converted log should be the csv MeasurementsLogger writes for the same records."""
+
+    measurements = [Measurement(10.0 + i, 20.125, 100.0 - i, -3.5, 12.345 * i, i * 20,
+                                {"c.frontd": -1, "c.latency_ms": 31.25 + i, "paused": False,
+                                 "c.level": i % 3, "label": "skipped"})
+                    for i in range(500)]
+    measurements.append(Measurement(1.0, 2.0, 3.0, 4.0, 5.0, 10000, {}))
+
+    binary = BinaryMeasurementsLogger(str(tmp_path / "measurements.bin"))
+    binary.FLUSH_INTERVAL_S = 0.01
+    _write(binary, measurements)
+    assert binary.skipped_metrics == 500
+
+    csv_logger = MeasurementsLogger()
+    csv_logger.filename = str(tmp_path / "measurements.csv")
+    for measurement in measurements[:-1]:
+        measurement.extra_metrics.pop("label")
+    _write(csv_logger, measurements)
+
+    converted = str(tmp_path / "converted.csv")
+    assert to_csv(binary.filename, converted) == 501
+    with open(converted, encoding="utf-8") as f, \
+            open(csv_logger.filename, encoding="utf-8") as expected:
+        assert f.read() == expected.read()
+
+    log = load_measurements(binary.filename)
+    assert len(log.measurements) == 501 and log.measurements["left_distance"][499] == 509.0
+    assert log.metrics["c.latency_ms"][2] == 33.25
+    assert log.metrics["paused"][-1] != log.metrics["paused"][-1]  # nan, no metrics
+    assert [text for _, text in log.comments] == ["New Location : MATLOCATION.SIDE_1", "done"]
+
+    # a crash in the middle of a record keeps the records before it.
+    with open(binary.filename, "rb") as f:
+        data = f.read()
+    truncated = str(tmp_path / "truncated.bin")
+    with open(truncated, "wb") as f:
+        f.write(data[:-30])
+    assert len(load_measurements(truncated).measurements) == 500
+
+
+class _Camera:
+    """Camera metrics without a camera."""
+
+    def get_distance(self):
+        return (-1, -1, -1, {"c.seq": 3})
+
+
+class _Hardware:
+    """Counts the screen messages, fails when the log reads the sensors."""
+
+    def __init__(self) -> None:
+        self.camera_measurements = _Camera()
+        self.messages = 0
+
+    def read_state(self, tick: bool = False) -> RobotState:
+        raise AssertionError("the measurement log should not read the sensors")
+
+    def log_message(self, **kwargs) -> None:
+        self.messages += 1
+
+    def disable_logger(self) -> None:
+        """Nothing to disable."""
+
+
+def test_file_log_records_the_pushed_states(tmp_path):
+    """The states pushed by the control loop are logged, each one once."""
+
+    class Logged(MeasurementFileLog):
+        """Binary log of every pushed state."""
+        ENABLE_MEASURE_LOG = True
+        LOG_FORMAT = "binary"
+        LOG_INTERVAL_S = 0.005
+
+    hardware = _Hardware()
+    file_log = Logged(hardware)  # type: ignore[arg-type]
+    file_log._mlogger.filename = str(tmp_path / "measurements.bin")
+    file_log.start_reading()
+    try:
+        for i in range(3):
+            file_log.push_state(RobotState(front=100.0 - i, left=30.0, right=40.0, yaw=2.0 * i),
+                                steering_angle=-4.0)
+            # wait for the thread to log it before the next state replaces it.
+            deadline = time.monotonic() + 5.0
+            while file_log._mlogger.records <= i and time.monotonic() < deadline:
+                time.sleep(0.001)
+    finally:
+        file_log.shutdown()
+
+    log = load_measurements(file_log._mlogger.filename)
+    assert list(log.measurements["front_distance"]) == [100.0, 99.0, 98.0]
+    assert list(log.measurements["yaw"]) == [0.0, 2.0, 4.0]
+    assert (log.measurements["steering_angle"] == -4.0).all()
+    assert log.metrics["c.seq"][0] == 3
+    assert hardware.messages >= 1
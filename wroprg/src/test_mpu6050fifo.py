@@ -0,0 +1,88 @@
+"""Test for the MPU6050 FIFO gyro backend on a fake I2C device."""
+import struct
+
+from hardware import mpu6050fifo
+from hardware.mpu6050fifo import MPU6050Fifo
+
+
+class FakeMPU6050:
+    """Registers and FIFO of an MPU6050, used like an adafruit I2CDevice."""
+
+    def __init__(self) -> None:
+        self.registers = {}
+        self.fifo = bytearray()
+        self.overflow = False
+        self.transfers = 0
+
+    def __enter__(self) -> "FakeMPU6050":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def push(self, *rates_lsb: int) -> None:
+        """Queue gyro z samples, raw LSB."""
+        for rate in rates_lsb:
+            self.fifo += struct.pack(">h", rate)
+        if len(self.fifo) > mpu6050fifo.FIFO_SIZE:
+            del self.fifo[:len(self.fifo) - mpu6050fifo.FIFO_SIZE]
+            self.overflow = True
+
+    def write(self, buf: bytes) -> None:
+        reg, value = buf
+        self.registers[reg] = value
+        if reg == mpu6050fifo.USER_CTRL and value & mpu6050fifo.USER_CTRL_FIFO_RESET:
+            self.fifo.clear()
+            self.overflow = False
+
+    def write_then_readinto(self, out: bytes, buf: bytearray) -> None:
+        self.transfers += 1
+        reg = out[0]
+        if reg == mpu6050fifo.INT_STATUS:
+            buf[0] = mpu6050fifo.INT_STATUS_FIFO_OFLOW if self.overflow else 0
+            self.overflow = False
+        elif reg == mpu6050fifo.FIFO_COUNT_H:
+            buf[:] = struct.pack(">H", len(self.fifo))
+        elif reg == mpu6050fifo.FIFO_R_W:
+            buf[:] = self.fifo[:len(buf)]
+            del self.fifo[:len(buf)]
+        else:
+            buf[0] = self.registers.get(reg, 0)
+
+
+def test_fifo_samples_are_drained_in_bulk_with_the_sample_period():
+    """Every queued sample should come back in order, spaced by the sample period."""
+
+    device = FakeMPU6050()
+    mpu = MPU6050Fifo(device, rate_hz=200.0, gyro_range=1)
+    assert device.registers[mpu6050fifo.SMPLRT_DIV] == 4 and mpu.period == 0.005
+    assert device.registers[mpu6050fifo.FIFO_EN] == mpu6050fifo.FIFO_EN_ZG
+    assert device.registers[mpu6050fifo.GYRO_CONFIG] == 1 << 3
+    assert mpu.read_samples() == []
+
+    device.push(*range(-250, 250))
+    transfers = device.transfers
+    samples = mpu.read_samples()
+    assert len(samples) == 500 and device.transfers - transfers == 2 + 2
+    assert samples[0].rate_z == -250 / 65.5 and samples[-1].rate_z == 249 / 65.5
+    steps = [b.timestamp - a.timestamp for a, b in zip(samples, samples[1:])]
+    assert all(abs(step - 0.005) < 1e-9 for step in steps)
+
+    mpu.bias = 1.0
+    device.push(655)
+    later = mpu.read_samples()
+    assert len(later) == 1 and abs(later[0].rate_z - 9.0) < 1e-9
+    assert later[0].timestamp > samples[-1].timestamp
+
+
+def test_fifo_overflow_resets_and_odd_bytes_wait():
+    """An overflowed FIFO is dropped, a half sample stays queued."""
+
+    device = FakeMPU6050()
+    mpu = MPU6050Fifo(device)
+    device.push(*([100] * 600))
+    assert mpu.read_samples() == [] and mpu.overflows == 1 and not device.fifo
+
+    device.fifo += b"\x00\x83\x01"
+    assert [sample.rate_z for sample in mpu.read_samples()] == [131 / 131.0]
+    assert device.fifo == b"\x01"
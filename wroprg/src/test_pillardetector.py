@@ -0,0 +1,86 @@
+"""Test for the round 2 pillar detection."""
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import SyntheticCamera, add_pillar, pillar_frame, synthetic_frame
+from hardware.camerameasurements import CameraDistanceMeasurements
+from round2.pillardetector import GREEN, RED, PillarDetector
+
+
+def test_detects_red_and_green_pillars():
+    """Both pillars should be found, nearest first, with bearing and distance."""
+
+    detector = PillarDetector(orientation_deg=180)
+    frame = pillar_frame()
+    pillars = detector.detect(frame)
+    assert [pillar.colour for pillar in pillars] == [RED, GREEN]
+    red, green = pillars
+    # upside down camera: right of the image center is left of the robot.
+    assert red.bearing > 0 and green.bearing > red.bearing
+    assert 0 < red.distance < green.distance
+    rows, cols = detector.detection_shape(frame.shape)
+    focal = PillarDetector.FOCAL_LENGTH * cols / PillarDetector.FOCAL_WIDTH
+    # one pixel of the scaled box is a few percent of the height.
+    expected = PillarDetector.PILLAR_HEIGHT * focal / (rows / 8)
+    assert abs(red.distance - expected) < 0.05 * expected
+
+    assert PillarDetector(orientation_deg=0).detect(frame)[0].bearing == -red.bearing
+    assert detector.detect(synthetic_frame()) == ()
+
+
+def test_lores_planes_and_cut_pillars():
+    """The lores planes should give the same pillars, a cut pillar has no distance."""
+
+    frame = add_pillar(synthetic_frame(), (40, 40, 200), 200, 0, 80, 200)
+    yuv = cv2.cvtColor(cv2.resize(frame, (320, 240), interpolation=cv2.INTER_AREA),
+                       cv2.COLOR_BGR2YUV)
+    planes = (np.ascontiguousarray(yuv[:, :, 0]), np.ascontiguousarray(yuv[::2, ::2, 1]),
+              np.ascontiguousarray(yuv[::2, ::2, 2]))
+    detector = PillarDetector()
+    (main,) = detector.detect(frame)
+    (lores,) = detector.detect_yuv(*planes)
+    assert main.colour == lores.colour == RED
+    assert abs(main.bearing - lores.bearing) < 2.0
+    assert main.distance == lores.distance == -1
+
+
+def test_pillars_cut_by_a_roi_have_no_distance():
+    """A box touching the edge of a search roi may be part of a pillar, like at the image edge."""
+
+    detector = PillarDetector(orientation_deg=180)
+    frame = pillar_frame()
+    red = detector.detect(frame)[0]
+    x0, y0, x1, y1 = red.x, red.y, red.x + red.width, red.y + red.height
+    around = detector.detect(frame, [(x0 - 5, y0 - 5, x1 + 5, y1 + 5)])
+    assert [(p.colour, p.distance) for p in around] == [(RED, red.distance)]
+
+    for roi in ((x0 - 5, y0 + 3, x1 + 5, y1 + 5), (x0 - 5, y0 - 5, x1 + 5, y1 - 3),
+                (x0 + red.width // 2, y0 - 5, x1 + 5, y1 + 5),
+                (x0 - 5, y0 - 5, x1 - red.width // 2, y1 + 5)):
+        (cut,) = detector.detect(frame, [roi])
+        assert cut.colour == RED and cut.distance == -1, roi
+
+
+def test_pillar_budget_skips_frames():
+    """A detection dearer than the budget should run only every few frames."""
+
+    class PillarMeasurements(CameraDistanceMeasurements):
+        """Measurements with pillars and no ground plane calibration."""
+        DETECT_PILLARS = True
+        DISTANCE_MODEL = "percentage"
+        ADAPTIVE_FPS = False
+
+    camera = SyntheticCamera()
+    camera._frames = [pillar_frame(seed) for seed in range(SyntheticCamera.FRAMES)]
+    measurements = PillarMeasurements(camera)  # type: ignore[arg-type]
+    measurements.process_camera()
+    pillars = measurements.get_pillars()
+    assert pillars.nearest(GREEN) is not None
+    assert pillars.frame_timestamp == measurements.get_reading().frame_timestamp
+
+    measurements.PILLAR_BUDGET_MS = measurements._pillar_ms / 2.5
+    measurements._update_pillars(measurements._pillar_detector.detect,  # type: ignore
+                                 0.0, camera.capture())
+    assert measurements._pillar_skip >= 2
+    measurements.process_camera()
+    assert measurements.get_pillars().frame_timestamp == 0.0
@@ -0,0 +1,158 @@
+"""Test for the round 2 pillar tracker."""
+import math
+from typing import List, Optional, Sequence, Tuple
+
+from benchmarks.synthetic import pillar_frame
+from round2.pillardetector import GREEN, RED, Pillar, PillarDetector, PillarReading, Roi
+from round2.pillartracker import EgoMotion, PillarTracker
+
+SHAPE = (240, 320)
+
+
+class FakeScene:
+    """Pillars at fixed bearings and distances, seen by a robot turning in place."""
+
+    def __init__(self, detector: PillarDetector, pillars: List[Tuple[str, float, float]]):
+        self.detector = detector
+        self.pillars = pillars  # colour, bearing at yaw 0, distance
+        self.yaw = 0.0
+        self.rois: List[Optional[Sequence[Roi]]] = []
+
+    def detect(self, rois: Optional[Sequence[Roi]]) -> Tuple[Pillar, ...]:
+        """Pillars whose center is inside a roi, same as the detector would find."""
+        self.rois.append(rois)
+        found = []
+        focal = self.detector.focal_length(SHAPE[1])
+        for colour, bearing, distance in self.pillars:
+            # turning right moves the pillars to the left.
+            bearing += self.yaw
+            height = PillarDetector.PILLAR_HEIGHT * focal / distance
+            center_x = self.detector.column_of(bearing, SHAPE[1])
+            center_y = 100.0
+            if rois is not None and not any(x0 <= center_x < x1 and y0 <= center_y < y1
+                                             for x0, y0, x1, y1 in rois):
+                continue
+            found.append(Pillar(colour, bearing, distance, int(center_x - height / 4),
+                                int(center_y - height / 2), int(height / 2), int(height),
+                                int(height * height / 2)))
+        return tuple(found)
+
+
+def test_tracks_keep_ids_while_turning():
+    """A turning robot should keep its tracks with roi searches between full scans."""
+
+    detector = PillarDetector()
+    detector._ensure_scratch(SHAPE)
+    scene = FakeScene(detector, [(RED, -10.0, 80.0), (GREEN, -15.0, 120.0)])
+    tracker = PillarTracker(detector)
+    ids = None
+    for frame in range(30):
+        scene.yaw = 0.8 * frame
+        pillars = tracker.update(scene.detect, frame / 30.0, yaw=scene.yaw)
+        assert len(pillars) == 2
+        if ids is None:
+            ids = {pillar.colour: pillar.track_id for pillar in pillars}
+        assert {pillar.colour: pillar.track_id for pillar in pillars} == ids
+        red = next(pillar for pillar in pillars if pillar.colour == RED)
+        assert abs(red.bearing - (-10.0 + scene.yaw)) < 1.0
+        assert abs(red.distance - 80.0) < 1.0
+
+    assert tracker.full_scans == 3
+    assert tracker.roi_scans == 27
+    assert all(len(rois) == 2 for rois in scene.rois if rois is not None)
+
+
+def test_lost_track_forces_full_scan():
+    """A pillar missing from its roi should be predicted, then dropped after a full scan."""
+
+    detector = PillarDetector()
+    detector._ensure_scratch(SHAPE)
+    scene = FakeScene(detector, [(RED, 5.0, 60.0)])
+    tracker = PillarTracker(detector)
+    tracker.update(scene.detect, 0.0, yaw=0.0)
+    tracker.update(scene.detect, 0.04, yaw=0.0)
+    assert scene.rois[-1] is not None
+
+    scene.pillars = []
+    (coasting,) = tracker.update(scene.detect, 0.08, yaw=0.0)
+    assert coasting.area == 0 and coasting.track_id == 1
+    tracker.update(scene.detect, 0.12, yaw=0.0)
+    assert scene.rois[-1] is None
+    for i in range(PillarTracker.MAX_MISSES):
+        pillars = tracker.update(scene.detect, 0.16 + 0.04 * i, yaw=0.0)
+    assert pillars == ()
+
+
+def test_travel_moves_the_predicted_track():
+    """Driving forward should bring a coasting pillar closer and further to the side."""
+
+    detector = PillarDetector()
+    detector._ensure_scratch(SHAPE)
+    scene = FakeScene(detector, [(RED, 10.0, 100.0)])
+    ego_motion = EgoMotion()
+    ego_motion.set_yaw(0.0)
+    ego_motion.add_travel(0.0)
+    tracker = PillarTracker(detector)
+    tracker.update(scene.detect, 0.0, *ego_motion.read())
+
+    scene.pillars = []
+    ego_motion.add_travel(20.0)
+    ego_motion.add_travel(10.0)
+    (moved,) = tracker.update(scene.detect, 0.04, *ego_motion.read())
+    x = 100.0 * math.cos(math.radians(10.0)) - 30.0
+    y = 100.0 * math.sin(math.radians(10.0))
+    assert math.isclose(moved.distance, math.hypot(x, y), abs_tol=1.0)
+    assert math.isclose(moved.bearing, math.degrees(math.atan2(y, x)), abs_tol=1.0)
+
+    # the same frames without the travel keep the pillar where it was.
+    still = PillarTracker(detector)
+    scene.pillars = [(RED, 10.0, 100.0)]
+    still.update(scene.detect, 0.0, yaw=0.0, travelled=0.0)
+    scene.pillars = []
+    (kept,) = still.update(scene.detect, 0.04, yaw=0.0, travelled=0.0)
+    assert math.isclose(kept.distance, 100.0, abs_tol=1.0)
+    assert moved.height > kept.height
+
+
+def test_tracker_on_frames():
+    """The tracker should search rois of the real detector on a static frame."""
+
+    detector = PillarDetector()
+    tracker = PillarTracker(detector)
+    frame = pillar_frame()
+    full = detector.detect(frame)
+    for i in range(5):
+        pillars = tracker.update(lambda rois: detector.detect(frame, rois), i * 0.04, yaw=0.0)
+    assert tracker.roi_scans == 4
+    assert sorted(p.colour for p in pillars) == sorted(p.colour for p in full)
+    for pillar in pillars:
+        match = next(p for p in full if p.colour == pillar.colour)
+        assert math.isclose(pillar.bearing, match.bearing, abs_tol=0.1)
+
+
+def test_nearer_pillar_found_later_comes_first():
+    """A nearer pillar first seen after a farther track should be output and picked first."""
+
+    detector = PillarDetector()
+    detector._ensure_scratch(SHAPE)
+    scene = FakeScene(detector, [(RED, -10.0, 150.0)])
+    tracker = PillarTracker(detector)
+    for frame in range(3):
+        tracker.update(scene.detect, frame * 0.04, yaw=0.0)
+
+    # only a full scan starts new tracks.
+    scene.pillars.append((GREEN, 12.0, 60.0))
+    for frame in range(3, 3 + PillarTracker.FULL_SCAN_EVERY):
+        pillars = tracker.update(scene.detect, frame * 0.04, yaw=0.0)
+    assert [(p.colour, p.track_id) for p in pillars] == [(GREEN, 2), (RED, 1)]
+    nearest = PillarReading(pillars).nearest()
+    assert nearest is not None and nearest.colour == GREEN
+    assert PillarReading(pillars[::-1]).nearest() == nearest
+
+    # more tracks than the shared result holds, the farthest are left out.
+    scene.pillars = [(RED, -24.0 + 6.0 * i, 50.0 + 15.0 * i) for i in range(8)]
+    tracker = PillarTracker(detector)
+    pillars = tracker.update(scene.detect, 0.0, yaw=0.0)
+    assert len(tracker.tracks) == 8
+    assert [round(p.distance) for p in pillars] == [50 + 15 * i
+                                                   for i in range(PillarDetector.MAX_PILLARS)]
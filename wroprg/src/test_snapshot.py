@@ -0,0 +1,36 @@
+"""Test for the versioned snapshots shared between threads."""
+import threading
+
+from utils.snapshot import SnapshotPublisher
+
+
+def test_snapshots_are_consistent_and_versioned():
+    """A reader should never see a mix of two published values."""
+
+    publisher: SnapshotPublisher = SnapshotPublisher((0, 0))
+    assert publisher.sequence == 0 and publisher.value == (0, 0)
+    assert publisher.newer_than(0) is None
+
+    torn = []
+    stop = threading.Event()
+
+    def read() -> None:
+        last = 0
+        while not stop.is_set():
+            snapshot = publisher.latest()
+            left, right = snapshot.value
+            if left != right or snapshot.sequence < last:
+                torn.append(snapshot)
+            last = snapshot.sequence
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    for i in range(1, 20001):
+        publisher.publish((i, i))
+    stop.set()
+    reader.join()
+
+    assert not torn
+    snapshot = publisher.latest()
+    assert snapshot.sequence == 20000 and snapshot.value == (20000, 20000)
+    assert publisher.newer_than(19999) is snapshot and publisher.newer_than(20000) is None
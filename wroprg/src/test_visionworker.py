@@ -0,0 +1,67 @@
+"""Test for the vision process and its shared memory blocks."""
+import time
+
+from benchmarks.synthetic import synthetic_camera
+from hardware.camerameasurements import CameraReading
+from hardware.visionworker import SharedResult, VisionWorker
+from round2.pillardetector import GREEN, RED, Pillar, PillarReading
+
+
+def test_shared_result_round_trip():
+    """A result written by the owner should be read from an attached block."""
+
+    owner = SharedResult()
+    reader = SharedResult(owner.name)
+    try:
+        assert reader.read() is None
+        owner.write(CameraReading(-1, 10.0, 20.0, 12.5, 12.52, 0), 30.0, 80.0, 90.0, 4.0, False)
+        owner.write(CameraReading(5.0, -1, -1, 13.5, 13.51, 1), 96.0, 70.0, 60.0, 3.0, False,
+                    fps=25.0)
+        result = reader.read()
+        assert result is not None
+        assert result.seq == 2
+        assert result.frame_timestamp == 13.5
+        assert (result.front, result.left, result.right) == (5.0, -1, -1)
+        assert result.queue_depth == 1
+        assert abs(result.reading.latency_ms - 10.0) < 1e-6
+        assert not result.paused and result.fps == 25.0
+    finally:
+        reader.close()
+        owner.close()
+
+
+def test_shared_result_pillars():
+    """Pillars should be shared with the result, up to the number of slots."""
+
+    owner = SharedResult()
+    reader = SharedResult(owner.name)
+    try:
+        pillars = tuple(Pillar(RED if i % 2 else GREEN, float(i), 50.0 + i, i, 2, 3, 4, 5)
+                        for i in range(SharedResult.MAX_PILLARS + 2))
+        owner.write(CameraReading(), 0, 0, 0, 1.0, False, PillarReading(pillars, 7.5))
+        result = reader.read()
+        assert result is not None
+        assert result.pillars == PillarReading(pillars[: SharedResult.MAX_PILLARS], 7.5)
+        owner.write(CameraReading(), 0, 0, 0, 1.0, False)
+        assert reader.read().pillars == PillarReading()  # type: ignore[union-attr]
+    finally:
+        reader.close()
+        owner.close()
+
+
+def test_vision_worker_publishes_results():
+    """The worker process should measure the synthetic frames and share them."""
+
+    worker = VisionWorker(True, camera_factory=synthetic_camera)
+    worker.start()
+    try:
+        deadline = time.time() + 10.0
+        while worker.read_result() is None and time.time() < deadline:
+            time.sleep(0.05)
+        (_, _, _, metrics) = worker.get_distance()
+        assert metrics["c.seq"] >= 1
+        assert metrics["c.latency_ms"] >= 0 and metrics["c.age_ms"] >= 0
+        # the synthetic wall covers a third of the image.
+        assert metrics["c.leftp"] > 50.0 or metrics["c.rightp"] > 50.0
+    finally:
+        worker.shutdown()
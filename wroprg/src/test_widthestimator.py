@@ -0,0 +1,79 @@
+"""Test for the width estimator used by the Mat intelligence."""
+from round1.widthestimator import WidthEstimator
+
+
+def test_width_estimator_ignores_bad_echo():
+    """A single bad reading should not change the learned width."""
+
+    estimator = WidthEstimator(min_width=20.0, max_width=110.0)
+
+    for _ in range(30):
+        estimator.add(40.0, 40.0, 0.0)
+
+    # one short echo, the old minimum logic would have learned 30 cm.
+    median = estimator.add(10.0, 20.0, 0.0)
+    assert median == 80.0
+
+    record = estimator.record()
+    assert record is not None
+    assert record.samples == 31
+    assert abs(record.width - 80.0) < 0.01
+    assert record.ci_low <= record.width <= record.ci_high
+
+
+def test_width_estimator_rejects_angled_readings():
+    """Readings taken while the bot is angled should be rejected or corrected."""
+
+    estimator = WidthEstimator(min_width=20.0, max_width=110.0)
+
+    for _ in range(10):
+        estimator.add(40.0, 40.0, 90.0)
+
+    # bot is 30 degree off the side heading and reads wide.
+    assert estimator.add(50.0, 50.0, 120.0) is None
+
+    # small angle is corrected using the cosine.
+    estimator.add(40.5, 40.5, 95.0)
+    record = estimator.record()
+    assert record is not None
+    assert record.rejected == 1
+    assert abs(record.median - 80.0) < 0.01
+
+
+def test_width_estimator_handles_wrap_and_range():
+    """Heading wrap around +-180 should not reject readings, out of range should."""
+
+    estimator = WidthEstimator(min_width=20.0, max_width=110.0)
+
+    for yaw in (179.0, -179.0, 178.0, -178.0, 179.5, -179.5):
+        assert estimator.add(30.0, 30.0, yaw) is not None
+
+    # open side reads max distance.
+    assert estimator.add(200.0, 30.0, 179.0) is None
+
+    record = estimator.record()
+    assert record is not None
+    assert record.samples == 6
+    assert record.is_confident(max_uncertainty=2.0, min_samples=5)
+    assert not record.is_confident(max_uncertainty=2.0, min_samples=20)
+
+
+def test_width_estimator_gates_against_the_side_heading():
+    """A slow drift off the side heading should be rejected, not followed by the median."""
+
+    drifting = [90.0 + 0.5 * i for i in range(40)]
+    gated = WidthEstimator(min_width=20.0, max_width=110.0)
+    rolling = WidthEstimator(min_width=20.0, max_width=110.0)
+    for yaw in drifting:
+        gated.add(40.0, 40.0, yaw, heading=90.0)
+        rolling.add(40.0, 40.0, yaw)
+
+    # more than 12 degrees off the side heading from yaw 102.5 on.
+    gated_record = gated.record()
+    rolling_record = rolling.record()
+    assert gated_record is not None and rolling_record is not None
+    assert (gated_record.samples, gated_record.rejected) == (25, 15)
+    assert rolling_record.rejected == 0
+
+    # the heading wraps around +-180 too.
+    assert gated.add(40.0, 40.0, -178.0, heading=179.0) is not None
@@ -0,0 +1,123 @@
+"""Test for the timestamped yaw samples."""
+import math
+from typing import List, Optional
+
+from hardware.yawsampler import ContinuousHeading, GyroYawPredictor, YawRing, YawSampler, \
+    quaternion_heading_deg
+
+
+def test_ring_interpolates_across_wrap_and_extrapolates():
+    """Yaw at a time should interpolate through +-180 and extrapolate only a little."""
+
+    ring = YawRing(capacity=4)
+    assert ring.yaw_at(1.0) is None
+    for i, yaw in enumerate((170.0, 175.0, 179.0, -177.0, -173.0)):
+        ring.append(1.0 + 0.01 * i, yaw)
+    assert len(ring) == 4
+    # the first sample was overwritten, the oldest is 175 at 1.01.
+    assert ring.yaw_at(0.5) == 175.0
+    assert abs(ring.yaw_at(1.025) - 181.0) < 1e-9
+    assert abs(ring.yaw_at(1.04) - 187.0) < 1e-9
+    # 4 degrees per 10 ms, extrapolated for 20 ms at most.
+    assert abs(ring.yaw_at(1.045) - 189.0) < 1e-9
+    assert abs(ring.yaw_at(2.0) - 195.0) < 1e-9
+    assert ring.latest() == (1.04, 187.0)
+
+
+def test_sampler_reads_at_the_device_rate(monkeypatch):
+    """The sampler should read on a deadline schedule at its rate, not as fast as it can,
+    restart the schedule after a late read and skip failed reads."""
+
+    now = [100.0]
+    monkeypatch.setattr("hardware.yawsampler.time.monotonic", lambda: now[0])
+    values = iter([10.0, None, 12.0, 14.0, 14.0, 14.0])
+    # each read takes 2 ms, the 4th one 15 ms.
+    read_times = iter([0.002, 0.002, 0.002, 0.015, 0.002, 0.002])
+
+    def read() -> Optional[float]:
+        now[0] += next(read_times)
+        return next(values)
+
+    class FakeStop:
+        """Advances the clock instead of waiting, stops after six waits."""
+
+        def __init__(self) -> None:
+            self.delays: List[float] = []
+
+        def is_set(self) -> bool:
+            return len(self.delays) >= 6
+
+        def wait(self, delay: float) -> None:
+            self.delays.append(delay)
+            now[0] += delay
+
+    sampler = YawSampler(read, rate_hz=100.0)
+    stop = FakeStop()
+    sampler._stop_event = stop  # type: ignore[assignment]
+    sampler.run()
+
+    expected = [0.008, 0.008, 0.008, 0.0, 0.008, 0.008]
+    assert max(abs(delay - e) for delay, e in zip(stop.delays, expected)) < 1e-9
+    assert (sampler.reads, sampler.failures, sampler.late) == (6, 1, 1)
+    assert len(sampler.ring) == 5
+    # stamped with the middle of the read, after the schedule restarted at 100.045.
+    latest = sampler.ring.latest()
+    assert latest is not None and abs(latest[0] - 100.056) < 1e-9 and latest[1] == 14.0
+
+
+def test_continuous_heading_counts_laps_with_virtual_zero():
+    """Two laps to the right should be 720, the yaw zero moves without a device reset."""
+
+    heading = ContinuousHeading()
+    assert heading.reset_yaw() == 0.0
+    heading.update(30.0)
+    assert heading.yaw() == 0.0 and heading.heading() == 0.0
+    for step in range(1, 73):
+        heading.update(((30.0 + 10.0 * step) + 180.0) % 360.0 - 180.0)
+    assert abs(heading.heading() - 720.0) < 1e-9
+    assert abs(heading.yaw()) < 1e-9
+
+    heading.update(-50.0)
+    assert abs(heading.reset_yaw() - 640.0) < 1e-9
+    assert heading.yaw() == 0.0
+    assert abs(heading.yaw_zero_heading - 640.0) < 1e-9
+    heading.update(-140.0)
+    assert abs(heading.yaw() + 90.0) < 1e-9 and abs(heading.heading() - 550.0) < 1e-9
+
+
+def test_quaternion_heading_is_clockwise():
+    """A rotation of 30 degrees counter clockwise around z is a heading of -30."""
+
+    half = math.radians(30.0) / 2.0
+    assert abs(quaternion_heading_deg(math.cos(half), 0.0, 0.0, math.sin(half)) + 30.0) < 1e-9
+    assert quaternion_heading_deg(1.0, 0.0, 0.0, 0.0) == 0.0
+    half = math.radians(-170.0) / 2.0
+    assert abs(quaternion_heading_deg(math.cos(half), 0.0, 0.0, math.sin(half)) - 170.0) < 1e-9
+
+
+def test_gyro_predictor_leads_the_fused_heading_and_removes_bias():
+    """A turn at 90 deg/s should be followed without the fusion lag, a gyro bias should not
+    drift the yaw away from the fused heading."""
+
+    predictor = GyroYawPredictor(fusion_lag_s=0.02)
+    assert predictor.predict(0.0) is None
+    # gyro at 200 Hz with 5 deg/s bias, fused heading at 100 Hz lagging 20 ms.
+    for i in range(400):
+        t = i * 0.005
+        predictor.add_rate(t, 90.0 + 5.0)
+        if i % 2 == 0:
+            predictor.add_fused(t, 90.0 * (t - 0.02))
+    t = 399 * 0.005
+    assert abs(predictor.yaw - 90.0 * t) < 1.0
+    # 50 ms ahead at the current rate, clamped to MAX_PREDICTION_S.
+    assert abs(predictor.predict(t + 0.05) - predictor.yaw - 95.0 * 0.05) < 1e-9
+    assert abs(predictor.predict(t + 5.0) - predictor.yaw
+               - 95.0 * GyroYawPredictor.MAX_PREDICTION_S) < 1e-9
+
+    # stopped, the gyro still reads its bias: the fused heading holds the yaw.
+    for i in range(400, 1400):
+        t = i * 0.005
+        predictor.add_rate(t, 5.0)
+        if i % 2 == 0:
+            predictor.add_fused(t, 90.0 * 399 * 0.005)
+    assert abs(predictor.yaw - 90.0 * 399 * 0.005) < 1.0
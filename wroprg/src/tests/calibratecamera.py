@@ -0,0 +1,95 @@
+""" This script calibrates the camera intrinsics and ground plane with a chessboard."""
+import logging
+from typing import List, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from hardware.calibration import BOARD_CORNERS, SQUARE_SIZE, CameraCalibration, \
+    calibrate_intrinsics, find_corners
+from hardware.camera import MyCamera
+from hardware.camerameasurements import CameraDistanceMeasurements
+from hardware.groundplane import GroundPlaneModel
+
+logger = logging.getLogger(__name__)
+
+# Distance from the front bumper to the nearest row of inner corners, board centered.
+BOARD_DISTANCE = 10.0  # cm
+MIN_INTRINSIC_VIEWS = 3
+
+
+def board_ground_points(corners: NDArray[np.float32]) -> Tuple[NDArray[np.float64],
+                                                               NDArray[np.float64]]:
+    """Corners ordered from the nearest row, with their floor coordinates in cm."""
+    cols, rows = BOARD_CORNERS
+    grid = corners.reshape(rows, cols, 2)
+    # the camera is upside down at 180, the nearest floor is at the top of the image.
+    upside_down = CameraDistanceMeasurements.ORIENTATION_DEG == 180
+    if (grid[0, :, 1].mean() > grid[-1, :, 1].mean()) == upside_down:
+        grid = grid[::-1]
+    if grid[:, 0, 0].mean() > grid[:, -1, 0].mean():
+        grid = grid[:, ::-1]
+    # image columns go to the left of the robot when upside down, to the right otherwise.
+    side = 1.0 if upside_down else -1.0
+    x, y = np.meshgrid(BOARD_DISTANCE + np.arange(rows) * SQUARE_SIZE,
+                       side * (np.arange(cols) - (cols - 1) / 2) * SQUARE_SIZE, indexing="ij")
+    return grid.reshape(-1, 2).astype(np.float64), np.stack([x.ravel(), y.ravel()], axis=1)
+
+
+def main():
+    """ Main function to run the camera calibration."""
+    logging.basicConfig(level=logging.INFO)
+    camera = MyCamera()
+    camera.start()
+    try:
+        image_views: List[NDArray[np.float32]] = []
+
+        print("Intrinsics: hold the board at different angles and distances.")
+        while input("Enter to capture, q to finish: ").strip().lower() != "q":
+            corners = find_corners(camera.capture())
+            if corners is None:
+                print("Chessboard not found.")
+                continue
+            image_views.append(corners)
+            print(f"Captured view {len(image_views)}")
+
+        width, height = MyCamera.MAIN_SIZE
+        camera_matrix = dist_coeffs = reprojection_error = None
+        if len(image_views) >= MIN_INTRINSIC_VIEWS:
+            camera_matrix, dist_coeffs, reprojection_error = calibrate_intrinsics(
+                image_views, (width, height))
+            logger.info("Intrinsics reprojection error %.3f px, matrix %s", reprojection_error,
+                        camera_matrix.tolist())
+        else:
+            logger.warning("Not enough views, the ground plane is fitted without intrinsics.")
+
+        print(f"Ground plane: lay the board flat, centered, nearest corners {BOARD_DISTANCE} cm"
+              " from the front bumper.")
+        corners = None
+        while corners is None:
+            input("Enter to capture: ")
+            corners = find_corners(camera.capture())
+            if corners is None:
+                print("Chessboard not found.")
+
+        image_points, ground_points = board_ground_points(corners)
+        model = GroundPlaneModel.from_correspondences(image_points, ground_points,
+                                                      (width, height), camera_matrix, dist_coeffs)
+        error = np.abs(model.image_to_ground(image_points) - ground_points).max()
+        logger.info("Ground plane max error on the board %.2f cm", error)
+        filename = CameraDistanceMeasurements.CALIBRATION_FILE
+        previous = CameraCalibration.load(filename)
+        calibration = CameraCalibration(
+            (width, height), camera_matrix, dist_coeffs,
+            # without intrinsics keep a focal length measured on a pillar (round2/testfocal.py).
+            previous.focal_length if previous is not None and camera_matrix is None else None,
+            model,
+            reprojection_error)
+        calibration.save(filename)
+        logger.warning("Saved %s", filename)
+    finally:
+        camera.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""In-memory recorder of every control tick, dumped to disk at shutdown or on an error.
+
+Load a dump from the src folder:
+    python -m utils.flightrecorder flightrecord.npz [flightrecord.csv]
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+from base.shutdown_handling import ShutdownInterface
+from hardware.robotstate import RobotState
+
+logger = logging.getLogger(__name__)
+
+# Columns of a tick, nan until the control loop sets them.
+FIELDS = ("timestamp", "front", "left", "right", "yaw", "camera_front", "camera_left",
+          "camera_right", "camera_age", "distance", "distance_error", "gyro_error",
+          "fused_error", "turn", "steering", "steering_command")
+_COLUMN = {name: index for index, name in enumerate(FIELDS)}
+_STATE_COLUMNS = [_COLUMN[name] for name in ("front", "left", "right", "camera_front",
+                                             "camera_left", "camera_right", "yaw",
+                                             "camera_age")]
+_TIMESTAMP = _COLUMN["timestamp"]
+_DISTANCE = _COLUMN["distance"]
+_ERRORS = [_COLUMN[name] for name in ("distance_error", "gyro_error", "fused_error", "turn")]
+_STEERING = _COLUMN["steering"]
+_STEERING_COMMAND = _COLUMN["steering_command"]
+
+
+class FlightRecorder(ShutdownInterface):
+    """Ring buffer of the last CAPACITY control ticks, preallocated as one float array.
+
+    Walker.read_state starts a tick with the robot state and the odometry, the walker
+    helper and the movement controller fill in the PID terms and the steering of the
+    same tick. Only the control thread records; dump() copies the buffer, so a dump
+    from another thread may hold the tick being written half filled.
+    """
+
+    ENABLED: bool = True
+    CAPACITY = 32768  # about 9 minutes of the 60 Hz control loop, 4 MB
+    FILENAME = "flightrecord.npz"
+
+    def __init__(self, capacity: Optional[int] = None, filename: Optional[str] = None) -> None:
+        self.capacity = capacity or self.CAPACITY
+        self.filename = filename or self.FILENAME
+        self._data: NDArray[np.float64] = np.full((self.capacity, len(FIELDS)), np.nan)
+        self._row = -1
+        # ticks recorded since the start, the buffer holds the last capacity of them.
+        self.ticks = 0
+        self._dumped_ticks = 0
+        self._dump_lock = threading.Lock()
+
+    def record_state(self, state: RobotState, distance: float) -> None:
+        """Start a tick with the state read by the control loop and the odometry."""
+        if not self.ENABLED:
+            return
+        row = self.ticks % self.capacity
+        data = self._data[row]
+        data.fill(np.nan)
+        data[_TIMESTAMP] = time.monotonic()
+        data[_STATE_COLUMNS] = state
+        data[_DISTANCE] = distance
+        self._row = row
+        self.ticks += 1
+
+    def record_errors(self, distance_error: float, gyro_error: float, fused_error: float,
+                      turn: float) -> None:
+        """PID terms and the turn angle the walker helper chose in the current tick."""
+        if self._row >= 0:
+            self._data[self._row, _ERRORS] = (distance_error, gyro_error, fused_error, turn)
+
+    def record_steering(self, steering: float, steering_command: float) -> None:
+        """Steering angle before the turn and the angle commanded in the current tick."""
+        if self._row >= 0:
+            data = self._data[self._row]
+            data[_STEERING] = steering
+            data[_STEERING_COMMAND] = steering_command
+
+    def snapshot(self) -> NDArray[np.float64]:
+        """Copy of the recorded ticks, oldest first."""
+        data = self._data.copy()
+        ticks = self.ticks
+        if ticks <= self.capacity:
+            return data[:ticks]
+        start = ticks % self.capacity
+        return np.concatenate((data[start:], data[:start]))
+
+    def dump(self, reason: str = "shutdown") -> Optional[str]:
+        """Write the recorded ticks to filename, rotating an existing dump.
+
+        Returns the file written, None when nothing was recorded since the last dump.
+        """
+        with self._dump_lock:
+            ticks = self.ticks
+            if ticks == self._dumped_ticks:
+                return None
+            data = self.snapshot()
+            if os.path.exists(self.filename):
+                root, ext = os.path.splitext(self.filename)
+                os.rename(self.filename, f"{root}_{time.strftime('%Y%m%d_%H%M%S')}{ext}")
+            try:
+                with open(self.filename, "wb") as f:
+                    np.savez(f, data=data, fields=np.array(FIELDS), reason=np.array(reason))
+            except OSError as e:
+                logger.error("Cannot write flight record %s: %s", self.filename, e)
+                return None
+            self._dumped_ticks = ticks
+        logger.info("Flight record %s (%s): %d of %d ticks", self.filename, reason,
+                    len(data), ticks)
+        return self.filename
+
+    def shutdown(self) -> None:
+        self.dump()
+
+
+_recorder: Optional[FlightRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def flight_recorder() -> FlightRecorder:
+    """The recorder of this process, allocated on the first call."""
+    global _recorder  # pylint: disable=global-statement
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = FlightRecorder()
+    return _recorder
+
+
+def load_flight_record(filename: str) -> NDArray[Any]:
+    """The ticks of a dump as a structured array with the FIELDS as columns."""
+    with np.load(filename) as dump:
+        data, fields = dump["data"], [str(name) for name in dump["fields"]]
+    ticks = np.empty(len(data), dtype=[(name, np.float64) for name in fields])
+    for index, name in enumerate(fields):
+        ticks[name] = data[:, index]
+    return ticks
+
+
+def main() -> None:
+    """Convert a dump to csv."""
+    if len(sys.argv) < 2:
+        print("usage: python -m utils.flightrecorder flightrecord.npz [flightrecord.csv]")
+        sys.exit(1)
+    filename = sys.argv[1]
+    csv_filename = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(filename)[0] + ".csv"
+    ticks = load_flight_record(filename)
+    np.savetxt(csv_filename, ticks, fmt="%.4f", delimiter=",",
+               header=",".join(ticks.dtype.names or ()), comments="")
+    print(f"{len(ticks)} ticks written to {csv_filename}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Pixel counts of a mask over grids, sectors and bands, without per cell loops."""
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+
+
+def grid_edges(size: int, cells: int) -> NDArray[np.intp]:
+    """Cell edges of size pixels split in cells, the last cell takes the remainder."""
+    edges = np.arange(cells + 1, dtype=np.intp) * (size // cells)
+    edges[-1] = size
+    return edges
+
+
+def band_sums(mask: NDArray, col_edges: Sequence[int]) -> NDArray[np.int64]:
+    """Sum of the mask in each vertical band between the column edges.
+
+    Reduces the mask to a column profile once, cheaper than an integral image when
+    only full height bands are needed (left / center / right sections).
+    """
+    if mask.dtype == np.bool_:
+        mask = mask.view(np.uint8)
+    profile = cv2.reduce(mask, 0, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel()
+    cumulative = np.concatenate(([0], np.cumsum(profile, dtype=np.int64)))
+    edges = np.asarray(col_edges, dtype=np.intp)
+    return cumulative[edges[1:]] - cumulative[edges[:-1]]
+
+
+class GridStats:
+    """Integral image of a mask, answers rectangle sums in constant time.
+
+    update() computes the integral image once per mask, in a buffer reused while the
+    mask size stays the same. Counts are the mask sum divided by value, the value of
+    the set pixels (1 for bool masks, 255 for cv2.inRange masks).
+    """
+
+    def __init__(self) -> None:
+        self._integral: NDArray[np.int32] = np.empty((0, 0), dtype=np.int32)
+        self._value = 1
+        self.shape: Tuple[int, int] = (0, 0)
+
+    def update(self, mask: NDArray, value: int = 1) -> "GridStats":
+        """Integral image of a new mask."""
+        if mask.dtype == np.bool_:
+            mask = mask.view(np.uint8)
+        rows, cols = mask.shape
+        if self.shape != (rows, cols):
+            self.shape = (rows, cols)
+            self._integral = np.empty((rows + 1, cols + 1), dtype=np.int32)
+        cv2.integral(mask, self._integral, cv2.CV_32S)
+        self._value = value
+        return self
+
+    def rect_sum(self, y0: int, y1: int, x0: int, x1: int) -> int:
+        """Count of the rows y0..y1 and columns x0..x1 (end excluded)."""
+        s = self._integral
+        return int(s[y1, x1] - s[y0, x1] - s[y1, x0] + s[y0, x0]) // self._value
+
+    def sums(self, row_edges: Sequence[int], col_edges: Sequence[int]) -> NDArray[np.int64]:
+        """Counts of every cell between the row and column edges, rows x cols."""
+        corners = self._integral[np.ix_(np.asarray(row_edges, dtype=np.intp),
+                                        np.asarray(col_edges, dtype=np.intp))].astype(np.int64)
+        cells = corners[1:, 1:] - corners[:-1, 1:] - corners[1:, :-1] + corners[:-1, :-1]
+        if self._value != 1:
+            cells //= self._value
+        return cells
+
+    def grid(self, rows: int, cols: int) -> NDArray[np.int64]:
+        """Counts of an even rows x cols grid, the last row and column take the remainder."""
+        return self.sums(grid_edges(self.shape[0], rows), grid_edges(self.shape[1], cols))
+
+    def sectors(self, col_edges: Sequence[int],
+                row_range: Optional[Tuple[int, int]] = None) -> NDArray[np.int64]:
+        """Counts of the vertical sectors between the column edges, over row_range."""
+        rows = (0, self.shape[0]) if row_range is None else row_range
+        return self.sums(rows, col_edges)[0]
+
+    def argmax(self, rows: int, cols: int) -> Tuple[int, int]:
+        """Row and column of the grid cell with the largest count."""
+        counts = self.grid(rows, cols)
+        row, col = np.unravel_index(int(np.argmax(counts)), counts.shape)
+        return int(row), int(col)
@@ -7,10 +7,15 @@ from base.shutdown_handling import ShutdownInterfaceManager
 from base.logger_setup import LoggerSetup
 from hardware.hardware_interface import HardwareInterface
 from utils.pihealth import PiHealth
+from utils.hotlog import log_hot_log_summary
+from utils.flightrecorder import flight_recorder
 
 class HelperFunctions:
     """A class containing helper functions for the WRO Future Engineer 2025 project."""
 
+    # OLED messages per second, the display and the buzzer are slow.
+    SCREEN_RATE_LIMIT: float = 2.0
+
     def __init__(self, stabilize:bool=False,screen_logger=True) -> None:
         """Initialize the HelperFunctions Logger class."""
 
@@ -21,10 +26,12 @@ class HelperFunctions:
 
         # Initialize all the components
         self._shutdown_manager = ShutdownInterfaceManager()
-        loggersetup = LoggerSetup()
-        self._shutdown_manager.add_interface(loggersetup)
+        self._loggersetup = LoggerSetup()
+        self._shutdown_manager.add_interface(self._loggersetup)
 
-        loggersetup.setup()
+        self._loggersetup.setup()
+        # dumps the control ticks at shutdown, before the logger setup is shut down.
+        self._shutdown_manager.add_interface(flight_recorder())
 
         self._logger = logging.getLogger(__name__)
         print("Starting Logger successfully")
@@ -66,6 +73,7 @@ class HelperFunctions:
             except (ImportError, AttributeError, RuntimeError) as e:
                 self._logger.error("Error Running Program")
                 self._logger.error("Exception: %s",e)
+                flight_recorder().dump("error")
                 self._hardware_interface.led1_red()
                 self._hardware_interface.buzzer_beep()
             finally:
@@ -122,6 +130,8 @@ class HelperFunctions:
         """Function to shutdown all interfaces."""
         try:
             self._logger.warning("Shutting down all interfaces")
+            # before the logger setup is shut down with the other interfaces.
+            log_hot_log_summary(self._logger)
             self._shutdown_manager.shutdown_all()
             self._logger.info("All interfaces shutdown successfully")
         except Exception as e:
@@ -130,7 +140,6 @@ class HelperFunctions:
 
     def add_screen_logger(self, inf: HardwareInterface) -> None:
         """Add a logger to display messages on the OLED screen."""
-        logger = logging.getLogger()
         class ScreenOledHandler(logging.Handler):
             """ Inner class to handle logging to oled display."""
             def __init__(self, oled_interface: HardwareInterface):
@@ -148,11 +157,12 @@ class HelperFunctions:
         oledscreen_handler.setLevel(logging.WARNING)  # Set the level for the Oled display
         oled_formatter = logging.Formatter("%(message)s")  # Format for the Oled display
         oledscreen_handler.setFormatter(oled_formatter)
-        logger.addHandler(oledscreen_handler)
+        # rendered on the log listener thread, not on the thread that logs.
+        self._loggersetup.add_handler(oledscreen_handler, self.SCREEN_RATE_LIMIT,
+                                      per_call_site=False)
 
     def add_new_logger(self, inf: HardwareInterface) -> None:
         """Add a new logger for the OLED display."""
-        logger = logging.getLogger()
         class ScreenNewOledHandler(logging.Handler):
             """ Inner class to handle logging to oled display."""
             def __init__(self, oled_interface: HardwareInterface):
@@ -170,7 +180,9 @@ class HelperFunctions:
         oledscreen_handler.setLevel(logging.WARNING)  # Set the level for the Oled display
         oled_formatter = logging.Formatter("%(message)s")  # Format for the Oled display
         oledscreen_handler.setFormatter(oled_formatter)
-        logger.addHandler(oledscreen_handler)
+        # rendered on the log listener thread, not on the thread that logs.
+        self._loggersetup.add_handler(oledscreen_handler, self.SCREEN_RATE_LIMIT,
+                                      per_call_site=False)
 
     def get_pi_health(self) -> PiHealth:
         """Function to get the Raspberry Pi health monitor."""
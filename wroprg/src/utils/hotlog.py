@@ -0,0 +1,82 @@
+"""Logging for call sites in the control loops: every n-th call, a rate, or on change."""
+import logging
+import time
+import weakref
+from typing import Any, Optional, Sequence, Tuple, Union
+
+# every HotLog, for the summary at shutdown.
+_hot_logs: "weakref.WeakSet[HotLog]" = weakref.WeakSet()
+
+
+class HotLog:
+    """Logs one call site of a loop under a policy, counts what it suppresses.
+
+    The policies combine, a record is logged when each configured one lets it through:
+    every_n logs the 1st, n+1th .. call, per_second at most that many records a second,
+    min_change only when one of the values moved more than min_change since the last
+    logged record. The next logged message tells how many were suppressed before it.
+    """
+
+    def __init__(self, logger: logging.Logger, level: int = logging.INFO, every_n: int = 0,
+                 per_second: float = 0.0, min_change: float = 0.0,
+                 name: Optional[str] = None) -> None:
+        self._logger = logger
+        self._level = level
+        self.every_n = every_n
+        self.per_second = per_second
+        self.min_change = min_change
+        self.name = name or logger.name
+        self.calls = 0
+        self.logged = 0
+        self.suppressed = 0
+        self._pending = 0
+        self._last_time = -float("inf")
+        self._last_value: Optional[Tuple[float, ...]] = None
+        _hot_logs.add(self)
+
+    def _due(self, value: Optional[Tuple[float, ...]]) -> bool:
+        if self.every_n > 1 and (self.calls - 1) % self.every_n:
+            return False
+        now = time.monotonic()
+        if self.per_second > 0 and now - self._last_time < 1.0 / self.per_second:
+            return False
+        if self.min_change > 0 and value is not None and self._last_value is not None \
+                and len(value) == len(self._last_value) \
+                and all(abs(new - old) <= self.min_change
+                        for new, old in zip(value, self._last_value)):
+            return False
+        self._last_time = now
+        self._last_value = value
+        return True
+
+    def log(self, msg: str, *args: Any,
+            value: Union[float, Sequence[float], None] = None) -> bool:
+        """Log msg % args when the policy allows it, returns True when logged.
+
+        value: the number or numbers min_change compares, usually the logged ones.
+        """
+        self.calls += 1
+        if not self._logger.isEnabledFor(self._level):
+            return False
+        if value is not None and not isinstance(value, tuple):
+            value = tuple(value) if isinstance(value, Sequence) else (float(value),)
+        if not self._due(value):
+            self.suppressed += 1
+            self._pending += 1
+            return False
+        if self._pending:
+            msg += " (%d suppressed)"
+            args += (self._pending,)
+            self._pending = 0
+        # the record points at the caller, not at this helper.
+        self._logger.log(self._level, msg, *args, stacklevel=2)
+        self.logged += 1
+        return True
+
+
+def log_hot_log_summary(logger: logging.Logger) -> None:
+    """Log the counters of every HotLog that suppressed records."""
+    for hot_log in sorted(_hot_logs, key=lambda h: -h.suppressed):
+        if hot_log.suppressed:
+            logger.info("Hot log %s: %d calls, %d logged, %d suppressed", hot_log.name,
+                        hot_log.calls, hot_log.logged, hot_log.suppressed)
@@ -1,18 +1,57 @@
 """ Utililies function to prevent throattling , can be called after 1 round. to check."""
+import logging
 import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
 
 class PiHealth:
     """Class to monitor and manage Raspberry Pi health."""
-    def __init__(self, duration_seconds, threshold=65):
+
+    TEMPERATURE_FILE = "/sys/class/thermal/thermal_zone0/temp"
+    # Same bits as `vcgencmd get_throttled`, without starting a process.
+    THROTTLED_FILE = "/sys/devices/platform/soc/soc:firmware/get_throttled"
+    UNDER_VOLTAGE = 0x1
+    FREQUENCY_CAPPED = 0x2
+    THROTTLED = 0x4
+    SOFT_TEMPERATURE_LIMIT = 0x8
+
+    def __init__(self, duration_seconds=0, threshold=65):
         self.duration_seconds = duration_seconds
         self.threshold = threshold
 
+    def read_temperature(self) -> Optional[float]:
+        """Current CPU temperature in °C, None when it cannot be read."""
+        try:
+            with open(self.TEMPERATURE_FILE, "r", encoding="utf-8") as f:
+                return int(f.readline()) / 1000.0
+        except (OSError, ValueError):
+            return None
+
+    def read_throttled(self) -> Optional[int]:
+        """Throttle flags of the firmware, None when they cannot be read."""
+        try:
+            with open(self.THROTTLED_FILE, "r", encoding="utf-8") as f:
+                return int(f.readline().strip(), 16)
+        except (OSError, ValueError):
+            return None
+
+    def is_throttling(self) -> bool:
+        """Check if the CPU is throttled or capped right now."""
+        flags = self.read_throttled()
+        if flags is None:
+            return False
+        return bool(flags & (self.UNDER_VOLTAGE | self.FREQUENCY_CAPPED | self.THROTTLED
+                             | self.SOFT_TEMPERATURE_LIMIT))
+
     def is_temperature_high(self):
         """
         Checks if the current CPU temperature exceeds the threshold.
         """
-        with open("/sys/class/thermal/thermal_zone0/temp", "r", encoding="utf-8") as f:
-            temp = int(f.readline()) / 1000.0
+        temp = self.read_temperature()
+        if temp is None:
+            logger.warning("Cannot read the CPU temperature")
+            return False
 
         print("Current CPU Temperature: %.2f°C" % temp)
         return temp > self.threshold
@@ -0,0 +1,54 @@
+"""Immutable versioned snapshots of state shared between threads."""
+import threading
+import time
+from typing import Any, Generic, NamedTuple, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Snapshot(NamedTuple):
+    """A published value with its sequence number and time.monotonic() publish time."""
+    value: Any
+    sequence: int
+    timestamp: float
+
+
+class SnapshotPublisher(Generic[T]):
+    """Holds the latest snapshot of a value, replaced as a whole on each publish.
+
+    The value must not be changed after it is published (a NamedTuple, a tuple, a
+    MappingProxyType of a copied dict). Swapping the reference is atomic, so readers
+    take latest() without a lock and always see one consistent record; the sequence
+    tells them if anything was published since they last looked.
+    """
+
+    def __init__(self, initial: T) -> None:
+        self._snapshot = Snapshot(initial, 0, time.monotonic())
+        # only between publishers, so two of them never hand out the same sequence.
+        self._publish_lock = threading.Lock()
+
+    def publish(self, value: T) -> Snapshot:
+        """Replace the value, returns its snapshot."""
+        with self._publish_lock:
+            snapshot = Snapshot(value, self._snapshot.sequence + 1, time.monotonic())
+            self._snapshot = snapshot
+        return snapshot
+
+    def latest(self) -> Snapshot:
+        """The latest snapshot."""
+        return self._snapshot
+
+    @property
+    def value(self) -> T:
+        """The latest value."""
+        return self._snapshot.value
+
+    @property
+    def sequence(self) -> int:
+        """Sequence number of the latest value, 0 before the first publish."""
+        return self._snapshot.sequence
+
+    def newer_than(self, sequence: int) -> Optional[Snapshot]:
+        """The latest snapshot when published after sequence, else None."""
+        snapshot = self._snapshot
+        return snapshot if snapshot.sequence > sequence else None